@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import time
+
+import numpy
+
+import entity
+
+
+class Scheduler(object):
+    """ Decides which entities of an EntityStore get their AI updated
+    in a tick. Entities are put into tiers by their grid distance to
+    the player, each tier being updated every `period` ticks. Updates
+    of a tier are staggered over the period by entity id, so far away
+    entities do not all wake up in the same tick.
+
+    Due updates are processed in batches until the per-tick `budget`
+    (in milliseconds) is used up; the rest is carried over to the next
+    tick, ahead of newly due entities.
+    """
+
+    def __init__(self, store, tiers=((8, 1), (16, 4), (None, 16)), budget=2.0, batch=64, scale=3.0):
+        self.store  = store
+        self.limits = numpy.array([t[0] for t in tiers[:-1]], dtype=numpy.float32)
+        self.period = numpy.array([t[1] for t in tiers], dtype=numpy.int64)
+        self.budget = budget / 1000.0
+        self.batch  = batch
+        self.scale  = scale
+
+        self.ticks  = 0
+        self.queue  = numpy.zeros(0, dtype=numpy.int64)   # entity ids
+        self.queued = numpy.zeros(0, dtype=bool)          # per entity id
+        self.last   = numpy.zeros(0, dtype=numpy.int64)   # tick of last update per id
+
+        # statistics of the last tick
+        self.updated  = 0
+        self.deferred = 0
+        self.elapsed  = 0.0
+
+    def getTiers(self, player, visible=None):
+        """ Returns the tier of each alive entity. Entities inside the
+        `visible` mask (e.g. from the PVS) are always in the first tier.
+        """
+        pos = self.store['position']
+        x = numpy.floor(pos[:, 0] / self.scale)
+        y = numpy.floor(pos[:, 2] / self.scale)
+        distance = numpy.maximum(numpy.abs(x - player[0]), numpy.abs(y - player[1]))
+        tiers = numpy.searchsorted(self.limits, distance, side='left')
+        if visible is not None:
+            tiers[numpy.asarray(visible, dtype=bool)] = 0
+        return tiers
+
+    def grow(self):
+        n = self.store.next_id
+        if len(self.queued) < n:
+            capacity = max(n, 2 * len(self.queued))
+            queued = numpy.zeros(capacity, dtype=bool)
+            queued[:len(self.queued)] = self.queued
+            last = numpy.full(capacity, self.ticks, dtype=numpy.int64)
+            last[:len(self.last)] = self.last
+            self.queued = queued
+            self.last   = last
+
+    def tick(self, player, update, visible=None, active=None) -> int:
+        """ Run one tick for a player at grid position `player` (see
+        Camera.getWorldPos). `update(ids, elapsed)` is called with an
+        array of entity ids and the number of ticks since each one's
+        last update. `active` optionally masks entities without AI.
+        Returns the number of updated entities.
+        """
+        start = time.perf_counter()
+        self.grow()
+
+        # enqueue entities which are due in this tick
+        ids   = self.store.getIds()
+        tiers = self.getTiers(player, visible)
+        due = (ids + self.ticks) % self.period[tiers] == 0
+        due &= ~self.queued[ids]
+        if active is not None:
+            due &= numpy.asarray(active, dtype=bool)
+        fresh = ids[due][numpy.argsort(tiers[due], kind='stable')]
+        self.queued[fresh] = True
+        self.queue = numpy.concatenate((self.queue, fresh))
+
+        # process within budget, but always make progress
+        done = 0
+        while done < len(self.queue):
+            chunk = self.queue[done:done + self.batch]
+            done += len(chunk)
+            self.queued[chunk] = False
+            chunk = chunk[self.store.getRows(chunk) > -1] # skip dead ones
+            if len(chunk) > 0:
+                update(chunk, self.ticks - self.last[chunk])
+                self.last[chunk] = self.ticks
+            if time.perf_counter() - start >= self.budget:
+                break
+
+        self.queue    = self.queue[done:]
+        self.updated  = done
+        self.deferred = len(self.queue)
+        self.elapsed  = time.perf_counter() - start
+        self.ticks   += 1
+        return done
+
+
+# ---------------------------------------------------------------------
+
+def awareness(store, player, radius=3, scale=3.0, index=None):
+    """ Returns a simple AI update, which lets entities chase a player
+    within `radius` tiles and idle otherwise. Given a RegionIndex,
+    entities which cannot reach the player do not chase.
+    """
+    def update(ids, elapsed):
+        rows = store.getRows(ids)
+        pos  = store.columns['position'][rows]
+        x = numpy.floor(pos[:, 0] / scale).astype(numpy.int64)
+        y = numpy.floor(pos[:, 2] / scale).astype(numpy.int64)
+        near = numpy.maximum(numpy.abs(x - player[0]), numpy.abs(y - player[1])) <= radius
+        if index is not None:
+            near &= index.getComponents(x, y) == index.getComponent(player)
+        store.columns['ai'][rows] = numpy.where(near, entity.CHASE, entity.IDLE)
+    return update
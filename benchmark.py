@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+""" Timings of the hot paths, kept out of the unit tests because they
+depend on the machine. Run as `benchmark.py [NAME...]`.
+"""
+
+import sys, time
+
+import numpy
+
+
+def measure(func, repeat=10) -> float:
+    """ Returns the best time of `repeat` calls in milliseconds.
+    """
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def patch(size=256):
+    """ Terrain patch after editing a single cell.
+    """
+    import dungeon
+
+    d = dungeon.Dungeon()
+    d.loadFromMemory('{0}x{0}\n'.format(size) + '\n'.join(('#.' * (size // 2)) if y % 2 else ('.' * size)
+        for y in range(size)))
+    vb = dungeon.VertexBuilder()
+    vb.loadFromDungeon(d)
+    arrays = [vb.toArrays()]
+
+    def edit():
+        x = y = size // 2
+        d[(x, y)] = dungeon.Cell(x, y, '#' if d[(x, y)].isFloor() else '.')
+        arrays[0] = vb.patch(d, [(x, y)], arrays[0])
+    return measure(edit)
+
+
+def visibility(n=500):
+    """ Line of sight for a batch of random pairs on the demo level.
+    """
+    import dungeon, raycast
+
+    d = dungeon.Dungeon()
+    d.loadFromFile('demo.txt')
+    caster = raycast.Raycaster(d, 3.0)
+    rng = numpy.random.default_rng(2)
+    a = rng.uniform(0.0, 30.0, (n, 2))
+    b = rng.uniform(0.0, 30.0, (n, 2))
+    return measure(lambda: caster.isVisibleMany(a, b))
+
+
+def particleBatch(n=50000):
+    """ One step and quad build of a full emitter.
+    """
+    import particles
+
+    emitter = particles.ParticleEmitter(particles.SPARKS, capacity=n)
+    emitter.emit(n, (0.0, 1.0, 0.0))
+
+    def update():
+        emitter.step(1.0 / 600.0)
+        emitter.build((1.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+    return measure(update)
+
+
+BENCHMARKS = {'patch': patch, 'visibility': visibility, 'particles': particleBatch}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] if len(sys.argv) > 1 else list(BENCHMARKS)
+    for name in names:
+        print('{0:<16} {1:8.2f} ms'.format(name, BENCHMARKS[name]()))
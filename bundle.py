@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import json, mmap, os, struct, sys
+
+import numpy
+
+
+MAGIC   = b'PCAB'
+VERSION = 1
+
+# magic, version, offset and size of the JSON index
+header = struct.Struct('<4sHQQ')
+
+# blobs start at multiples of this, so numpy views are aligned
+ALIGNMENT = 16
+
+
+class BundleWriter(object):
+    """ Packs pre-decoded assets into a single file, which is read by
+    Bundle without any decoding or parsing:
+
+    - textures as RGBA pixels (bottom row first, see Texture)
+    - levels as a 2D array of symbols
+    - meshes as float32 vertex, texcoord and color arrays
+    """
+
+    def __init__(self, fname: str):
+        self.handle = open(fname, 'wb')
+        self.handle.write(header.pack(MAGIC, VERSION, 0, 0))
+        self.index = {'texture': dict(), 'level': dict(), 'mesh': dict()}
+
+    def addBlob(self, data) -> dict:
+        offset = self.handle.tell()
+        padding = -offset % ALIGNMENT
+        self.handle.write(b'\0' * padding)
+        raw = data.tobytes() if isinstance(data, numpy.ndarray) else bytes(data)
+        self.handle.write(raw)
+        return {'offset': offset + padding, 'size': len(raw)}
+
+    def addTexture(self, name: str, w: int, h: int, data) -> None:
+        if len(data) != w * h * 4:
+            raise ValueError('Texture {0} is not {1}x{2} RGBA'.format(name, w, h))
+        entry = self.addBlob(data)
+        entry.update(w=w, h=h)
+        self.index['texture'][name] = entry
+
+    def addTextureFromFile(self, name: str, fname: str) -> None:
+        import pygame
+        surface = pygame.image.load(fname)
+        data = pygame.image.tostring(surface, 'RGBA', 1)
+        self.addTexture(name, surface.get_width(), surface.get_height(), data)
+
+    def addLevel(self, name: str, dungeon) -> None:
+        symbols = numpy.ascontiguousarray(dungeon.symbols)
+        entry = self.addBlob(symbols)
+        entry.update(w=dungeon.size[0], h=dungeon.size[1])
+        self.index['level'][name] = entry
+
+    def addMesh(self, name: str, vertices, texcoords, colors) -> None:
+        entry = {'count': len(vertices)}
+        for key, array, n in [('vertices', vertices, 3), ('texcoords', texcoords, 2), ('colors', colors, 3)]:
+            array = numpy.ascontiguousarray(array, dtype=numpy.float32).reshape(len(vertices), n)
+            entry[key] = self.addBlob(array)
+        self.index['mesh'][name] = entry
+
+    def close(self) -> None:
+        raw = json.dumps(self.index).encode('utf-8')
+        offset = self.handle.tell()
+        self.handle.write(raw)
+        self.handle.seek(0)
+        self.handle.write(header.pack(MAGIC, VERSION, offset, len(raw)))
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# ---------------------------------------------------------------------
+
+class Bundle(object):
+    """ Memory-maps a file written by BundleWriter. All assets are
+    returned as numpy views onto the mapping, so nothing is copied
+    until it is uploaded to GL or turned into game objects.
+
+    @NOTE: the bundle can only be closed once no views are left.
+    """
+
+    def __init__(self):
+        self.handle = None
+        self.map    = None
+        self.index  = dict()
+
+    def loadFromFile(self, fname: str) -> bool:
+        self.handle = open(fname, 'rb')
+        self.map = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, offset, size = header.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{0} is not an asset bundle'.format(fname))
+        self.index = json.loads(self.map[offset:offset + size].decode('utf-8'))
+        return True
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.handle.close()
+        self.map    = None
+        self.handle = None
+
+    def names(self, kind: str) -> list:
+        """ Returns the names of all textures, levels or meshes.
+        """
+        return sorted(self.index.get(kind, dict()))
+
+    def getEntry(self, name: str, kind: str) -> dict:
+        entry = self.index.get(kind, dict()).get(name)
+        if entry is None:
+            raise KeyError('No {0} named {1} in bundle'.format(kind, name))
+        return entry
+
+    def view(self, blob: dict, dtype):
+        count = blob['size'] // numpy.dtype(dtype).itemsize
+        return numpy.frombuffer(self.map, dtype=dtype, count=count, offset=blob['offset'])
+
+    def texture(self, name: str) -> tuple:
+        """ Returns (w, h, pixels) for Texture.loadFromMemory().
+        """
+        entry = self.getEntry(name, 'texture')
+        return entry['w'], entry['h'], self.view(entry, numpy.uint8)
+
+    def level(self, name: str):
+        """ Returns symbols for Dungeon.loadFromArray().
+        """
+        entry = self.getEntry(name, 'level')
+        return self.view(entry, 'U1').reshape(entry['h'], entry['w'])
+
+    def mesh(self, name: str) -> tuple:
+        """ Returns (vertices, texcoords, colors) as built by
+        VertexBuilder.toArrays().
+        """
+        entry = self.getEntry(name, 'mesh')
+        return tuple(self.view(entry[key], numpy.float32).reshape(entry['count'], n)
+            for key, n in [('vertices', 3), ('texcoords', 2), ('colors', 3)])
+
+
+# ---------------------------------------------------------------------
+
+def build(fname: str, sources: list, meshes=True) -> None:
+    """ Builds a bundle from *.png and level files, which are named
+    after their file name without extension. If `meshes` is set, a
+    lit terrain mesh is built for each level as well.
+    """
+    import dungeon
+
+    with BundleWriter(fname) as writer:
+        for source in sources:
+            name, ext = os.path.splitext(os.path.basename(source))
+            if ext.lower() == '.png':
+                writer.addTextureFromFile(name, source)
+                continue
+
+            d = dungeon.Dungeon()
+            d.loadFromFile(source)
+            writer.addLevel(name, d)
+            if meshes:
+                # same lighting as the game bakes
+                lighting = dungeon.Lighting()
+                lighting.loadFromDungeon(d)
+                vb = dungeon.VertexBuilder()
+                vb.loadFromDungeon(d, lighting)
+                writer.addMesh(name, *vb.toArrays())
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('usage: bundle.py OUTPUT SOURCE...')
+        print('e.g.   bundle.py assets.bundle *.png demo.txt')
+        sys.exit(1)
+    build(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,203 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections, ctypes, queue, threading
+
+import numpy
+import pygame
+import OpenGL.GL as gl
+
+
+class FrameReader(object):
+    """ Reads the framebuffer back through a ring of `count` pixel
+    buffer objects: each read() only starts an asynchronous transfer
+    and returns the frame started `count` reads earlier (None for the
+    first `count` reads), which has arrived by then, so the pipeline
+    does not stall. Frames are RGBA
+    arrays (h, w, 4), bottom row first. Without PBO support, frames are
+    read synchronously.
+    """
+
+    def __init__(self, w: int, h: int, count=3):
+        self.size    = (w, h)
+        self.count   = count
+        self.buffers = list()
+        self.next    = 0 # buffer used by the next read
+        self.pending = collections.deque() # buffers in flight, oldest first
+
+    @staticmethod
+    def isSupported() -> bool:
+        return bool(gl.glGenBuffers) and bool(gl.glMapBuffer)
+
+    def create(self) -> None:
+        if not self.isSupported():
+            return
+        w, h = self.size
+        self.buffers = [int(buf) for buf in numpy.atleast_1d(gl.glGenBuffers(self.count))]
+        for buf in self.buffers:
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buf)
+            gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, w * h * 4, None, gl.GL_STREAM_READ)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+    def destroy(self) -> None:
+        if len(self.buffers) > 0:
+            gl.glDeleteBuffers(len(self.buffers), self.buffers)
+        self.buffers = list()
+        self.pending.clear()
+
+    def fetch(self, buf):
+        """ Copies the pixels of a buffer, this waits for its transfer.
+        """
+        w, h = self.size
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buf)
+        ptr = gl.glMapBuffer(gl.GL_PIXEL_PACK_BUFFER, gl.GL_READ_ONLY)
+        frame = numpy.frombuffer(ctypes.string_at(ptr, w * h * 4), dtype=numpy.uint8)
+        gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        return frame.reshape(h, w, 4)
+
+    def read(self):
+        """ Starts reading the current framebuffer and returns an older
+        frame, or None while the ring is filling up.
+        """
+        w, h = self.size
+        if len(self.buffers) == 0:
+            pixels = gl.glReadPixels(0, 0, w, h, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+            return numpy.frombuffer(bytes(pixels), dtype=numpy.uint8).reshape(h, w, 4)
+
+        frame = None
+        buf = self.buffers[self.next]
+        if len(self.pending) == self.count:
+            # the oldest transfer uses this buffer
+            frame = self.fetch(self.pending.popleft())
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, buf)
+        gl.glReadPixels(0, 0, w, h, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+        self.pending.append(buf)
+        self.next = (self.next + 1) % self.count
+        return frame
+
+    def flush(self) -> list:
+        """ Returns all frames still in flight, oldest first.
+        """
+        frames = [self.fetch(buf) for buf in self.pending]
+        self.pending.clear()
+        return frames
+
+
+# ---------------------------------------------------------------------
+
+class FrameWriter(threading.Thread):
+    """ Encodes frames in the background. A `target` containing a
+    format field (e.g. 'shots/%05d.png') is written as an image
+    sequence, anything else as raw RGBA video (top row first), e.g. for
+    ffmpeg (or a named pipe it reads from). If encoding
+    falls behind by more than `backlog` frames, new frames are dropped
+    (and counted) rather than stalling the game.
+    """
+
+    def __init__(self, target: str, size, backlog=16):
+        super().__init__(name='capture', daemon=True)
+        self.target  = target
+        self.size    = size
+        self.frames  = queue.Queue(maxsize=backlog)
+        self.written = 0
+        self.dropped = 0
+        self.error   = None
+
+    def submit(self, frame) -> bool:
+        try:
+            self.frames.put_nowait(frame)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def run(self):
+        handle = None
+        try:
+            if '%' not in self.target:
+                handle = open(self.target, 'wb')
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                # OpenGL delivers the bottom row first
+                frame = numpy.ascontiguousarray(frame[::-1])
+                if handle is not None:
+                    handle.write(frame.tobytes())
+                else:
+                    surface = pygame.image.frombuffer(frame.tobytes(), self.size, 'RGBA')
+                    pygame.image.save(surface, self.target % self.written)
+                self.written += 1
+        except Exception as error:
+            self.error = error
+            # keep consuming, so submit() and stop() never block
+            while self.frames.get() is not None:
+                pass
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def stop(self):
+        """ Writes all queued frames, then joins the thread. Re-raises
+        an error that occurred while writing.
+        """
+        self.frames.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+# ---------------------------------------------------------------------
+
+class Recorder(object):
+    """ Captures every presented frame to a FrameWriter. Call grab()
+    with the finished frame in the back buffer (before flipping) or
+    repeat() if the previous frame is shown again. Frames arrive a few
+    grabs late, so repeats are queued in order with them.
+    """
+
+    FRAME  = 'frame'
+    REPEAT = 'repeat'
+
+    def __init__(self, target: str, w: int, h: int, latency=3, backlog=16):
+        self.reader = FrameReader(w, h, latency)
+        self.reader.create()
+        self.writer = FrameWriter(target, (w, h), backlog)
+        self.writer.start()
+
+        self.order = collections.deque() # grabbed frames and repeats
+        self.ready = collections.deque() # frames read back
+        self.last  = None
+
+    def grab(self) -> None:
+        self.order.append(self.FRAME)
+        frame = self.reader.read()
+        if frame is not None:
+            self.ready.append(frame)
+        self.emit()
+
+    def repeat(self) -> None:
+        self.order.append(self.REPEAT)
+        self.emit()
+
+    def emit(self) -> None:
+        while len(self.order) > 0:
+            if self.order[0] == self.REPEAT:
+                if self.last is not None:
+                    self.writer.submit(self.last)
+            elif len(self.ready) > 0:
+                self.last = self.ready.popleft()
+                self.writer.submit(self.last)
+            else:
+                break
+            self.order.popleft()
+
+    def close(self) -> None:
+        """ Writes the frames still in flight and stops the writer.
+        """
+        self.ready.extend(self.reader.flush())
+        self.emit()
+        self.reader.destroy()
+        self.writer.stop()
@@ -1,10 +1,84 @@
 #!/usr/bin/python3 
 # -*- coding: utf-8 -*-
 
+import collections, math, time
+
+import numpy
 import pygame
 import OpenGL.GL as gl
 
 
+class RenderState(object):
+    """ Shadows the GL state that is changed per draw call and skips
+    calls which would not change anything. Every PyOpenGL call has a
+    notable Python overhead, so this pays off directly. `issued` and
+    `skipped` count the forwarded and the dropped calls.
+
+    @NOTE: call reset() after creating a new GL context.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.texture      = None   # bound GL_TEXTURE_2D id
+        self.capabilities = dict() # capability -> enabled
+        self.matrix_mode  = None
+        self.projection   = None   # key of the last projection setup
+
+        self.issued  = 0
+        self.skipped = 0
+
+    def bindTexture(self, tex_id):
+        if tex_id == self.texture:
+            self.skipped += 1
+            return
+        gl.glBindTexture(gl.GL_TEXTURE_2D, tex_id)
+        self.texture = tex_id
+        self.issued += 1
+
+    def enable(self, capability):
+        if self.capabilities.get(capability) is True:
+            self.skipped += 1
+            return
+        gl.glEnable(capability)
+        self.capabilities[capability] = True
+        self.issued += 1
+
+    def disable(self, capability):
+        if self.capabilities.get(capability) is False:
+            self.skipped += 1
+            return
+        gl.glDisable(capability)
+        self.capabilities[capability] = False
+        self.issued += 1
+
+    def matrixMode(self, mode):
+        if mode == self.matrix_mode:
+            self.skipped += 1
+            return
+        gl.glMatrixMode(mode)
+        self.matrix_mode = mode
+        self.issued += 1
+
+    def changeProjection(self, key) -> bool:
+        """ Returns whether the projection identified by `key` (e.g.
+        a tuple of its parameters) differs from the current one and
+        needs to be set up.
+        """
+        if key == self.projection:
+            self.skipped += 1
+            return False
+        self.projection = key
+        return True
+
+
+# shared by all drawing code
+state = RenderState()
+
+
+# ---------------------------------------------------------------------
+
 class Texture(object):
     def __init__(self):
         self.id = None
@@ -14,10 +88,15 @@ class Texture(object):
     def loadFromFile(self, fname):
         surface = pygame.image.load(fname).convert_alpha()
         data = pygame.image.tostring(surface, "RGBA", 1)
-        self.w = surface.get_width()
-        self.h = surface.get_height()
+        return self.loadFromMemory(surface.get_width(), surface.get_height(), data)
+
+    def loadFromMemory(self, w, h, data):
+        """ Upload decoded RGBA pixels, e.g. bytes or a numpy array.
+        """
+        self.w = w
+        self.h = h
 
-        gl.glEnable(gl.GL_TEXTURE_2D)
+        state.enable(gl.GL_TEXTURE_2D)
         self.id = gl.glGenTextures(1)
         self.bind()
         gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGBA, self.w, self.h, 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, data)
@@ -30,10 +109,10 @@ class Texture(object):
 
     @staticmethod
     def unbind():
-        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        state.bindTexture(0)
 
     def bind(self):
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.id)
+        state.bindTexture(self.id)
 
 
 # ---------------------------------------------------------------------
@@ -76,6 +155,61 @@ class FrameAnimator(object):
                 self.running = False
 
 
+# ---------------------------------------------------------------------
+
+class AnimationClock(object):
+    """ Common time base (in ticks) of all animations. Sprites only
+    store when their animation was started and derive the current frame
+    from that, so advancing all of them is a single increment.
+    """
+
+    def __init__(self):
+        self.tick = 0
+
+    def step(self):
+        self.tick += 1
+
+
+class Animation(object):
+    """ Definition of a sprite-sheet animation, shared by all sprites
+    playing it: `num_frames` frames of `num_ticks` ticks each, which are
+    laid out horizontally within `rect` (left, top, w, h) of `texture`.
+    The texcoords of all frames are computed once.
+    """
+
+    def __init__(self, texture, num_frames, num_ticks, loop=False, rect=(0.0, 0.0, 1.0, 1.0)):
+        self.texture    = texture
+        self.num_frames = num_frames
+        self.num_ticks  = num_ticks
+        self.loop       = loop
+
+        left, top, w, h = rect
+        w /= num_frames
+        lefts = left + numpy.arange(num_frames) * w
+        u = lefts[:, numpy.newaxis] + QUAD_CORNERS[:, 0] * w
+        v = numpy.broadcast_to(top + (1.0 - QUAD_CORNERS[:, 1]) * h, u.shape)
+        # (frame, corner, uv) in the order of Sprite2D.clip()
+        self.texcoords = numpy.stack((u, v), axis=-1).astype(numpy.float32)
+        self.texcoords.flags.writeable = False
+        self.frames = tuple(tuple(tuple(uv) for uv in quad) for quad in self.texcoords.tolist())
+        self.rects  = tuple((l, top, w, h) for l in lefts.tolist())
+
+    def getDuration(self) -> int:
+        return self.num_frames * self.num_ticks
+
+    def getFrame(self, elapsed):
+        """ Returns the frame shown `elapsed` ticks after the start
+        (also for an array of them), the last one once finished.
+        """
+        frames = numpy.maximum(elapsed, 0) // self.num_ticks
+        if self.loop:
+            return frames % self.num_frames
+        return numpy.minimum(frames, self.num_frames - 1)
+
+    def isFinished(self, elapsed) -> bool:
+        return not self.loop and elapsed >= self.getDuration()
+
+
 # ---------------------------------------------------------------------
 
 class Sprite2D(object):
@@ -139,10 +273,18 @@ class Sprite2D(object):
         bl = (left,     top)
         self.texcoords = (tl, tr, br, bl)
 
+    def showFrame(self, animation, frame):
+        """ Clip to a frame of an Animation, using its precomputed
+        texcoords.
+        """
+        self.texrect   = animation.rects[frame]
+        self.texcoords = animation.frames[frame]
+
     def transform(self):
         gl.glTranslate(self.x - self.origin[0] * self.w, self.y - self.origin[1] * self.h, 0.0)
 
     def render(self):
+        state.matrixMode(gl.GL_MODELVIEW)
         gl.glPushMatrix()
         gl.glLoadIdentity()
         self.transform()
@@ -187,3 +329,525 @@ class Sprite3D(Sprite2D):
         gl.glRotate(self.rotate, 0.0, 1.0, 0.0)
         
 
+
+# ---------------------------------------------------------------------
+
+class RenderTarget(object):
+    """ Offscreen framebuffer with a color texture, which can be drawn
+    like any other texture afterwards. A depth buffer is only attached
+    if requested, e.g. for 3D drawing.
+    """
+
+    def __init__(self):
+        self.fbo     = None
+        self.depth   = None # renderbuffer
+        self.texture = Texture()
+
+    @staticmethod
+    def isSupported() -> bool:
+        return bool(gl.glGenFramebuffers)
+
+    def create(self, w, h, depth=False):
+        if self.fbo is not None:
+            self.destroy()
+        self.texture.loadFromMemory(w, h, None)
+        self.fbo = gl.glGenFramebuffers(1)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.fbo)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0,
+            gl.GL_TEXTURE_2D, self.texture.id, 0)
+        if depth:
+            self.depth = gl.glGenRenderbuffers(1)
+            gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.depth)
+            gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_DEPTH_COMPONENT24, w, h)
+            gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+            gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_DEPTH_ATTACHMENT,
+                gl.GL_RENDERBUFFER, self.depth)
+        complete = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) == gl.GL_FRAMEBUFFER_COMPLETE
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        return complete
+
+    def destroy(self):
+        gl.glDeleteFramebuffers(1, [self.fbo])
+        if self.depth is not None:
+            gl.glDeleteRenderbuffers(1, [self.depth])
+        if state.texture == self.texture.id:
+            Texture.unbind()
+        gl.glDeleteTextures([self.texture.id])
+        self.fbo = None
+        self.depth = None
+        self.texture = Texture()
+
+    def bind(self):
+        """ Redirect drawing into the texture.
+        """
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.fbo)
+        gl.glViewport(0, 0, self.texture.w, self.texture.h)
+
+    @staticmethod
+    def release(w, h):
+        """ Draw to the window (of the given size) again.
+        """
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        gl.glViewport(0, 0, w, h)
+
+
+# ---------------------------------------------------------------------
+
+class HudLayer(object):
+    """ Composes static HUD sprites into a RenderTarget, which is only
+    redrawn if any sprite was changed (or invalidate() was called) and
+    else drawn as a single screen-sized quad. Animated elements should
+    be drawn live on top.
+
+    Must be rendered inside an ortho projection of the same size.
+    """
+
+    def __init__(self):
+        self.elements = list()
+        self.target   = None
+        self.screen   = Sprite2D()
+        self.drawn    = None # state of the elements inside the target
+        self.redraws  = 0
+
+    def add(self, sprite):
+        self.elements.append(sprite)
+        self.invalidate()
+
+    def remove(self, sprite):
+        self.elements.remove(sprite)
+        self.invalidate()
+
+    def invalidate(self):
+        self.drawn = None
+
+    def getState(self):
+        return tuple((s.x, s.y, s.w, s.h, s.origin, s.texrect, s.color,
+            None if s.texture is None else s.texture.id) for s in self.elements)
+
+    def render(self, w, h):
+        if self.target is None:
+            if not RenderTarget.isSupported():
+                # draw directly instead
+                for sprite in self.elements:
+                    sprite.render()
+                return
+            self.target = RenderTarget()
+        if (self.target.texture.w, self.target.texture.h) != (w, h):
+            self.target.create(w, h)
+            self.screen.resize(w, h)
+            self.screen.centerTo(0.0, 0.0)
+            self.invalidate()
+
+        current = self.getState()
+        if current != self.drawn:
+            self.target.bind()
+            gl.glClearColor(0.0, 0.0, 0.0, 0.0)
+            gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+            for sprite in self.elements:
+                sprite.render()
+            RenderTarget.release(w, h)
+            self.drawn = current
+            self.redraws += 1
+
+        self.screen.texture = self.target.texture
+        self.screen.render()
+
+
+# ---------------------------------------------------------------------
+
+class ResolutionScaler(object):
+    """ Picks the fraction of the window resolution to render at, so
+    the measured frame time meets `target` seconds. Fill rate scales
+    with the number of pixels, so the scale is only raised if the
+    frame time predicted for the larger area still fits the target.
+    After each change, the scale is kept for `cooldown` frames to let
+    the average settle.
+    """
+
+    def __init__(self, target=1.0 / 60.0, minimum=0.25, maximum=1.0, step=0.125,
+            smoothing=0.1, cooldown=30):
+        self.target    = target
+        self.minimum   = minimum
+        self.maximum   = maximum
+        self.step      = step
+        self.smoothing = smoothing
+        self.cooldown  = cooldown
+
+        self.scale   = maximum
+        self.average = None # moving average of the frame time
+        self.wait    = 0
+
+    def update(self, frame_time: float) -> bool:
+        """ Adds a measured frame time and returns whether the scale
+        was changed.
+        """
+        if self.average is None:
+            self.average = frame_time
+        else:
+            self.average += (frame_time - self.average) * self.smoothing
+        if self.wait > 0:
+            self.wait -= 1
+            return False
+
+        scale = self.scale
+        if self.average > self.target:
+            scale = max(self.scale - self.step, self.minimum)
+        elif self.scale < self.maximum:
+            larger = min(self.scale + self.step, self.maximum)
+            if self.average * (larger / self.scale) ** 2 < self.target * 0.9:
+                scale = larger
+        if scale == self.scale:
+            return False
+
+        # frames at the new scale will take about that long
+        self.average *= (scale / self.scale) ** 2
+        self.scale = scale
+        self.wait  = self.cooldown
+        return True
+
+    def getSize(self, w: int, h: int) -> tuple:
+        return max(int(round(w * self.scale)), 1), max(int(round(h * self.scale)), 1)
+
+
+class ScaledScene(object):
+    """ Renders the 3D scene into a RenderTarget at a (dynamically
+    scaled) lower resolution and upscales it to the window with nearest
+    filtering, which suits pixel art. Use begin() and end() around the
+    scene, then render() it inside an ortho projection of the window
+    size. Without framebuffer support, the scene is drawn directly.
+
+    The scene's GPU time is measured by up to `count` timer queries in
+    flight, whose results are picked up once available (usually one or
+    two frames later), so measuring never stalls the pipeline. Without
+    timer queries, every `interval`-th frame is finished and timed.
+    """
+
+    def __init__(self, scaler=None, count=3, interval=30):
+        self.scaler   = scaler if scaler is not None else ResolutionScaler()
+        self.target   = None
+        self.screen   = Sprite2D()
+        self.count    = count
+        self.interval = interval
+        self.frames   = 0
+
+        self.queries = list()
+        self.pending = collections.deque() # queries in flight, oldest first
+        self.query   = None # of the current frame
+        self.started = None # of the current frame, without queries
+
+    @staticmethod
+    def isTimerSupported() -> bool:
+        return bool(gl.glQueryCounter)
+
+    def begin(self, w, h):
+        """ Redirect drawing into the scaled target and clear it.
+        """
+        self.query   = None
+        self.started = None
+        if self.isTimerSupported():
+            if len(self.queries) == 0:
+                self.queries = [int(query) for query in numpy.atleast_1d(gl.glGenQueries(self.count))]
+            free = [query for query in self.queries if query not in self.pending]
+            if len(free) > 0:
+                self.query = free[0]
+                gl.glBeginQuery(gl.GL_TIME_ELAPSED, self.query)
+        elif self.frames % self.interval == 0:
+            self.started = time.perf_counter()
+        self.frames += 1
+
+        if not RenderTarget.isSupported():
+            return
+        if self.target is None:
+            self.target = RenderTarget()
+        size = self.scaler.getSize(w, h)
+        if (self.target.texture.w, self.target.texture.h) != size:
+            self.target.create(*size, depth=True)
+        self.target.bind()
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+
+    def end(self, w, h):
+        """ Draw to the window again and adapt the scale to the scene
+        times measured so far.
+        """
+        if self.query is not None:
+            gl.glEndQuery(gl.GL_TIME_ELAPSED)
+            self.pending.append(self.query)
+            self.query = None
+        elif self.started is not None:
+            # @NOTE: the scene must be finished to measure its fill cost
+            gl.glFinish()
+            self.scaler.update(time.perf_counter() - self.started)
+        if self.target is not None:
+            RenderTarget.release(w, h)
+
+        # results of earlier frames, without waiting for any
+        while len(self.pending) > 0 and gl.glGetQueryObjectuiv(self.pending[0], gl.GL_QUERY_RESULT_AVAILABLE):
+            elapsed = int(gl.glGetQueryObjectuiv(self.pending.popleft(), gl.GL_QUERY_RESULT)) # ns
+            # @NOTE: some drivers saturate the (32 bit) result of the
+            # very first query, which is no frame time
+            if elapsed < 0xFFFFFFFF:
+                self.scaler.update(elapsed * 1e-9)
+
+    def render(self, w, h):
+        if self.target is None:
+            return
+        if (self.screen.w, self.screen.h) != (w, h):
+            self.screen.resize(w, h)
+            self.screen.centerTo(0.0, 0.0)
+        self.screen.texture = self.target.texture
+        self.screen.render()
+
+
+# ---------------------------------------------------------------------
+
+# corners of a quad in order topleft, topright, bottomright, bottomleft
+# as (u, v) where v points upwards, see Sprite2D.rebuild()
+QUAD_CORNERS = numpy.array([(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)], dtype=numpy.float32)
+
+
+def billboardQuads(positions, sizes, origins, right, up):
+    """ Builds camera-facing quads for N sprites at once. `positions`
+    is (N, 3), `sizes` and `origins` are (N, 2) while `right` and `up`
+    are the camera's axes in world space. Returns (N, 4, 3) vertices.
+    """
+    # offset of each corner relative to the sprite's origin
+    offset = (QUAD_CORNERS[numpy.newaxis] - origins[:, numpy.newaxis]) * sizes[:, numpy.newaxis]
+    right = numpy.asarray(right, dtype=numpy.float32)
+    up    = numpy.asarray(up, dtype=numpy.float32)
+    return (positions[:, numpy.newaxis]
+        + offset[..., 0:1] * right
+        + offset[..., 1:2] * up)
+
+
+# columns of all sprites which are read by BillboardSystem.update() and
+# the clock's tick, see BillboardSystem.getState()
+BillboardState = collections.namedtuple('BillboardState', ['tick', 'active', 'positions', 'sizes',
+    'origins', 'texrects', 'slots', 'num_frames', 'num_ticks', 'started', 'looping', 'playing'])
+
+
+class BillboardSystem(object):
+    """ Holds all world sprites as columns of numpy arrays, so that
+    animating, facing them towards the camera and sorting them is done
+    in a single vectorized pass per frame, regardless of their number.
+    Sprites are referred to by the index returned from add().
+    """
+
+    def __init__(self, capacity=64, clock=None):
+        # @NOTE: step a shared clock instead of this system
+        self.clock    = clock if clock is not None else AnimationClock()
+        self.textures = list()
+        self.count    = 0
+        self.free     = list()
+
+        self.active    = numpy.zeros(0, dtype=bool)
+        self.positions = numpy.zeros((0, 3), dtype=numpy.float32)
+        self.sizes     = numpy.zeros((0, 2), dtype=numpy.float32)
+        self.origins   = numpy.zeros((0, 2), dtype=numpy.float32)
+        self.texrects  = numpy.zeros((0, 4), dtype=numpy.float32) # left, top, w, h
+        self.slots     = numpy.zeros(0, dtype=numpy.int32)        # index into textures
+        # animation state: number of frames, ticks per frame, start tick
+        self.num_frames = numpy.ones(0, dtype=numpy.int32)
+        self.num_ticks  = numpy.ones(0, dtype=numpy.int32)
+        self.started    = numpy.zeros(0, dtype=numpy.int64)
+        self.looping    = numpy.zeros(0, dtype=bool)
+        # played Animation (index into animations) or -1 for clip()
+        self.playing    = numpy.zeros(0, dtype=numpy.int32)
+        self.resize(capacity)
+
+        # texcoords of all animations' frames, concatenated
+        self.animations = list()
+        self.offsets    = numpy.zeros(0, dtype=numpy.int64)
+        self.table      = numpy.zeros((0, 4, 2), dtype=numpy.float32)
+
+        # output of update()
+        self.vertices  = numpy.zeros((0, 3), dtype=numpy.float32)
+        self.texcoords = numpy.zeros((0, 2), dtype=numpy.float32)
+        self.batches   = list() # (texture, first vertex, vertex count)
+
+    def resize(self, capacity):
+        def grow(array, fill):
+            out = numpy.full((capacity, ) + array.shape[1:], fill, dtype=array.dtype)
+            out[:len(array)] = array
+            return out
+        self.active     = grow(self.active, False)
+        self.positions  = grow(self.positions, 0.0)
+        self.sizes      = grow(self.sizes, 0.0)
+        self.origins    = grow(self.origins, 0.0)
+        self.texrects   = grow(self.texrects, 0.0)
+        self.slots      = grow(self.slots, 0)
+        self.num_frames = grow(self.num_frames, 1)
+        self.num_ticks  = grow(self.num_ticks, 1)
+        self.started    = grow(self.started, 0)
+        self.looping    = grow(self.looping, False)
+        self.playing    = grow(self.playing, -1)
+
+    def add(self, texture, x, y, z, w=1.0, h=1.0, origin=(0.5, 0.0)) -> int:
+        """ Adds a sprite standing at (x, y, z), which is positioned
+        relative to its size by `origin` (default: bottom center).
+        """
+        if len(self.free) > 0:
+            i = self.free.pop()
+        else:
+            if self.count == len(self.active):
+                self.resize(max(1, 2 * self.count))
+            i = self.count
+            self.count += 1
+
+        if texture not in self.textures:
+            self.textures.append(texture)
+        self.active[i]     = True
+        self.positions[i]  = (x, y, z)
+        self.sizes[i]      = (w, h)
+        self.origins[i]    = origin
+        self.texrects[i]   = (0.0, 0.0, 1.0, 1.0)
+        self.slots[i]      = self.textures.index(texture)
+        self.num_frames[i] = 1
+        self.num_ticks[i]  = 1
+        self.started[i]    = self.tick
+        self.looping[i]    = False
+        self.playing[i]    = -1
+        return i
+
+    @property
+    def tick(self):
+        return self.clock.tick
+
+    def remove(self, i):
+        self.active[i] = False
+        self.free.append(i)
+
+    def moveTo(self, i, x, y, z):
+        self.positions[i] = (x, y, z)
+
+    def clip(self, i, left, top, w, h):
+        """ Sets the texture rect, which is split into the animation
+        frames horizontally.
+        """
+        self.texrects[i] = (left, top, w, h)
+        self.playing[i]  = -1
+
+    def animate(self, i, num_frames, num_ticks, loop=False):
+        """ (Re)starts the animation with the current tick.
+        """
+        self.num_frames[i] = num_frames
+        self.num_ticks[i]  = num_ticks
+        self.started[i]    = self.tick
+        self.looping[i]    = loop
+        self.playing[i]    = -1
+
+    def play(self, i, animation):
+        """ (Re)starts a shared Animation with the current tick.
+        """
+        if animation not in self.animations:
+            self.animations.append(animation)
+            self.offsets = numpy.append(self.offsets, len(self.table))
+            self.table = numpy.concatenate((self.table, animation.texcoords))
+        if animation.texture is not None:
+            if animation.texture not in self.textures:
+                self.textures.append(animation.texture)
+            self.slots[i] = self.textures.index(animation.texture)
+        self.animate(i, animation.num_frames, animation.num_ticks, animation.loop)
+        self.playing[i] = self.animations.index(animation)
+
+    def getState(self, copy=True) -> BillboardState:
+        """ Returns the sprites' columns. Unless they are copied, these
+        are views which change along with the sprites; a copy can be
+        handed to another thread for rendering.
+        """
+        n = self.count
+        columns = [getattr(self, name)[:n] for name in BillboardState._fields[1:]]
+        if copy:
+            columns = [column.copy() for column in columns]
+        return BillboardState(self.tick, *columns)
+
+    def getFrames(self, state=None):
+        """ Returns the animation frame of each sprite in the given
+        (default: current) state.
+        """
+        if state is None:
+            state = self.getState(copy=False)
+        frames = numpy.maximum(state.tick - state.started, 0) // state.num_ticks
+        return numpy.where(state.looping, frames % state.num_frames,
+            numpy.minimum(frames, state.num_frames - 1))
+
+    def isIdle(self) -> bool:
+        """ Returns whether all animations have finished.
+        """
+        n = self.count
+        running = self.looping[:n] | (self.getFrames() < self.num_frames[:n] - 1)
+        return not numpy.any(running & self.active[:n])
+
+    def step(self):
+        """ Advance all animations by one tick.
+        """
+        self.clock.step()
+
+    def update(self, eye, angle, state=None):
+        """ Builds the quads of all sprites facing a camera at `eye`
+        which is rotated by `angle` degrees around the y-axis (see
+        render.Camera). Quads are grouped by texture and sorted front
+        to back within each group. Sprites are taken from the given
+        (default: current) state, see getState().
+        """
+        if state is None:
+            state = self.getState(copy=False)
+        radians = angle * math.pi / 180.0
+        right   = (math.cos(radians), 0.0, math.sin(radians))
+        ahead   = (math.sin(radians), 0.0, -math.cos(radians))
+        up      = (0.0, 1.0, 0.0)
+
+        index = numpy.flatnonzero(state.active)
+        positions = state.positions[index]
+        depth = (positions - numpy.asarray(eye, dtype=numpy.float32)) @ numpy.asarray(ahead, dtype=numpy.float32)
+        slots = state.slots[index]
+        order = numpy.lexsort((depth, slots))
+        index = index[order]
+        slots = slots[order]
+
+        # vertices
+        quads = billboardQuads(positions[order], state.sizes[index], state.origins[index], right, up)
+        self.vertices = numpy.ascontiguousarray(quads.reshape(-1, 3), dtype=numpy.float32)
+
+        # texcoords of the current frame, as built by Sprite2D.clip()
+        frames = self.getFrames(state)[index]
+        rects = state.texrects[index].copy()
+        rects[:, 2] /= state.num_frames[index]
+        rects[:, 0] += frames * rects[:, 2]
+        u = rects[:, numpy.newaxis, 0] + QUAD_CORNERS[:, 0] * rects[:, numpy.newaxis, 2]
+        v = rects[:, numpy.newaxis, 1] + (1.0 - QUAD_CORNERS[:, 1]) * rects[:, numpy.newaxis, 3]
+        texcoords = numpy.stack((u, v), axis=-1)
+        # or looked up for shared animations
+        playing = state.playing[index]
+        shared = playing > -1
+        texcoords[shared] = self.table[self.offsets[playing[shared]] + frames[shared]]
+        self.texcoords = numpy.ascontiguousarray(texcoords.reshape(-1, 2), dtype=numpy.float32)
+
+        # one batch per texture
+        self.batches = list()
+        if len(slots) > 0:
+            starts = numpy.flatnonzero(numpy.diff(slots, prepend=-1))
+            ends   = numpy.append(starts[1:], len(slots))
+            for first, last in zip(starts, ends):
+                self.batches.append((self.textures[slots[first]], 4 * int(first), 4 * int(last - first)))
+
+    def render(self):
+        """ Draws the quads built by update() using world coordinates.
+        """
+        if len(self.batches) == 0:
+            return
+        state.matrixMode(gl.GL_MODELVIEW)
+        gl.glPushMatrix()
+        gl.glLoadIdentity()
+        gl.glColor3f(1.0, 1.0, 1.0)
+
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glVertexPointer(3, gl.GL_FLOAT, 0, self.vertices)
+        gl.glTexCoordPointer(2, gl.GL_FLOAT, 0, self.texcoords)
+        for texture, first, count in self.batches:
+            texture.bind()
+            gl.glDrawArrays(gl.GL_QUADS, first, count)
+        gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+
+        gl.glPopMatrix()
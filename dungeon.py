@@ -1,6 +1,12 @@
 #!/usr/bin/python3 
 # -*- coding: utf-8 -*-
 
+import os, struct, time
+
+import numpy
+
+import tiles
+
 
 class VertexBuilder(object):
     """ Builds dungeon tile vertices. (x, y) are relative to the flat
@@ -11,6 +17,12 @@ class VertexBuilder(object):
     
     def __init__(self):
         self.data = list()
+        # unlit colors per quad
+        self.base = list()
+        # quads are ordered by cell (row by row), those of cell i are
+        # data[starts[i]:starts[i + 1]]
+        self.size   = (0, 0)
+        self.starts = numpy.zeros(1, dtype=numpy.int64)
 
     def no_walls(self):
         # monkeypatch to replace walls with empty vertices
@@ -91,68 +103,272 @@ class VertexBuilder(object):
         # build vertices "at the eastern edge"
         return self.westWall(x+1, y, z, w, h)
     
-    def loadFromDungeon(self, dungeon) -> bool:
+    def loadFromDungeon(self, dungeon, lighting=None) -> bool:
+        """ Build all quads. If `lighting` is given, it is baked into
+        the vertex colors.
+        """
+        data = list()
+        counts = list()
+        for y in range(dungeon.size[1]):
+            for x in range(dungeon.size[0]):
+                quads = self.buildCell(dungeon, x, y)
+                data.extend(quads)
+                counts.append(len(quads))
+        self.data   = data
+        self.base   = [c for v, t, c in data]
+        self.size   = dungeon.size
+        self.starts = numpy.zeros(len(counts) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=self.starts[1:])
+        if lighting is not None:
+            self.bake(dungeon, lighting)
+        return True
+
+    def buildCell(self, dungeon, x: int, y: int) -> list:
+        """ Returns the quads of a single cell, which depend on the cell
+        and its direct neighbors.
+        """
         white = (1.0, 1.0, 1.0)
         black = (0.0, 0.0, 0.0)
         yellow = (1.0, 1.0, 0.0)
 
         data = list()
-        for y in range(dungeon.size[1]):
-            for x in range(dungeon.size[0]):
-                cell = dungeon[(x, y)]
-                if cell.isWall():
-                    continue
-                
-                # query neighbor cells
-                north = cell.getNeighbor(dungeon, (0, -1))
-                south = cell.getNeighbor(dungeon, (0,  1))
-                east  = cell.getNeighbor(dungeon, ( 1, 0))
-                west  = cell.getNeighbor(dungeon, (-1, 0))
-                
-                if cell.isFloor():
-                    v, t, c = self.floor(x, y, 0, 3.0, 2.0)
-                    data.append((v, t, c))
-
-                if not cell.isWall():
-                    if north.isWall():
-                        v, t, c = self.northWall(x, y, 0, 3.0, 2.0)
-                        data.append((v, t, c))
-                    if south.isWall():
-                        v, t, c = self.southWall(x, y, 0, 3.0, 2.0)
-                        data.append((v, t, c))
-                    if west.isWall():
-                        v, t, c = self.westWall(x, y, 0, 3.0, 2.0)
-                        data.append((v, t, c))
-                    if east.isWall():
-                        v, t, c = self.eastWall(x, y, 0, 3.0, 2.0)
-                        data.append((v, t, c))
-
-                if cell.isVoid():
-                    if not north.isVoid():
-                        v, t, c = self.northWall(x, y, -1, 3.0, 2.0)
-                        c = (c[0], c[1], black, black)
-                        data.append((v, t, c))
-                    if not south.isVoid():
-                        v, t, c = self.southWall(x, y, -1, 3.0, 2.0)
-                        c = (c[0], c[1], black, black)
-                        data.append((v, t, c))
-                    if not west.isVoid():
-                        v, t, c = self.westWall(x, y, -1, 3.0, 2.0)
-                        c = (c[0], c[1], black, black)
-                        data.append((v, t, c))
-                    if not east.isVoid():
-                        v, t, c = self.eastWall(x, y, -1, 3.0, 2.0) 
-                        c = (c[0], c[1], black, black)
-                        data.append((v, t, c))
-        self.data = data
-        return True
+        ids = dungeon.tiles
+        flags = tiles.registry.flags.tolist()
+        cell = ids.item(y, x)
+        if flags[cell] & tiles.OPAQUE:
+            return data
+
+        # tile ids of the neighbor cells, outside the level is wall (as
+        # for Dungeon.__getitem__)
+        w, h = dungeon.size
+        wall = tiles.registry.getId('#')
+        north = ids.item(y - 1, x) if y > 0 else wall
+        south = ids.item(y + 1, x) if y < h - 1 else wall
+        east  = ids.item(y, x + 1) if x < w - 1 else wall
+        west  = ids.item(y, x - 1) if x > 0 else wall
+        
+        # texture regions depend on the tile types, walls show the one
+        # of the wall (or ground) being faced
+        types = tiles.registry.types
+        floor = tiles.WALKABLE | tiles.SOLID
+        if flags[cell] & (floor | tiles.OPAQUE) == floor:
+            quad = self.floor(x, y, 0, 3.0, 2.0)
+            data.append(self.retexture(quad, types[cell].floor, tiles.FLOOR_RECT))
+
+        if flags[north] & tiles.OPAQUE:
+            quad = self.northWall(x, y, 0, 3.0, 2.0)
+            data.append(self.retexture(quad, types[north].wall))
+        if flags[south] & tiles.OPAQUE:
+            quad = self.southWall(x, y, 0, 3.0, 2.0)
+            data.append(self.retexture(quad, types[south].wall))
+        if flags[west] & tiles.OPAQUE:
+            quad = self.westWall(x, y, 0, 3.0, 2.0)
+            data.append(self.retexture(quad, types[west].wall))
+        if flags[east] & tiles.OPAQUE:
+            quad = self.eastWall(x, y, 0, 3.0, 2.0)
+            data.append(self.retexture(quad, types[east].wall))
+
+        if not flags[cell] & tiles.SOLID:
+            if flags[north] & tiles.SOLID:
+                v, t, c = self.retexture(self.northWall(x, y, -1, 3.0, 2.0), types[north].wall)
+                c = (c[0], c[1], black, black)
+                data.append((v, t, c))
+            if flags[south] & tiles.SOLID:
+                v, t, c = self.retexture(self.southWall(x, y, -1, 3.0, 2.0), types[south].wall)
+                c = (c[0], c[1], black, black)
+                data.append((v, t, c))
+            if flags[west] & tiles.SOLID:
+                v, t, c = self.retexture(self.westWall(x, y, -1, 3.0, 2.0), types[west].wall)
+                c = (c[0], c[1], black, black)
+                data.append((v, t, c))
+            if flags[east] & tiles.SOLID:
+                v, t, c = self.retexture(self.eastWall(x, y, -1, 3.0, 2.0), types[east].wall)
+                c = (c[0], c[1], black, black)
+                data.append((v, t, c))
+        return data
+
+    @staticmethod
+    def retexture(quad, rect, default=tiles.WALL_RECT) -> tuple:
+        """ Moves the texcoords of a quad, which were built for the
+        `default` region of the tileset, into `rect`.
+        """
+        if rect == default:
+            return quad
+        v, t, c = quad
+        left, top, w, h = rect
+        u0, v0, du, dv = default
+        t = tuple((left + (u - u0) / du * w, top + (tv - v0) / dv * h) for u, tv in t)
+        return v, t, c
+
+    def getQuads(self, x: int, y: int) -> range:
+        """ Returns the indices of the quads built for cell (x, y).
+        """
+        i = y * self.size[0] + x
+        return range(int(self.starts[i]), int(self.starts[i + 1]))
+
+    def patch(self, dungeon, cells, arrays, lighting=None) -> tuple:
+        """ Rebuilds only the quads around the given changed cells and
+        returns new `arrays` (as from toArrays) with the quads of these
+        cells replaced. Only the affected cells are touched, so this is
+        independent of the dungeon's size (except for copying arrays).
+        """
+        # geometry depends on direct neighbors, ambient occlusion on
+        # the diagonal ones as well
+        affected = set()
+        for x, y in cells:
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    if dungeon.has(x + dx, y + dy):
+                        affected.add((y + dy) * self.size[0] + x + dx)
+        affected = sorted(affected)
+
+        # replace back to front, so the ranges in front stay valid
+        old = self.starts.copy()
+        counts = numpy.diff(self.starts)
+        for i in reversed(affected):
+            y, x = divmod(i, self.size[0])
+            quads = self.buildCell(dungeon, x, y)
+            start, stop = old[i], old[i + 1]
+            self.data[start:stop] = quads
+            self.base[start:stop] = [c for v, t, c in quads]
+            counts[i] = len(quads)
+        numpy.cumsum(counts, out=self.starts[1:])
+
+        rebuilt = [range(self.starts[i], self.starts[i + 1]) for i in affected]
+        if lighting is not None:
+            self.bake(dungeon, lighting, [q for quads in rebuilt for q in quads])
+
+        # splice the new quads between the unchanged rows
+        pieces = ([], [], [])
+        prev = 0
+        for i, quads in zip(affected, rebuilt):
+            added = self.quadArrays(self.data[quads.start:quads.stop])
+            for piece, array, new in zip(pieces, arrays, added):
+                piece.append(array[4 * prev:4 * old[i]])
+                piece.append(new)
+            prev = old[i + 1]
+        for piece, array in zip(pieces, arrays):
+            piece.append(array[4 * prev:])
+        return tuple(numpy.concatenate(piece) for piece in pieces)
+
+    def bake(self, dungeon, lighting, quads=None) -> None:
+        """ (Re)compute the colors of the given quad indices (default:
+        all) from their unlit colors and the lighting.
+        """
+        if quads is None:
+            quads = range(len(self.data))
+        quads = list(quads)
+        if len(quads) == 0:
+            return
+        vertices = numpy.array([self.data[i][0] for i in quads], dtype=numpy.float32).reshape(-1, 3)
+        base     = numpy.array([self.base[i] for i in quads], dtype=numpy.float32).reshape(-1, 3)
+        colors   = base * lighting.shade(dungeon, vertices, 3.0, 2.0)
+        colors   = colors.reshape(-1, 4, 3).tolist()
+        for i, c in zip(quads, colors):
+            v, t, old = self.data[i]
+            self.data[i] = (v, t, tuple(tuple(rgb) for rgb in c))
+
+    def relight(self, dungeon, lighting, x: int, y: int, radius: float, arrays) -> tuple:
+        """ Rebake only quads built for cells within `radius` tiles of
+        (x, y), e.g. after a light was added or removed, and returns new
+        `arrays` (as from toArrays) with the colors of these quads
+        replaced. Vertices and texcoords are shared with `arrays`.
+        """
+        reach = int(radius) + 1 # quads reach into neighbor cells
+        w, h = self.size
+        x0, x1 = max(x - reach, 0), min(x + reach, w - 1)
+        quads = list()
+        rows = range(max(y - reach, 0), min(y + reach, h - 1) + 1) if x0 <= x1 else range(0)
+        for row in rows:
+            # cells of a row are contiguous
+            quads.extend(range(self.starts[row * w + x0], self.starts[row * w + x1 + 1]))
+        self.bake(dungeon, lighting, quads)
+
+        vertices, texcoords, colors = arrays
+        colors = colors.copy()
+        if len(quads) > 0:
+            colors.reshape(-1, 4, 3)[quads] = [self.data[i][2] for i in quads]
+        return vertices, texcoords, colors
+
+    def toArrays(self, first=0) -> tuple:
+        """ Returns vertices, texcoords and colors of all quads (from
+        `first` on) as float32 arrays with one row per vertex, ready for
+        glDrawArrays.
+        """
+        return self.quadArrays(self.data[first:])
+
+    @staticmethod
+    def quadArrays(data) -> tuple:
+        n = 4 * len(data)
+        vertices  = numpy.array([q[0] for q in data], dtype=numpy.float32).reshape(n, 3)
+        texcoords = numpy.array([q[1] for q in data], dtype=numpy.float32).reshape(n, 2)
+        colors    = numpy.array([q[2] for q in data], dtype=numpy.float32).reshape(n, 3)
+        return vertices, texcoords, colors
+
+# ---------------------------------------------------------------------
+
+class Lighting(object):
+    """ Static lighting which is baked into the vertex colors by the
+    VertexBuilder: ambient light, darkened at floor-level corners next
+    to walls (ambient occlusion), plus point lights such as torches
+    with a linear falloff.
+    """
+
+    def __init__(self, ambient=0.6, occlusion=0.12):
+        self.ambient   = ambient
+        self.occlusion = occlusion # per adjacent wall
+        self.lights    = dict()    # (x, y) -> (radius, color)
+
+    def addLight(self, x: int, y: int, radius=4.0, color=(1.0, 0.8, 0.5)) -> None:
+        """ Place a light in the center of cell (x, y), its radius is
+        given in tiles.
+        """
+        self.lights[(x, y)] = (radius, color)
+
+    def removeLight(self, x: int, y: int) -> None:
+        del self.lights[(x, y)]
+
+    def loadFromDungeon(self, dungeon, radius=4.0, color=(1.0, 0.8, 0.5)) -> int:
+        """ Replace all lights by one per cell whose tile emits light,
+        e.g. torches. Returns their number.
+        """
+        self.lights = {(int(x), int(y)): (radius, color)
+            for y, x in numpy.argwhere(dungeon.getMask(tiles.EMITS_LIGHT))}
+        return len(self.lights)
+
+    def shade(self, dungeon, vertices, w: float, h: float):
+        """ Returns an RGB factor per world-space vertex (N, 3), with
+        `w` and `h` being tile width and height.
+        """
+        # walls around each grid corner, outside the dungeon is wall
+        walls = numpy.pad(dungeon.getMask(tiles.OPAQUE), 1, constant_values=True).astype(numpy.float32)
+        gx = numpy.clip(numpy.rint(vertices[:, 0] / w).astype(int), 0, dungeon.size[0])
+        gy = numpy.clip(numpy.rint(vertices[:, 2] / w).astype(int), 0, dungeon.size[1])
+        count = walls[gy, gx] + walls[gy, gx + 1] + walls[gy + 1, gx] + walls[gy + 1, gx + 1]
+        on_floor = numpy.abs(vertices[:, 1]) < 1e-5
+        ao = 1.0 - numpy.where(on_floor, count * self.occlusion, 0.0)
+
+        light = numpy.repeat((self.ambient * ao)[:, numpy.newaxis], 3, axis=1)
+        for (x, y), (radius, color) in self.lights.items():
+            center = numpy.array([(x + 0.5) * w, 0.5 * h, (y + 0.5) * w], dtype=numpy.float32)
+            distance = numpy.linalg.norm(vertices - center, axis=1) / w
+            falloff = numpy.clip(1.0 - distance / radius, 0.0, 1.0)
+            light += falloff[:, numpy.newaxis] * numpy.asarray(color, dtype=numpy.float32)
+        return numpy.clip(light, 0.0, 1.0)
+
 
 # ---------------------------------------------------------------------
 
 class Cell(object):
+    """ The tile type of a symbol is looked up once, all predicates
+    test its flags, see tiles.TileRegistry.
+    """
+
     def __init__(self, x: int, y: int, symbol: str):
         self.pos      = (x, y)
         self.symbol   = symbol
+        self.tile     = tiles.registry.getId(symbol)
+        self.flags    = tiles.registry.types[self.tile].flags
         self.vertices = list()
 
         self.content = list()
@@ -173,21 +389,21 @@ class Cell(object):
         return Cell(*args, **kwargs)
 
     def isVoid(self) -> bool:
-        return self.symbol == ' '
+        return (self.flags & tiles.SOLID) == 0
 
     def isWall(self) -> bool:
-        return self.symbol == '#'
+        return (self.flags & tiles.OPAQUE) != 0
 
     def isFloor(self) -> bool:
-        return self.symbol == '.'
+        return (self.flags & (tiles.WALKABLE | tiles.SOLID | tiles.OPAQUE)) == (tiles.WALKABLE | tiles.SOLID)
     
     def isWalkable(self) -> bool:
         # @NOTE: e.g. a door is not walkable as long as closed
-        return self.isFloor() or self.isVoid()
+        return (self.flags & tiles.WALKABLE) != 0
 
     def isSolid(self) -> bool:
         # @NOTE: e.g. floor or a metal grate are "solid"
-        return not self.isVoid()
+        return (self.flags & tiles.SOLID) != 0
     
     def getNeighbor(self, parent_dungeon, direction: tuple):
         """ Returns neighbor cell inside parent_dungeon in the given
@@ -200,19 +416,50 @@ class Cell(object):
 
 # --------------------------------------------------------------------- 
 
+def parseSymbols(raw: str):
+    """ Returns the symbols [y, x] of a level in ASCII format (size as
+    WxH in the first line), without creating any cells. Missing
+    symbols are void.
+    """
+    lines = raw.split('\n')
+    w = int(lines[0].split('x')[0])
+    h = int(lines[0].split('x')[1])
+    symbols = numpy.full((h, w), ' ', dtype='U1')
+    for y, line in enumerate(lines[1:]):
+        if len(line) == 0:
+            continue
+        if y >= h or len(line) > w:
+            raise KeyError('Invalid dungeon position <{0}|{1}>'.format(w if y < h else 0, y))
+        symbols[y, :len(line)] = list(line)
+    return symbols
+
+
 class Dungeon(object):
     def __init__(self):
-        self.size  = (0, 0)
-        self.cells = list()
+        self.size    = (0, 0)
+        self.cells   = list()
+        self.symbols = numpy.full((0, 0), ' ', dtype='U1') # [y, x]
+        self.tiles   = numpy.zeros((0, 0), dtype=numpy.uint8) # tile ids [y, x]
+
+        # callables notified as listener(pos, cell) on each edit
+        self.listeners = list()
 
     def resize(self, w: int, h: int):
         self.size = (w, h)
         # rebuild all cells
         self.cells = [Cell.Void(x=None, y=None)] * w * h
+        self.symbols = numpy.full((h, w), ' ', dtype='U1')
+        self.tiles   = numpy.full((h, w), tiles.registry.getId(' '), dtype=numpy.uint8)
 
     def has(self, x: int, y: int) -> bool:
         return 0 <= x < self.size[0] and 0 <= y < self.size[1]
 
+    def getMask(self, flag: int):
+        """ Returns where the cells' tile types have `flag` set, as a
+        boolean array [y, x].
+        """
+        return tiles.registry.getMask(self.tiles, flag)
+
     def mapIndex(self, x: int, y: int):
         if not self.has(x, y):
             return -1
@@ -220,9 +467,13 @@ class Dungeon(object):
         return y * self.size[0] + x
 
     def __getitem__(self, pos):
-        """ e.g. obj[(2, 3)]
+        """ e.g. obj[(2, 3)] or obj[2:5, 0:3] for a DungeonView
         """
-        i = self.mapIndex(*pos)
+        try:
+            i = self.mapIndex(*pos)
+        except TypeError:
+            # not comparable with ints, e.g. slices
+            return self.view(*pos)
         if i > -1:
             return self.cells[i]
         return Cell.Wall(*pos)
@@ -233,36 +484,46 @@ class Dungeon(object):
         i = self.mapIndex(*pos)
         if i > -1:
             self.cells[i] = cell
+            self.symbols[pos[1], pos[0]] = cell.symbol
+            self.tiles[pos[1], pos[0]]   = cell.tile
+            for listener in self.listeners:
+                listener(pos, cell)
         else:
             raise KeyError('Invalid dungeon position <{0}|{1}>'.format(*pos))
 
-    def loadFromMemory(self, raw: str) -> bool:
-        lines = raw.split('\n')
-        
-        # prepare cells array
-        w = int(lines[0].split('x')[0])
-        h = int(lines[0].split('x')[1])
-        d = Dungeon()
-        d.resize(w, h)
-        
-        # load from ascii
-        y = 0
-        for line in lines[1:]:
-            x = 0
-            for symbol in line:
-                d[(x, y)] = Cell(x, y, symbol)
-                x += 1
-            y += 1
-
-        self.size  = d.size
-        self.cells = d.cells
+    def view(self, xs, ys):
+        """ Returns a DungeonView of the given columns and rows, which
+        are clipped to the dungeon's size.
+        """
+        if not isinstance(xs, slice):
+            xs = slice(xs, xs + 1)
+        if not isinstance(ys, slice):
+            ys = slice(ys, ys + 1)
+        x0, x1, xstep = xs.indices(self.size[0])
+        y0, y1, ystep = ys.indices(self.size[1])
+        if xstep != 1 or ystep != 1:
+            raise ValueError('Dungeon views do not support steps')
+        return DungeonView(self, x0, y0, max(x0, x1), max(y0, y1))
 
-        return True
+    def loadFromMemory(self, raw: str) -> bool:
+        return self.loadFromArray(parseSymbols(raw))
 
     def loadFromFile(self, fname: str) -> bool:
         with open(fname, 'r') as h:
             return self.loadFromMemory(h.read())
 
+    def loadFromArray(self, symbols) -> bool:
+        """ Load from a 2D array of symbols indexed [y, x] (e.g. as
+        exported by DungeonView.toArray()).
+        """
+        h, w = symbols.shape
+        self.size    = (w, h)
+        self.symbols = numpy.array(symbols, dtype='U1') # own a writable copy
+        self.tiles   = tiles.registry.toIds(self.symbols)
+        self.cells   = [Cell(x, y, symbol) for y, row in enumerate(self.symbols.tolist())
+            for x, symbol in enumerate(row)]
+        return True
+
     def saveToMemory(self) -> str:
         # dump to ascii
         raw = '{0}x{1}'.format(*self.size)
@@ -276,3 +537,207 @@ class Dungeon(object):
         with open(fname, 'w') as h:
             h.write(self.saveToMemory())
 
+
+# ---------------------------------------------------------------------
+
+class DungeonView(object):
+    """ Rectangular window onto a dungeon's storage, e.g. obj[2:5, 1:3].
+    Nothing is copied: rows are iterated in place within the cell list
+    and toArray() returns a numpy view of the symbols. Positions are relative to the view's top left corner.
+
+    @NOTE: the view becomes stale after the dungeon was resized or
+    reloaded.
+    """
+
+    def __init__(self, dungeon, x0: int, y0: int, x1: int, y1: int):
+        self.dungeon = dungeon
+        self.offset  = (x0, y0)
+        self.size    = (x1 - x0, y1 - y0)
+
+    def __len__(self) -> int:
+        return self.size[0] * self.size[1]
+
+    def __getitem__(self, pos):
+        """ e.g. view[(0, 1)], out-of-view positions are walls
+        """
+        x, y = pos
+        if not (0 <= x < self.size[0] and 0 <= y < self.size[1]):
+            return Cell.Wall(x + self.offset[0], y + self.offset[1])
+        return self.dungeon[(x + self.offset[0], y + self.offset[1])]
+
+    def rows(self):
+        """ Yields an iterator over the cells of each row.
+        """
+        x0, y0 = self.offset
+        w = self.dungeon.size[0]
+        cells = self.dungeon.cells
+        for y in range(y0, y0 + self.size[1]):
+            start = y * w + x0
+            yield map(cells.__getitem__, range(start, start + self.size[0]))
+
+    def __iter__(self):
+        for row in self.rows():
+            yield from row
+
+    def toArray(self):
+        """ Returns the symbols as a 2D numpy view indexed [y, x].
+        """
+        x0, y0 = self.offset
+        return self.dungeon.symbols[y0:y0 + self.size[1], x0:x0 + self.size[0]]
+
+
+# ---------------------------------------------------------------------
+
+class Journal(object):
+    """ Incremental save for a dungeon. Each edit is appended to a
+    compact binary log next to the snapshot file `fname`, so a save
+    only costs as much as the edits made since the previous save. The
+    log is folded into a full snapshot once it grows too long.
+    """
+
+    # x, y and the new (single-byte) symbol per edit
+    record = struct.Struct('<IIc')
+
+    def __init__(self, fname: str, compact_after=4096):
+        self.fname         = fname
+        self.logname       = fname + '.journal'
+        self.compact_after = compact_after
+
+        self.pending = dict() # pos -> symbol, latest edit wins
+        self.logged  = 0
+        self.paused  = False
+
+    def attach(self, dungeon) -> None:
+        dungeon.listeners.append(self.onChange)
+
+    def detach(self, dungeon) -> None:
+        dungeon.listeners.remove(self.onChange)
+
+    def onChange(self, pos, cell) -> None:
+        if not self.paused:
+            self.pending[tuple(pos)] = cell.symbol
+
+    def save(self, dungeon) -> int:
+        """ Append all pending edits to the log and return how many
+        records were written. Compacts if the log became too long.
+        """
+        if not os.path.exists(self.fname):
+            # no snapshot to replay onto yet
+            self.compact(dungeon)
+            return 0
+
+        n = self.flush()
+        if self.logged >= self.compact_after:
+            self.compact(dungeon)
+        return n
+
+    def flush(self) -> int:
+        """ Append the pending edits to the log and return their number.
+        """
+        n = len(self.pending)
+        if n > 0:
+            raw = b''.join(self.record.pack(x, y, symbol.encode('latin-1'))
+                for (x, y), symbol in self.pending.items())
+            with open(self.logname, 'ab') as h:
+                h.write(raw)
+            self.pending.clear()
+            self.logged += n
+        return n
+
+    def compact(self, dungeon) -> None:
+        """ Write a full snapshot and truncate the log.
+        """
+        # @NOTE: replaying a stale log onto the new snapshot is harmless
+        # as long as the last record per cell matches the snapshot, so
+        # pending edits are logged first
+        if os.path.exists(self.fname):
+            self.flush()
+
+        # replace atomically, so a crash leaves the old snapshot intact
+        tmp = self.fname + '.tmp'
+        dungeon.saveToFile(tmp)
+        os.replace(tmp, self.fname)
+
+        with open(self.logname, 'wb'):
+            pass
+        self.pending.clear()
+        self.logged = 0
+
+    def load(self, dungeon) -> bool:
+        """ Load the snapshot and replay the log on top of it.
+        """
+        if not dungeon.loadFromFile(self.fname):
+            return False
+
+        raw = b''
+        if os.path.exists(self.logname):
+            with open(self.logname, 'rb') as h:
+                raw = h.read()
+        # drop a truncated last record (e.g. after a crash), so later
+        # records are appended at a record boundary
+        n = len(raw) // self.record.size
+        if len(raw) > n * self.record.size:
+            with open(self.logname, 'r+b') as h:
+                h.truncate(n * self.record.size)
+
+        self.paused = True
+        try:
+            for x, y, symbol in self.record.iter_unpack(raw[:n * self.record.size]):
+                dungeon[(x, y)] = Cell(x, y, symbol.decode('latin-1'))
+        finally:
+            self.paused = False
+        self.pending.clear()
+        self.logged = n
+        return True
+
+
+# ---------------------------------------------------------------------
+
+class LevelWatcher(object):
+    """ Watches a level file and applies changes to the live dungeon
+    cell by cell, so all listeners only see the edited cells.
+    """
+
+    def __init__(self, fname: str, dungeon, interval=0.05):
+        self.fname    = fname
+        self.dungeon  = dungeon
+        self.interval = interval
+        self.next_check = time.monotonic() + interval
+        self.mtime = self.getModified()
+
+    def getModified(self):
+        try:
+            return os.stat(self.fname).st_mtime_ns
+        except OSError:
+            return None # e.g. while an editor replaces the file
+
+    def poll(self):
+        """ Checks for changes at most every `interval` seconds. Returns
+        None if nothing changed, else the list of changed positions or
+        True if the dungeon was resized and reloaded as a whole.
+        """
+        now = time.monotonic()
+        if now < self.next_check:
+            return None
+        self.next_check = now + self.interval
+        mtime = self.getModified()
+        if mtime is None or mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        return self.reload()
+
+    def reload(self):
+        try:
+            with open(self.fname, 'r') as h:
+                symbols = parseSymbols(h.read())
+        except (OSError, ValueError, KeyError, IndexError):
+            # probably still being written, wait for the next change
+            return None
+        if symbols.shape != self.dungeon.symbols.shape:
+            self.dungeon.loadFromArray(symbols)
+            return True
+
+        changed = [(int(x), int(y)) for y, x in numpy.argwhere(symbols != self.dungeon.symbols)]
+        for x, y in changed:
+            self.dungeon[(x, y)] = Cell(x, y, str(symbols[y, x]))
+        return changed
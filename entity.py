@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import numpy
+
+
+# AI states
+IDLE  = 0
+CHASE = 1
+FLEE  = 2
+
+
+class EntityStore(object):
+    """ Stores entities as rows of dense component columns (numpy
+    arrays), so systems can update all entities with a few vectorized
+    operations. Removing entities keeps the alive ones packed into the
+    first `len(store)` rows.
+
+    Entities are referred to by ids which stay valid until the entity
+    is removed and are never reused.
+    """
+
+    def __init__(self, capacity=64):
+        self.count   = 0
+        self.next_id = 0
+        self.ids     = numpy.zeros(capacity, dtype=numpy.int64)  # row -> id
+        self.lookup  = numpy.full(capacity, -1, dtype=numpy.int64) # id -> row
+        self.columns = dict()
+        self.fills   = dict()
+
+        self.addColumn('position', numpy.float32, (3, ))
+        self.addColumn('health', numpy.int32)
+        self.addColumn('ai', numpy.int8, fill=IDLE)
+        self.addColumn('sprite', numpy.int32, fill=-1) # e.g. BillboardSystem index
+
+    def addColumn(self, name: str, dtype, shape=tuple(), fill=0) -> None:
+        self.columns[name] = numpy.full((len(self.ids), ) + shape, fill, dtype=dtype)
+        self.fills[name]   = fill
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, eid) -> bool:
+        return 0 <= eid < self.next_id and self.lookup[eid] > -1
+
+    def __getitem__(self, name):
+        """ Returns a view of the column for all alive entities.
+        """
+        return self.columns[name][:self.count]
+
+    def getIds(self):
+        return self.ids[:self.count]
+
+    def getRows(self, eids):
+        """ Returns the rows of the given entities, -1 for dead ones.
+        """
+        return self.lookup[numpy.asarray(eids)]
+
+    def getRow(self, eid) -> int:
+        """ Returns the row of an alive entity.
+        """
+        if eid not in self:
+            raise KeyError('Invalid entity {0}'.format(eid))
+        return self.lookup[eid]
+
+    def get(self, eid, name):
+        return self.columns[name][self.getRow(eid)]
+
+    def set(self, eid, name, value) -> None:
+        self.columns[name][self.getRow(eid)] = value
+
+    def grow(self, array, capacity, fill):
+        out = numpy.full((capacity, ) + array.shape[1:], fill, dtype=array.dtype)
+        out[:len(array)] = array
+        return out
+
+    def spawn(self, **components) -> int:
+        """ Creates an entity, e.g. spawn(position=(1, 0, 2), health=5)
+        and returns its id. Missing components are set to defaults.
+        """
+        if self.count == len(self.ids):
+            capacity = 2 * len(self.ids)
+            self.ids = self.grow(self.ids, capacity, 0)
+            for name, column in self.columns.items():
+                self.columns[name] = self.grow(column, capacity, self.fills[name])
+        if self.next_id == len(self.lookup):
+            self.lookup = self.grow(self.lookup, 2 * len(self.lookup), -1)
+
+        row = self.count
+        eid = self.next_id
+        self.count   += 1
+        self.next_id += 1
+        self.ids[row]    = eid
+        self.lookup[eid] = row
+        for name, column in self.columns.items():
+            column[row] = components.pop(name, self.fills[name])
+        if len(components) > 0:
+            raise KeyError('Unknown components {0}'.format(sorted(components)))
+        return eid
+
+    def kill(self, eid) -> None:
+        """ Removes an entity by moving the last row into its place.
+        """
+        row  = self.getRow(eid)
+        last = self.count - 1
+        for name, column in self.columns.items():
+            column[row]  = column[last]
+            column[last] = self.fills[name]
+        self.ids[row] = self.ids[last]
+        self.lookup[self.ids[row]] = row
+        self.lookup[eid] = -1
+        self.count = last
+
+    def killWhere(self, mask) -> int:
+        """ Removes all entities selected by a mask over the alive rows,
+        e.g. killWhere(store['health'] <= 0). Returns their number.
+        """
+        n = self.count
+        keep = ~numpy.asarray(mask, dtype=bool)
+        remaining = int(numpy.count_nonzero(keep))
+        if remaining == n:
+            return 0
+
+        self.lookup[self.ids[:n][~keep]] = -1
+        self.ids[:remaining] = self.ids[:n][keep]
+        for name, column in self.columns.items():
+            column[:remaining] = column[:n][keep]
+            column[remaining:n] = self.fills[name]
+        self.count = remaining
+        self.lookup[self.ids[:remaining]] = numpy.arange(remaining)
+        return n - remaining
+
+
+# ---------------------------------------------------------------------
+
+def syncBillboards(store, billboards) -> None:
+    """ System which moves each entity's sprite to its position.
+    """
+    sprites = store['sprite']
+    mask = sprites > -1
+    billboards.positions[sprites[mask]] = store['position'][mask]
@@ -1,11 +1,13 @@
 #!/usr/bin/python3 
 # -*- coding: utf-8 -*-
 
+import argparse, collections, tracemalloc
+
+import numpy
 import pygame
 import OpenGL.GL as gl
-import OpenGL.GLU as glu
 
-import dungeon, draw, render
+import ai, bundle, capture, dungeon, draw, entity, memory, particles, raycast, regions, render, replay, savegame, simulation, text
 
 """
 def createMinimap(tileset, dungeon, tile_size):
@@ -26,175 +28,541 @@ def createMinimap(tileset, dungeon, tile_size):
 
 
 class Renderer(object):
-    def __init__(self, w, h):
+    """ `scaled` optionally renders the 3D scene at a lower resolution,
+    see draw.ScaledScene.
+    """
+
+    def __init__(self, w, h, scaled=None):
         self.resolution = (w, h)
         self.screen     = pygame.display.set_mode((w, h), pygame.DOUBLEBUF | pygame.OPENGL | pygame.OPENGLBLIT)
         self.cam        = None
+        self.scaled     = scaled
+        self.video      = None # see capture.Recorder
+        self.overlay    = None # text.TextBatch drawn on top of the HUD
+
+        # new context, nothing is known about its state
+        draw.state.reset()
 
         # enable alpha from RGBA texture
-        gl.glEnable(gl.GL_ALPHA_TEST)
+        draw.state.enable(gl.GL_ALPHA_TEST)
         gl.glAlphaFunc(gl.GL_NOTEQUAL, 0.0)
 
-    def loadDungeon(self, dungeon):
-        self.cam = render.Camera(dungeon, 3.0)
-        self.cam.moveTo(1.5, 0.175, 1.5)
-        #self.cam.no_collision = True
+    def setCamera(self, cam):
+        self.aspect_ratio = self.resolution[0] / self.resolution[1]
+        self.cam = cam
+        self.cam.setProjection(45.0, self.aspect_ratio, 0.1, 30.0)
 
     def ortho(self):
-        gl.glMatrixMode(gl.GL_PROJECTION)
+        # 2D is drawn on top of everything in painter's order
+        draw.state.disable(gl.GL_DEPTH_TEST)
+        if not draw.state.changeProjection(('ortho', self.resolution)):
+            return
+
+        draw.state.matrixMode(gl.GL_PROJECTION)
         gl.glLoadIdentity()
         gl.glOrtho(0.0, self.resolution[0], self.resolution[1], 0.0, -0.01, 10.0)
 
         # @NOTE: this reverts the workaround inside perspective()
-        gl.glMatrixMode(gl.GL_TEXTURE)
+        draw.state.matrixMode(gl.GL_TEXTURE)
         gl.glLoadIdentity()
         
-        gl.glMatrixMode(gl.GL_MODELVIEW)
+        draw.state.matrixMode(gl.GL_MODELVIEW)
         gl.glLoadIdentity()
 
     def perspective(self):
         assert(self.cam is not None)
         
-        self.aspect_ratio = self.resolution[0] / self.resolution[1]
+        draw.state.enable(gl.GL_DEPTH_TEST)
+        key = ('perspective', self.cam.version)
+        if not draw.state.changeProjection(key):
+            return
         
-        gl.glMatrixMode(gl.GL_PROJECTION)
-        gl.glLoadIdentity()
-        glu.gluPerspective(45, self.aspect_ratio, 0.1, 30.0)
+        draw.state.matrixMode(gl.GL_PROJECTION)
+        gl.glLoadMatrixf(self.cam.getProjectionMatrix().T)
         self.cam.apply()
 
         # @WORKAROUND: this y-flips all texture to be shown correctly.
-        gl.glMatrixMode(gl.GL_TEXTURE)
+        draw.state.matrixMode(gl.GL_TEXTURE)
         gl.glLoadIdentity()
         gl.glScale(1.0, -1.0, 1.0) 
         
-        gl.glMatrixMode(gl.GL_MODELVIEW)
+        draw.state.matrixMode(gl.GL_MODELVIEW)
         gl.glLoadIdentity()         
-        gl.glEnable(gl.GL_DEPTH_TEST)
 
     def clear(self):
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
 
-    def update(self):
-        pygame.display.flip()
+    def beginScene(self):
+        if self.scaled is not None:
+            self.scaled.begin(*self.resolution)
 
+    def endScene(self):
+        """ Finishes the 3D scene, upscaling it to the window if it was
+        rendered at a lower resolution.
+        """
+        if self.scaled is not None:
+            self.scaled.end(*self.resolution)
+            self.ortho()
+            self.scaled.render(*self.resolution)
 
+    def update(self):
+        if self.video is not None:
+            self.video.grab()
+        pygame.display.flip()
 
 
 # ---------------------------------------------------------------------
 
+# what the render thread needs from one simulation tick, see Game.capture():
+# the camera pose, the weapon's frame, a copy of the billboards (see
+# BillboardSystem.getState), the terrain arrays (replaced, never modified),
+# how often the level was changed, whether the game was idle (see
+# Game.isIdle) and how many inputs it had consumed
+Snapshot = collections.namedtuple('Snapshot', ['tick', 'camera', 'weapon', 'billboards',
+    'terrain', 'edits', 'idle', 'inputs'])
+
+
+class Game(object):
+    """ Game state and its per-tick logic. Nothing in here needs a
+    display, so it can also be driven headless (e.g. by a replay).
+    `textures` maps image names to (possibly unloaded) textures and
+    `terrain` holds prebuilt mesh arrays (see VertexBuilder.toArrays).
+    """
+
+    def __init__(self, level, textures, terrain=None):
+        self.dungeon = level
+        self.tileset = textures['tileset']
+        self.ticks   = 0
+        self.edits   = 0    # level changes, redrawn via the snapshot
+        self.keys    = None # as passed to the last tick()
+
+        self.cam = render.Camera(level, 3.0)
+        self.cam.moveTo(1.5, 0.175, 1.5)
+        #self.cam.no_collision = True
 
-if __name__ == '__main__':
-    pygame.init()
-    renderer = Renderer(640, 480) 
-    running  = True
-    
-    fpsclock = pygame.time.Clock()
-
-    tileset = draw.Texture()
-    tileset.loadFromFile('tileset.png')
-
-    heart = draw.Texture()
-    heart.loadFromFile('heart.png')
-
-    bag = draw.Texture()
-    bag.loadFromFile('bag.png')
+        #minimap = createMinimap(tileset, d, 16)
+
+        self.hud = draw.Sprite2D(32, 32)
+        self.hud.moveTo(640, 480)
+        self.hud.centerTo(1.0, 1.0)
+        self.hud.texture = textures['heart']
+
+        # static HUD elements are cached, the weapon is drawn live
+        self.hud_layer = draw.HudLayer()
+        self.hud_layer.add(self.hud)
+
+        self.weapon = draw.Sprite2D(196, 196)
+        self.weapon.moveTo(420, 510)
+        self.weapon.centerTo(0.5, 1.0)
+        self.weapon.texture = textures['sword']
+
+        # all animations share one clock; the simulation only keeps when
+        # the swing started, so it never touches what is being rendered
+        self.clock = draw.AnimationClock()
+        self.swing = draw.Animation(textures['sword'], 4, 8)
+        self.swing_started = -self.swing.getDuration()
+        self.weapon.showFrame(self.swing, 0)
+
+        # torches placed in the level, baked into the terrain colors
+        self.lighting  = dungeon.Lighting()
+        self.particles = particles.ParticleSystem()
+        self.placeTorches()
+
+        self.vb = dungeon.VertexBuilder()
+        #self.vb.no_walls()
+        if terrain is None:
+            self.vb.loadFromDungeon(level, self.lighting)
+            terrain = self.vb.toArrays()
+        self.terrain = terrain
+
+        self.billboards = draw.BillboardSystem(clock=self.clock)
+        self.entities   = entity.EntityStore()
+
+        walk = draw.Animation(textures['goblin'], 4, 8, loop=True)
+        for x, z in [(4.5, 4.5), (4.0, 4.0)]:
+            sprite = self.billboards.add(textures['goblin'], x, 0.0, z)
+            self.billboards.play(sprite, walk)
+            self.entities.spawn(position=(x, 0.0, z), health=3, sprite=sprite)
+
+        sprite = self.billboards.add(textures['bag'], 5.0, 0.0, 4.0, 0.5, 0.5)
+        self.entities.spawn(position=(5.0, 0.0, 4.0), sprite=sprite)
+
+        # items have no health and no AI
+        self.ai = ai.Scheduler(self.entities)
+
+        # which cells are connected, follows edits of the level
+        self.regions = regions.RegionIndex(level)
+        self.regions.attach(level)
+        self.raycaster = raycast.Raycaster(level, 3.0)
+        self.raycaster.attach(level)
+
+        # redraw only if anything visible changed
+        self.shown = self.capture()
+        self.scene = render.SceneTracker()
+        self.scene.watch('camera', lambda: self.shown.camera.version)
+        self.scene.watch('hud', lambda: (self.hud.x, self.hud.y, self.hud.texrect, self.hud.color))
+        self.scene.watch('weapon', lambda: self.shown.weapon)
+        self.scene.watch('billboards', lambda: self.shown.billboards.positions.tobytes()
+            + self.billboards.getFrames(self.shown.billboards).tobytes())
+        # @NOTE: ambient particles (torch embers) alone don't keep the
+        # scene dirty, they only move while something else is redrawn
+        self.scene.watch('particles', lambda: None if self.particles.isIdle(ambient=False) else self.shown.tick)
+        # @NOTE: only the render thread marks the scene dirty, edits made
+        # by the simulation reach it through the snapshot
+        self.scene.watch('level', lambda: self.shown.edits)
+        level.listeners.append(self.onCellChanged)
+
+    def onCellChanged(self, pos, cell):
+        self.edits += 1
+
+    def tick(self, keys, clicks):
+        """ Advance by one tick, given the pressed `keys` and the mouse
+        `clicks` as (button, x, y).
+        """
+        for button, x, y in clicks:
+            if button == 1 and self.isSwingDone():
+                self.swing_started = self.clock.tick
+                self.attack()
+
+        self.cam.update(keys)
+        player = self.cam.getWorldPos()
+        self.ai.tick(player, ai.awareness(self.entities, player, index=self.regions),
+            active=self.entities['health'] > 0)
+        entity.syncBillboards(self.entities, self.billboards)
+        self.clock.step()
+        self.ticks += 1
+        self.keys   = keys
+
+    def placeTorches(self):
+        """ Lights and embers at all cells whose tile emits light.
+        """
+        self.lighting.loadFromDungeon(self.dungeon)
+        self.particles.sources.clear()
+        for x, y in self.lighting.lights:
+            self.particles.addSource(particles.EMBERS, ((x + 0.5) * 3.0, 1.0, (y + 0.5) * 3.0), 20.0)
+
+    def isSwingDone(self) -> bool:
+        return self.swing.isFinished(self.clock.tick - self.swing_started)
+
+    def onLevelLoaded(self):
+        """ Rebuild everything derived from the level after it was
+        replaced as a whole.
+        """
+        self.regions.rebuild()
+        self.raycaster.rebuild()
+        self.placeTorches()
+        self.vb.loadFromDungeon(self.dungeon, self.lighting)
+        self.terrain = self.vb.toArrays()
+        self.edits += 1
+
+    def onLevelEdited(self, cells):
+        """ Patch the terrain after the given cells were changed.
+        Listeners of the dungeon already took care of the rest.
+        """
+        lights = set(self.lighting.lights.items())
+        self.placeTorches()
+        self.terrain = self.vb.patch(self.dungeon, cells, self.terrain, self.lighting)
+        # a torch lights more than the patched cells
+        for (x, y), (radius, color) in lights ^ set(self.lighting.lights.items()):
+            self.terrain = self.vb.relight(self.dungeon, self.lighting, x, y, radius, self.terrain)
+
+    def getTarget(self, reach=4.5) -> int:
+        """ Returns the id of the living entity under the crosshair
+        within `reach` (world scale), -1 if there is none.
+        """
+        rows = numpy.flatnonzero(self.entities['health'] > 0)
+        centers = self.entities['position'][rows][:, [0, 2]]
+        eye = (self.cam.pos[0], self.cam.pos[2])
+        i = self.raycaster.pick(eye, self.cam.look, centers, 0.75, reach)
+        return -1 if i == -1 else int(self.entities.getIds()[rows[i]])
+
+    def attack(self):
+        target = self.getTarget()
+        if target > -1:
+            health = self.entities.get(target, 'health')
+            self.entities.set(target, 'health', health - 1)
+
+            # sparks fly towards the player
+            x, y, z = self.entities.get(target, 'position')
+            toward = (self.cam.pos[0] - x, 0.5, self.cam.pos[2] - z)
+            self.particles.burst(particles.SPARKS, 24, (x, y + 0.6, z), toward)
+            if health == 1:
+                self.particles.burst(particles.DUST, 40, (x, y + 0.1, z))
+                self.billboards.remove(self.entities.get(target, 'sprite'))
+                self.entities.kill(target)
+
+    def capture(self, inputs=0):
+        """ Returns an immutable Snapshot of what is rendered, after
+        `inputs` inputs were consumed (see SimulationThread.consumed).
+        """
+        weapon = 0 if self.isSwingDone() else int(self.swing.getFrame(self.clock.tick - self.swing_started))
+        idle = self.keys is not None and self.isIdle(self.keys)
+        return Snapshot(self.ticks, self.cam.getPose(), weapon, self.billboards.getState(),
+            self.terrain, self.edits, idle, inputs)
+
+    def isIdle(self, keys) -> bool:
+        """ Returns whether nothing will change without new input.
+        """
+        if any(keys[k] for k in replay.TRACKED_KEYS):
+            return False
+        return (self.cam.animation.isIdle() and self.isSwingDone()
+            and self.billboards.isIdle() and self.particles.isIdle(ambient=False))
+
+    def present(self, renderer, snapshot) -> bool:
+        """ Renders the snapshot if that changes the scene and returns
+        whether it did.
+        """
+        self.shown = snapshot
+        drawn = self.scene.poll()
+        if drawn:
+            self.render(renderer, snapshot)
+        self.scene.clear(drawn)
+        return drawn
+
+    def render(self, renderer, snapshot):
+        renderer.clear()
 
-    goblin = draw.Texture()
-    goblin.loadFromFile('goblin.png')
+        renderer.beginScene()
+        renderer.cam = snapshot.camera
+        renderer.perspective()
+        
+        # draw terrain
+        vertices, texcoords, colors = snapshot.terrain
+        self.tileset.bind()
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glEnableClientState(gl.GL_COLOR_ARRAY)
+        gl.glVertexPointer(3, gl.GL_FLOAT, 0, vertices)
+        gl.glTexCoordPointer(2, gl.GL_FLOAT, 0, texcoords)
+        gl.glColorPointer(3, gl.GL_FLOAT, 0, colors)
+        gl.glDrawArrays(gl.GL_QUADS, 0, len(vertices))
+        gl.glDisableClientState(gl.GL_COLOR_ARRAY)
+        gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        
+        self.billboards.update(snapshot.camera.pos, snapshot.camera.angle, snapshot.billboards)
+        self.billboards.render()
+        self.particles.update(snapshot.tick, snapshot.camera.pos, snapshot.camera.angle)
+        self.particles.render()
+        renderer.endScene()
+
+        # the HUD stays at full resolution
+        self.weapon.showFrame(self.swing, snapshot.weapon)
+        renderer.ortho()
+        self.hud_layer.render(*renderer.resolution)
+        self.weapon.render()
+        if renderer.overlay is not None:
+            renderer.overlay.render()
+        
+        #screen.blit(minimap, (50, 50))
+        renderer.update()
 
-    sword = draw.Texture()
-    sword.loadFromFile('sword.png')
-    
-    #minimap = createMinimap(tileset, d, 16)
 
-    hud = draw.Sprite2D(32, 32)
-    hud.moveTo(640, 480)
-    hud.centerTo(1.0, 1.0)
-    hud.texture = heart
+# ---------------------------------------------------------------------
 
-    weapon = draw.Sprite2D(196, 196)
-    weapon.moveTo(420, 510)
-    weapon.centerTo(0.5, 1.0)
-    weapon.clip(0.0, 0.0, 0.25, 1.0)
-    weapon.texture = sword
 
-    weapon.animator = draw.FrameAnimator(weapon, 4, 8)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pixelart, dead-simple dungeon crawler')
+    parser.add_argument('--record', metavar='FILE', help='record the input to FILE')
+    parser.add_argument('--replay', metavar='FILE', help='replay the input from FILE')
+    parser.add_argument('--headless', action='store_true',
+        help='run the replay without a window and as fast as possible')
+    parser.add_argument('--threaded', action='store_true',
+        help='run the game logic on a separate thread')
+    parser.add_argument('--bundle', metavar='FILE',
+        help='load all assets from FILE, see bundle.py')
+    parser.add_argument('--load', metavar='FILE', help='continue the savegame FILE')
+    parser.add_argument('--autosave', metavar='FILE',
+        help='periodically save the game to FILE in the background')
+    parser.add_argument('--autosave-interval', metavar='SECONDS', type=float, default=60.0,
+        help='time between two autosaves (default: %(default)s)')
+    parser.add_argument('--watch', action='store_true',
+        help='apply changes of the level file while running')
+    parser.add_argument('--memory', metavar='FILE',
+        help='trace memory and write a report to FILE on exit or when pressing F12')
+    parser.add_argument('--capture', metavar='TARGET',
+        help='record the frames as images (e.g. shots/%%05d.png) or as raw RGBA video to TARGET')
+    parser.add_argument('--dynamic-resolution', metavar='MS', type=float, nargs='?', const=1000.0 / 60.0,
+        help='render the 3D scene at a lower resolution if it takes longer than MS '
+            'milliseconds per frame (default: %(const).1f)')
+    args = parser.parse_args()
+    if args.memory is not None:
+        tracemalloc.start()
+    if args.headless and args.replay is None:
+        parser.error('--headless requires --replay')
+    if args.threaded and (args.record is not None or args.replay is not None):
+        parser.error('--threaded cannot be combined with --record or --replay')
+    if args.watch and args.bundle is not None:
+        parser.error('--watch cannot be combined with --bundle')
+
+    assets = None
+    if args.bundle is not None:
+        assets = bundle.Bundle()
+        assets.loadFromFile(args.bundle)
 
     # demo terrain
     d = dungeon.Dungeon()
-    d.loadFromFile('demo.txt')
-    renderer.loadDungeon(d)
+    terrain = None
+    if assets is not None:
+        d.loadFromArray(assets.level('demo'))
+        if 'demo' in assets.names('mesh'):
+            terrain = assets.mesh('demo')
+    else:
+        d.loadFromFile('demo.txt')
+
+    if args.headless:
+        game = Game(d, collections.defaultdict(draw.Texture), terrain)
+        ticks, seconds = replay.run(args.replay, game.tick)
+        print('{0} ticks in {1:.3f}s ({2:.0f} ticks/s)'.format(ticks, seconds, ticks / max(seconds, 1e-9)))
+        print('camera at {0}, angle {1}'.format(game.cam.pos, game.cam.angle))
+        if args.memory is not None:
+            memory.gameReport(game).saveToFile(args.memory)
+        raise SystemExit
 
-    vb = dungeon.VertexBuilder()
-    #vb.no_walls()
-    vb.loadFromDungeon(d)
+    pygame.init()
+    scaled = None
+    if args.dynamic_resolution is not None:
+        scaled = draw.ScaledScene(draw.ResolutionScaler(args.dynamic_resolution / 1000.0))
+    renderer = Renderer(640, 480, scaled) 
+    running  = True
+    
+    fpsclock = pygame.time.Clock()
 
+    textures = dict()
+    for name in ['tileset', 'heart', 'bag', 'goblin', 'sword']:
+        textures[name] = draw.Texture()
+        if assets is not None:
+            textures[name].loadFromMemory(*assets.texture(name))
+        else:
+            textures[name].loadFromFile('{0}.png'.format(name))
+
+    game = Game(d, textures, terrain)
+    if args.load is not None:
+        savegame.restore(game, savegame.loadFromFile(args.load))
+    renderer.setCamera(game.cam)
+    if args.capture is not None:
+        renderer.video = capture.Recorder(args.capture, *renderer.resolution)
+
+    # fps counter, F3 toggles more statistics
+    renderer.overlay = text.TextBatch(text.GlyphAtlas())
     next_fps_update = 0
-
-    sprite1 = draw.Sprite3D()
-    sprite1.moveTo(4.5, 0.0, 4.5)
-    sprite1.centerTo(0.5, 0.0, 0.5)
-    sprite1.texture = goblin
-    sprite1.animator = draw.FrameAnimator(sprite1, 4, 8)
-    sprite1.animator.start(loop=True)
-    
-    sprite2 = draw.Sprite3D()  
-    sprite2.resize(0.5, 0.5)
-    sprite2.moveTo(5.0, 0.0, 4.0)
-    sprite2.centerTo(0.5, 0.0, 0.5)
-    sprite2.texture = bag
-
-    sprite3 = draw.Sprite3D()
-    sprite3.moveTo(4.0, 0.0, 4.0)
-    sprite3.centerTo(0.5, 0.0, 0.5)
-    sprite3.texture = goblin  
-    sprite3.animator = draw.FrameAnimator(sprite3, 4, 8)
-    sprite3.animator.start(loop=True)
+    show_stats = False
+    shown_lines = None
+
+    def getOverlayLines():
+        lines = ['{0:.0f} fps'.format(fpsclock.get_fps())]
+        if show_stats:
+            lines.append('{0} ms/frame'.format(fpsclock.get_rawtime()))
+            lines.append('frames drawn {0}, skipped {1}'.format(game.scene.drawn, game.scene.skipped))
+            lines.append('gl calls issued {0}, skipped {1}'.format(draw.state.issued, draw.state.skipped))
+            lines.append('particles {0}'.format(game.particles.getCount()))
+            if renderer.scaled is not None:
+                lines.append('render scale {0:.3f}'.format(renderer.scaled.scaler.scale))
+        return lines
+
+    recorder = replay.InputRecorder(args.record) if args.record is not None else None
+    inputs   = iter(replay.InputReplay(args.replay)) if args.replay is not None else None
+
+    autosaver = None
+    if args.autosave is not None:
+        autosaver = savegame.Autosaver(args.autosave, args.autosave_interval)
+        autosaver.start()
+
+    watcher = dungeon.LevelWatcher('demo.txt', d) if args.watch else None
+
+    def step(keys, clicks):
+        if watcher is not None:
+            changed = watcher.poll()
+            if changed is True:
+                game.onLevelLoaded()
+            elif changed:
+                game.onLevelEdited(changed)
+        game.tick(keys, clicks)
+        # capture on the thread owning the game, between two moves
+        if autosaver is not None and autosaver.isDue() and game.cam.animation.isIdle():
+            autosaver.submit(savegame.capture(game))
+
+    sim = None
+    if args.threaded:
+        sim = simulation.SimulationThread(step, lambda: game.capture(sim.consumed))
+        sim.start()
     
+    fed = 0
+    sleeping = False
     while running:
-        for event in pygame.event.get():
+        if sleeping:
+            # nothing to do until the next input
+            events = [pygame.event.wait()] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+
+        clicks = list()
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             if event.type == pygame.MOUSEBUTTONDOWN:
-                pressed = pygame.mouse.get_pressed()
-                if pressed[0] and weapon.animator.isIdle():
-                    weapon.animator.start()
-
-        renderer.cam.update(pygame.key.get_pressed())
-
-        renderer.clear()
-
-        weapon.animator()
-        
-        renderer.ortho()
-        hud.render()
-        weapon.render()
-
-        renderer.perspective()
-        
-        # draw terrain
-        tileset.bind()
-        gl.glBegin(gl.GL_QUADS)
-        for v, t, c in vb.data:
-            for i in range(4):
-                gl.glColor3fv(c[i])
-                gl.glTexCoord2fv(t[i])
-                gl.glVertex3fv(v[i])
-        gl.glEnd()
-        
-        sprite1.rotate = renderer.cam.angle
-        sprite2.rotate = renderer.cam.angle
-        sprite3.rotate = renderer.cam.angle
-
-        sprite1.animator()
-        sprite3.animator()
-        
-        sprite1.render()
-        sprite2.render()
-        sprite3.render()
-        
-        #screen.blit(minimap, (50, 50))
-        renderer.update()
+                clicks.append((event.button, event.pos[0], event.pos[1]))
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                game.scene.markDirty('expose')
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_stats = not show_stats
+                next_fps_update = 0
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F12 and args.memory is not None and sim is None:
+                report = memory.gameReport(game, renderer)
+                report.saveToFile(args.memory)
+                print(report)
+        keys = pygame.key.get_pressed()
+
+        if inputs is not None:
+            # recorded input replaces the live one
+            keys, clicks = next(inputs, (None, None))
+            if keys is None:
+                break
+        if recorder is not None:
+            recorder.record(keys, clicks)
+
+        fed += 1
+        if sim is not None:
+            sim.feed(keys, clicks)
+            snapshot = sim.latest
+            if not sim.is_alive():
+                break
+        else:
+            step(keys, clicks)
+            snapshot = game.capture(fed)
+
+        if pygame.time.get_ticks() >= next_fps_update:
+            next_fps_update = pygame.time.get_ticks() + 500
+            lines = getOverlayLines()
+            if lines != shown_lines:
+                renderer.overlay.clear()
+                for i, line in enumerate(lines):
+                    renderer.overlay.add(line, 8, 8 + i * renderer.overlay.atlas.line_height)
+                shown_lines = lines
+                game.scene.markDirty('overlay')
+
+        if snapshot is not None:
+            drawn = game.present(renderer, snapshot)
+            if renderer.video is not None and not drawn:
+                # keep the video in time
+                renderer.video.repeat()
+        # @NOTE: in threaded mode the presented snapshot may be older
+        # than the input, sleep only once the simulation has seen all of it
+        sleeping = (inputs is None and watcher is None and renderer.video is None
+            and snapshot is not None and snapshot.idle and snapshot.inputs == fed)
         fpsclock.tick(60)
 
+    if sim is not None:
+        sim.stop()
+    if autosaver is not None:
+        autosaver.stop()
+    if recorder is not None:
+        recorder.close()
+    if args.memory is not None:
+        # while the renderer still holds its buffers
+        memory.gameReport(game, renderer).saveToFile(args.memory)
+    if renderer.video is not None:
+        renderer.video.close()
+        if renderer.video.writer.dropped > 0:
+            print('capture: dropped {0} frames'.format(renderer.video.writer.dropped))
     pygame.quit()
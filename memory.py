@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import json, sys, tracemalloc, types
+
+import numpy
+
+
+# not part of any subsystem's data
+SKIPPED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    types.MethodType, types.CodeType)
+
+
+def deepSizeOf(roots, seen=None) -> tuple:
+    """ Returns (bytes, objects) of everything reachable from `roots`
+    via containers, instance attributes and numpy arrays (including
+    their data, but not the data of views). Objects in `seen` are not
+    counted and counted ones are added to it.
+    """
+    if seen is None:
+        seen = set()
+    size  = 0
+    count = 0
+    stack = list(roots)
+    while len(stack) > 0:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SKIPPED):
+            continue
+        seen.add(id(obj))
+        size  += sys.getsizeof(obj)
+        count += 1
+
+        if isinstance(obj, numpy.ndarray):
+            if obj.base is not None:
+                # a view, its data belongs to the base
+                stack.append(obj.base)
+            continue
+        if isinstance(obj, (str, bytes, int, float, bool, memoryview)) or obj is None:
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        for name in getattr(type(obj), '__slots__', tuple()):
+            if hasattr(obj, name):
+                stack.append(getattr(obj, name))
+    return size, count
+
+
+def textureBytes(texture) -> int:
+    """ Estimated GPU memory of an uploaded RGBA texture.
+    """
+    if texture is None or texture.id is None:
+        return 0
+    return texture.w * texture.h * 4
+
+
+def targetBytes(target) -> int:
+    """ Estimated GPU memory of a draw.RenderTarget, a depth buffer
+    (24 bit) is padded to 4 bytes per pixel as well.
+    """
+    if target is None:
+        return 0
+    size = textureBytes(target.texture)
+    if target.depth is not None:
+        size += target.texture.w * target.texture.h * 4
+    return size
+
+
+# ---------------------------------------------------------------------
+
+class MemoryReport(object):
+    """ Byte and object counts per subsystem. Objects shared between
+    subsystems are attributed to the one added first. `gpu_bytes` are
+    uploaded textures, `array_bytes` client-side vertex arrays which
+    are read from system memory on each draw (already part of `bytes`).
+    """
+
+    def __init__(self):
+        self.sections = dict()
+        self.seen     = set()
+        self.heap     = None
+
+    def add(self, name: str, *objects, gpu=0, arrays=0) -> dict:
+        size, count = deepSizeOf(objects, self.seen)
+        section = {'bytes': size, 'objects': count, 'gpu_bytes': gpu, 'array_bytes': arrays}
+        self.sections[name] = section
+        return section
+
+    def addHeap(self, limit=10) -> None:
+        """ Adds the totals of tracemalloc and its largest allocations
+        per file, if it is tracing.
+        """
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().statistics('filename')
+        self.heap = {'current': current, 'peak': peak, 'files': [
+            {'file': s.traceback[0].filename, 'bytes': s.size, 'blocks': s.count}
+            for s in stats[:limit]]}
+
+    def getTotal(self, key='bytes') -> int:
+        return sum(section[key] for section in self.sections.values())
+
+    def toDict(self) -> dict:
+        return {'sections': self.sections, 'total': self.getTotal(),
+            'gpu_total': self.getTotal('gpu_bytes'), 'array_total': self.getTotal('array_bytes'),
+            'heap': self.heap}
+
+    def saveToFile(self, fname: str) -> None:
+        with open(fname, 'w') as h:
+            json.dump(self.toDict(), h, indent=2)
+
+    def __str__(self) -> str:
+        row = '{0:<12} {1:>12} {2:>9} {3:>12} {4:>12}'
+        lines = [row.format('subsystem', 'bytes', 'objects', 'gpu bytes', 'array bytes')]
+        for name, section in self.sections.items():
+            lines.append(row.format(name, section['bytes'], section['objects'],
+                section['gpu_bytes'], section['array_bytes']))
+        lines.append(row.format('total', self.getTotal(), self.getTotal('objects'),
+            self.getTotal('gpu_bytes'), self.getTotal('array_bytes')))
+        if self.heap is not None:
+            lines.append('traced heap: {0} bytes (peak {1})'.format(self.heap['current'], self.heap['peak']))
+        return '\n'.join(lines)
+
+
+def gameReport(game, renderer=None) -> MemoryReport:
+    """ Builds the report for a running main.Game and, if given, what
+    its main.Renderer keeps on the GPU.
+    """
+    report = MemoryReport()
+    report.add('dungeon', game.dungeon)
+    report.add('terrain', game.vb, game.terrain, game.lighting,
+        arrays=sum(array.nbytes for array in game.terrain))
+    report.add('entities', game.entities)
+    report.add('ai', game.ai)
+    report.add('regions', game.regions)
+    report.add('raycaster', game.raycaster)
+
+    textures = set(game.billboards.textures)
+    textures.update([game.hud.texture, game.weapon.texture, game.tileset])
+    report.add('textures', *textures, gpu=sum(textureBytes(texture) for texture in textures))
+
+    emitters = list(game.particles.getEmitters())
+    report.add('sprites', game.hud, game.weapon, game.swing, game.hud_layer, game.billboards, game.particles,
+        gpu=targetBytes(game.hud_layer.target), arrays=game.billboards.vertices.nbytes
+            + game.billboards.texcoords.nbytes
+            + sum(e.quads.nbytes + e.tints.nbytes + e.texcoords.nbytes for e in emitters))
+    report.add('camera', game.cam, game.scene, game.shown)
+
+    if renderer is not None:
+        if renderer.scaled is not None:
+            report.add('render target', renderer.scaled, gpu=targetBytes(renderer.scaled.target))
+        if renderer.overlay is not None:
+            arrays = renderer.overlay.arrays
+            report.add('text', renderer.overlay, gpu=textureBytes(renderer.overlay.atlas.texture),
+                arrays=sum(array.nbytes for array in arrays) if arrays is not None else 0)
+        if renderer.video is not None:
+            # pixel pack buffers of the read back
+            reader = renderer.video.reader
+            report.add('capture', renderer.video,
+                gpu=len(reader.buffers) * reader.size[0] * reader.size[1] * 4)
+    report.addHeap()
+    return report
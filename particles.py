@@ -0,0 +1,268 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections, math
+
+import numpy
+import OpenGL.GL as gl
+
+import draw
+
+
+# Properties shared by all particles of one kind, in world units and
+# seconds: (min, max) `lifetime` and `speed`, `spread` (0 keeps the
+# emitted direction, 1 randomizes it fully), vertical `gravity`, `drag`
+# per second, `bounce` (velocity kept when hitting the floor, None to
+# fall through), `sizes` and `colors` (RGB) at birth and death, and an
+# optional `texture` (else plain colored quads)
+ParticleType = collections.namedtuple('ParticleType', ['lifetime', 'speed', 'spread',
+    'gravity', 'drag', 'bounce', 'sizes', 'colors', 'texture'])
+
+SPARKS = ParticleType((0.2, 0.5), (2.0, 5.0), 0.8, -9.0, 1.0, 0.4, (0.08, 0.02),
+    ((1.0, 1.0, 0.6), (1.0, 0.3, 0.0)), None)
+DUST   = ParticleType((0.6, 1.2), (0.3, 1.0), 1.0, -0.5, 3.0, 0.0, (0.15, 0.3),
+    ((0.6, 0.55, 0.45), (0.3, 0.28, 0.25)), None)
+EMBERS = ParticleType((0.8, 1.6), (0.2, 0.6), 0.3, 0.8, 0.5, None, (0.06, 0.01),
+    ((1.0, 0.8, 0.3), (0.6, 0.1, 0.0)), None)
+
+# simulation ticks per second, see main.py
+TICKS_PER_SECOND = 60
+
+
+def randomDirections(rng, n):
+    """ Returns (n, 3) uniformly distributed unit vectors.
+    """
+    z = rng.uniform(-1.0, 1.0, n)
+    phi = rng.uniform(0.0, 2.0 * math.pi, n)
+    r = numpy.sqrt(1.0 - z * z)
+    return numpy.stack((r * numpy.cos(phi), z, r * numpy.sin(phi)), axis=1)
+
+
+# ---------------------------------------------------------------------
+
+class ParticleEmitter(object):
+    """ Live particles of one ParticleType, kept in preallocated arrays
+    with the alive ones packed at the front, so each step and the quad
+    batch are a few vectorized operations. Particles beyond `capacity`
+    are dropped (and counted).
+    """
+
+    def __init__(self, kind, capacity=4096, rng=None):
+        self.kind     = kind
+        self.capacity = capacity
+        self.rng      = rng if rng is not None else numpy.random.default_rng()
+        self.count    = 0
+        self.dropped  = 0
+
+        self.positions  = numpy.zeros((capacity, 3), dtype=numpy.float32)
+        self.velocities = numpy.zeros((capacity, 3), dtype=numpy.float32)
+        self.ages       = numpy.zeros(capacity, dtype=numpy.float32)
+        self.lifetimes  = numpy.ones(capacity, dtype=numpy.float32)
+
+        # output of build(), texcoords are the same for all quads
+        self.quads     = numpy.zeros((capacity, 4, 3), dtype=numpy.float32)
+        self.tints     = numpy.zeros((capacity, 4, 3), dtype=numpy.float32)
+        self.vertices  = self.quads[:0].reshape(-1, 3)
+        self.colors    = self.tints[:0].reshape(-1, 3)
+        corners = numpy.stack((draw.QUAD_CORNERS[:, 0], 1.0 - draw.QUAD_CORNERS[:, 1]), axis=1)
+        self.texcoords = numpy.ascontiguousarray(numpy.tile(corners, (capacity, 1)), dtype=numpy.float32)
+
+    def emit(self, n: int, position, direction=(0.0, 1.0, 0.0)) -> int:
+        """ Spawns up to `n` particles at `position`, moving along the
+        (normalized) `direction`. Returns how many were spawned.
+        """
+        spawned = min(n, self.capacity - self.count)
+        self.dropped += n - spawned
+        if spawned <= 0:
+            return 0
+        kind = self.kind
+        new = slice(self.count, self.count + spawned)
+
+        direction = numpy.asarray(direction, dtype=numpy.float32)
+        directions = (1.0 - kind.spread) * direction + kind.spread * randomDirections(self.rng, spawned)
+        lengths = numpy.linalg.norm(directions, axis=1, keepdims=True)
+        directions /= numpy.maximum(lengths, 1e-6)
+        speeds = self.rng.uniform(*kind.speed, spawned)
+
+        self.positions[new]  = position
+        self.velocities[new] = directions * speeds[:, numpy.newaxis]
+        self.ages[new]       = 0.0
+        self.lifetimes[new]  = self.rng.uniform(*kind.lifetime, spawned)
+        self.count += spawned
+        return spawned
+
+    def step(self, dt: float) -> None:
+        """ Moves and ages all particles by `dt` seconds and removes the
+        expired ones.
+        """
+        n = self.count
+        if n == 0:
+            return
+        kind = self.kind
+        ages = self.ages[:n]
+        ages += dt
+        alive = ages < self.lifetimes[:n]
+        if not alive.all():
+            # pack the survivors to the front, keeping their order
+            n = int(numpy.count_nonzero(alive))
+            for array in (self.positions, self.velocities, self.ages, self.lifetimes):
+                array[:n] = array[:self.count][alive]
+            self.count = n
+
+        positions  = self.positions[:n]
+        velocities = self.velocities[:n]
+        velocities[:, 1] += kind.gravity * dt
+        velocities *= max(1.0 - kind.drag * dt, 0.0)
+        positions += velocities * dt
+        if kind.bounce is not None:
+            below = positions[:, 1] < 0.0
+            positions[below, 1] = 0.0
+            velocities[below, 1] *= -kind.bounce
+
+    def build(self, right, up) -> None:
+        """ Builds one camera-facing quad per particle (as done by
+        draw.billboardQuads() for centered squares) into preallocated
+        buffers.
+        """
+        n = self.count
+        kind = self.kind
+        t = self.ages[:n] / self.lifetimes[:n]
+        sizes = kind.sizes[0] + (kind.sizes[1] - kind.sizes[0]) * t
+        start, end = (numpy.asarray(color, dtype=numpy.float32) for color in kind.colors)
+
+        # corners of a unit quad around its center, facing the camera
+        offsets = draw.QUAD_CORNERS - 0.5
+        corners = (offsets[:, 0:1] * numpy.asarray(right, dtype=numpy.float32)
+            + offsets[:, 1:2] * numpy.asarray(up, dtype=numpy.float32))
+        quads = self.quads[:n]
+        numpy.multiply(sizes[:, numpy.newaxis, numpy.newaxis], corners, out=quads)
+        quads += self.positions[:n, numpy.newaxis]
+        # same color for the 4 vertices, computed as one row of 12
+        tints = self.tints[:n].reshape(n, 12)
+        numpy.multiply(t[:, numpy.newaxis], numpy.tile(end - start, 4), out=tints)
+        tints += numpy.tile(start, 4)
+
+        self.vertices = quads.reshape(-1, 3)
+        self.colors   = tints.reshape(-1, 3)
+
+    def render(self) -> None:
+        """ Draws the quads built by build() as a single batch.
+        """
+        n = len(self.vertices)
+        if n == 0:
+            return
+        texture = self.kind.texture
+        if texture is not None:
+            texture.bind()
+        else:
+            draw.state.disable(gl.GL_TEXTURE_2D)
+
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glEnableClientState(gl.GL_COLOR_ARRAY)
+        gl.glVertexPointer(3, gl.GL_FLOAT, 0, self.vertices)
+        gl.glTexCoordPointer(2, gl.GL_FLOAT, 0, self.texcoords)
+        gl.glColorPointer(3, gl.GL_FLOAT, 0, self.colors)
+        gl.glDrawArrays(gl.GL_QUADS, 0, n)
+        gl.glDisableClientState(gl.GL_COLOR_ARRAY)
+        gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+
+        if texture is None:
+            draw.state.enable(gl.GL_TEXTURE_2D)
+
+
+# ---------------------------------------------------------------------
+
+class ParticleSystem(object):
+    """ One ParticleEmitter per ParticleType plus continuous sources
+    (e.g. torches), whose ambient particles are kept in emitters of
+    their own. Particles are purely visual and simulated on the render
+    side: burst() only queues a request, so it may be called by the
+    simulation thread, while update() emits, advances to the given tick
+    and builds the quads.
+    """
+
+    # don't catch up with more than this many ticks at once
+    MAX_STEPS = 10
+
+    def __init__(self, capacity=4096, seed=None):
+        self.capacity = capacity
+        self.rng      = numpy.random.default_rng(seed)
+        self.emitters = dict() # ParticleType -> ParticleEmitter
+        self.ambient  = dict() # same, fed by the sources
+        self.sources  = list() # [kind, position, rate, pending]
+        self.requests = collections.deque(maxlen=1024) # unless rendered
+        self.tick     = None
+
+    def getEmitter(self, kind, ambient=False):
+        emitters = self.ambient if ambient else self.emitters
+        emitter = emitters.get(kind)
+        if emitter is None:
+            emitter = ParticleEmitter(kind, self.capacity, self.rng)
+            emitters[kind] = emitter
+        return emitter
+
+    def getEmitters(self):
+        yield from self.emitters.values()
+        yield from self.ambient.values()
+
+    def burst(self, kind, n: int, position, direction=(0.0, 1.0, 0.0)) -> None:
+        self.requests.append((kind, n, tuple(position), tuple(direction)))
+
+    def addSource(self, kind, position, rate: float) -> None:
+        """ Emits `rate` particles per second at `position`.
+        """
+        self.getEmitter(kind, ambient=True)
+        self.sources.append([kind, tuple(position), rate, 0.0])
+
+    def getCount(self) -> int:
+        return sum(emitter.count for emitter in self.getEmitters())
+
+    def isIdle(self, ambient=True) -> bool:
+        """ Returns whether nothing is (or will be) visible. Unless
+        `ambient` is set, the sources and their particles are ignored,
+        because they never settle.
+        """
+        if len(self.requests) > 0 or any(emitter.count > 0 for emitter in self.emitters.values()):
+            return False
+        return not ambient or (len(self.sources) == 0 and self.getCount() == 0)
+
+    def update(self, tick: int, eye, angle) -> None:
+        """ Advances to the simulation `tick` and builds the quads for a
+        camera at `eye` which is rotated by `angle` degrees around the
+        y-axis, see BillboardSystem.update().
+        """
+        steps = 0 if self.tick is None else min(max(tick - self.tick, 0), self.MAX_STEPS)
+        self.tick = tick
+        dt = steps / TICKS_PER_SECOND
+
+        if dt > 0.0:
+            for emitter in self.getEmitters():
+                emitter.step(dt)
+            for source in self.sources:
+                kind, position, rate, pending = source
+                pending += rate * dt
+                n = int(pending)
+                self.getEmitter(kind, ambient=True).emit(n, position)
+                source[3] = pending - n
+        while len(self.requests) > 0:
+            kind, n, position, direction = self.requests.popleft()
+            self.getEmitter(kind).emit(n, position, direction)
+
+        radians = angle * math.pi / 180.0
+        right = (math.cos(radians), 0.0, math.sin(radians))
+        up    = (0.0, 1.0, 0.0)
+        for emitter in self.getEmitters():
+            emitter.build(right, up)
+
+    def render(self) -> None:
+        """ Draws all particles in world coordinates, one batch per
+        kind.
+        """
+        draw.state.matrixMode(gl.GL_MODELVIEW)
+        gl.glPushMatrix()
+        gl.glLoadIdentity()
+        for emitter in self.getEmitters():
+            emitter.render()
+        gl.glPopMatrix()
@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections, math
+
+import numpy
+
+import tiles
+
+
+# `cell` that blocked the ray, `distance` travelled in world scale,
+# `point` where it entered the cell as (x, z) and the cell's `normal`
+# on that side
+Hit = collections.namedtuple('Hit', ['cell', 'distance', 'point', 'normal'])
+
+
+class Raycaster(object):
+    """ Traces rays through the dungeon grid (Amanatides & Woo), using
+    world positions (x, z) as the Camera does with the same `scale`.
+    Opaque tiles (walls) block rays, everything outside the dungeon
+    counts as wall. Attach it to the dungeon to follow its edits.
+    """
+
+    def __init__(self, dungeon, scale=3.0):
+        self.dungeon = dungeon
+        self.scale   = scale
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        self.blocked = self.dungeon.getMask(tiles.OPAQUE)
+
+    def attach(self, dungeon) -> None:
+        dungeon.listeners.append(self.onChange)
+
+    def detach(self, dungeon) -> None:
+        dungeon.listeners.remove(self.onChange)
+
+    def onChange(self, pos, cell) -> None:
+        self.blocked[pos[1], pos[0]] = cell.isWall()
+
+    def isBlocked(self, x: int, y: int) -> bool:
+        h, w = self.blocked.shape
+        return not (0 <= x < w and 0 <= y < h) or bool(self.blocked[y, x])
+
+    def traverse(self, origin, direction, max_distance=30.0):
+        """ Yields (cell, distance) for each cell a ray passes, starting
+        with the cell containing `origin`, until `max_distance`. The
+        distance is where the ray enters the cell.
+        """
+        ox, oy = origin[0] / self.scale, origin[1] / self.scale
+        length = math.hypot(*direction)
+        if length == 0.0:
+            raise ValueError('Ray direction must not be zero')
+        dx, dy = direction[0] / length, direction[1] / length
+        limit = max_distance / self.scale
+
+        x, y = math.floor(ox), math.floor(oy)
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # ray parameter of the next vertical / horizontal cell border
+        # and between two of them
+        delta_x = 1.0 / abs(dx) if dx != 0 else math.inf
+        delta_y = 1.0 / abs(dy) if dy != 0 else math.inf
+        next_x = ((x + 1 - ox) if dx > 0 else (ox - x)) * delta_x if dx != 0 else math.inf
+        next_y = ((y + 1 - oy) if dy > 0 else (oy - y)) * delta_y if dy != 0 else math.inf
+
+        t = 0.0
+        normal = (0, 0)
+        while t <= limit:
+            yield (x, y), t * self.scale, normal
+            if next_x < next_y:
+                t = next_x
+                next_x += delta_x
+                x += step_x
+                normal = (-step_x, 0)
+            else:
+                t = next_y
+                next_y += delta_y
+                y += step_y
+                normal = (0, -step_y)
+
+    def cast(self, origin, direction, max_distance=30.0):
+        """ Returns the first Hit of a ray or None if nothing is hit
+        within `max_distance`.
+        """
+        length = math.hypot(*direction)
+        for cell, distance, normal in self.traverse(origin, direction, max_distance):
+            if self.isBlocked(*cell):
+                point = (origin[0] + direction[0] / length * distance,
+                    origin[1] + direction[1] / length * distance)
+                return Hit(cell, distance, point, normal)
+        return None
+
+    def isVisible(self, a, b) -> bool:
+        """ Line of sight between two world positions (x, z).
+        """
+        direction = (b[0] - a[0], b[1] - a[1])
+        distance = math.hypot(*direction)
+        if distance == 0.0:
+            return not self.isBlocked(math.floor(a[0] / self.scale), math.floor(a[1] / self.scale))
+        return self.cast(a, direction, distance) is None
+
+    def castMany(self, origins, directions, max_distance=30.0):
+        """ Traces N rays at once, given (N, 2) origins and directions.
+        Returns the hit cells (N, 2) and distances (N, ) in world scale,
+        the distance is infinite for rays which hit nothing within
+        `max_distance` (which may also be given per ray).
+        """
+        origins = numpy.asarray(origins, dtype=numpy.float64) / self.scale
+        directions = numpy.asarray(directions, dtype=numpy.float64)
+        lengths = numpy.linalg.norm(directions, axis=1)
+        if (lengths == 0.0).any():
+            raise ValueError('Ray direction must not be zero')
+        d = directions / lengths[:, numpy.newaxis]
+        limit = numpy.broadcast_to(numpy.asarray(max_distance, dtype=numpy.float64) / self.scale, lengths.shape)
+
+        cell = numpy.floor(origins).astype(numpy.int64)
+        step = numpy.where(d > 0, 1, -1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            delta = numpy.where(d != 0, 1.0 / numpy.abs(d), numpy.inf)
+            border = numpy.where(d > 0, cell + 1 - origins, origins - cell)
+            upcoming = numpy.where(d != 0, border * delta, numpy.inf)
+
+        h, w = self.blocked.shape
+        n = len(origins)
+        t = numpy.zeros(n)
+        hit = numpy.zeros(n, dtype=bool)
+        active = numpy.ones(n, dtype=bool)
+        while active.any():
+            i = numpy.flatnonzero(active)
+            x, y = cell[i, 0], cell[i, 1]
+            inside = (x >= 0) & (y >= 0) & (x < w) & (y < h)
+            blocked = ~inside
+            blocked[inside] = self.blocked[y[inside], x[inside]]
+            hit[i[blocked]] = True
+            active[i[blocked]] = False
+
+            # advance the others along the nearer border
+            i = i[~blocked]
+            axis = (upcoming[i, 1] <= upcoming[i, 0]).astype(numpy.int64)
+            t[i] = upcoming[i, axis]
+            upcoming[i, axis] += delta[i, axis]
+            cell[i, axis] += step[i, axis]
+            active[i[t[i] > limit[i]]] = False
+
+        distances = numpy.where(hit, t * self.scale, numpy.inf)
+        return cell, distances
+
+    def isVisibleMany(self, a, b):
+        """ Line of sight for N pairs of world positions (N, 2).
+        """
+        a = numpy.asarray(a, dtype=numpy.float64)
+        b = numpy.asarray(b, dtype=numpy.float64)
+        directions = b - a
+        distances = numpy.linalg.norm(directions, axis=1)
+        # identical points are checked along an arbitrary direction
+        directions[distances == 0.0] = (1.0, 0.0)
+        cells, hits = self.castMany(a, directions, distances)
+        return hits > distances
+
+    def pick(self, origin, direction, centers, radius, max_distance=30.0) -> int:
+        """ Returns the index of the first of the (N, 2) `centers` whose
+        circle of `radius` is hit by the ray before any wall, else -1.
+        """
+        centers = numpy.asarray(centers, dtype=numpy.float64).reshape(-1, 2)
+        if len(centers) == 0:
+            return -1
+        hit = self.cast(origin, direction, max_distance)
+        limit = hit.distance if hit is not None else max_distance
+
+        d = numpy.asarray(direction, dtype=numpy.float64)
+        d /= numpy.linalg.norm(d)
+        offset = centers - numpy.asarray(origin, dtype=numpy.float64)
+        along = offset @ d
+        aside = numpy.abs(offset[:, 0] * d[1] - offset[:, 1] * d[0])
+        candidates = (along > 0.0) & (aside <= radius) & (along <= limit)
+        if not candidates.any():
+            return -1
+        along[~candidates] = numpy.inf
+        return int(numpy.argmin(along))
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections
+
+import numpy
+
+import tiles
+
+
+# kinds of walkable cells
+NONE     = 0
+ROOM     = 1 # part of a walkable 2x2 block
+CORRIDOR = 2
+
+NEIGHBORS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def computeKinds(walkable):
+    """ Classifies each cell of a 2D walkable mask [y, x] as NONE, ROOM
+    or CORRIDOR. Outside the mask counts as not walkable.
+    """
+    h, w = walkable.shape
+    blocks = walkable[:-1, :-1] & walkable[1:, :-1] & walkable[:-1, 1:] & walkable[1:, 1:]
+    padded = numpy.zeros((h + 1, w + 1), dtype=bool)
+    padded[1:h, 1:w] = blocks
+    room = padded[:-1, :-1] | padded[1:, :-1] | padded[:-1, 1:] | padded[1:, 1:]
+    kinds = numpy.where(walkable, CORRIDOR, NONE).astype(numpy.int8)
+    kinds[room] = ROOM
+    return kinds
+
+
+# ---------------------------------------------------------------------
+
+class Labeling(object):
+    """ Labels 4-connected components of cells sharing the same non-zero
+    kind. Changing a cell's kind updates the labels incrementally:
+    joining components relabels the smaller ones, removing a cell only
+    floods its own component to detect a split.
+    """
+
+    def __init__(self, kinds):
+        self.rebuild(kinds)
+
+    def rebuild(self, kinds):
+        self.kinds  = numpy.array(kinds, dtype=numpy.int8)
+        self.labels = numpy.full(self.kinds.shape, -1, dtype=numpy.int32)
+        self.sizes  = dict() # label -> number of cells
+        self.next_label = 0
+        for y, x in numpy.argwhere(self.kinds != NONE):
+            if self.labels[y, x] == -1:
+                self.flood(x, y, -1)
+
+    def newLabel(self) -> int:
+        label = self.next_label
+        self.next_label += 1
+        self.sizes[label] = 0
+        return label
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def getNeighbors(self, x: int, y: int):
+        h, w = self.kinds.shape
+        for dx, dy in NEIGHBORS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < w and 0 <= ny < h:
+                yield nx, ny
+
+    def flood(self, x: int, y: int, old: int, label=None, until=None) -> bool:
+        """ Relabels the component of (x, y), which is labeled `old`,
+        with `label` or a new one. If `until` is given, stops (without
+        relabeling) once all of these cells were reached and returns
+        True.
+        """
+        kind = self.kinds[y, x]
+        seen = {(x, y)}
+        queue = collections.deque(seen)
+        pending = set(until) - seen if until is not None else None
+        while len(queue) > 0:
+            cx, cy = queue.popleft()
+            for n in self.getNeighbors(cx, cy):
+                if n not in seen and self.kinds[n[1], n[0]] == kind and self.labels[n[1], n[0]] == old:
+                    seen.add(n)
+                    queue.append(n)
+                    if pending is not None:
+                        pending.discard(n)
+                        if len(pending) == 0:
+                            return True
+        if label is None:
+            label = self.newLabel()
+        xs, ys = zip(*seen)
+        self.labels[list(ys), list(xs)] = label
+        self.sizes[label] += len(seen)
+        if old in self.sizes:
+            self.sizes[old] -= len(seen)
+        return False
+
+    def set(self, x: int, y: int, kind: int) -> None:
+        old_kind = self.kinds[y, x]
+        if old_kind == kind:
+            return
+
+        if old_kind != NONE:
+            # remove, this may split its component
+            label = self.labels[y, x]
+            self.kinds[y, x]  = NONE
+            self.labels[y, x] = -1
+            self.sizes[label] -= 1
+            starts = [n for n in self.getNeighbors(x, y) if self.labels[n[1], n[0]] == label]
+            while len(starts) > 1:
+                # the first group gets a new label, unless it reaches all others
+                first = starts.pop(0)
+                if self.flood(first[0], first[1], label, until=starts):
+                    break
+                starts = [n for n in starts if self.labels[n[1], n[0]] == label]
+            if self.sizes[label] == 0:
+                del self.sizes[label]
+
+        if kind != NONE:
+            # add, this may join components
+            self.kinds[y, x] = kind
+            joined = {self.labels[n[1], n[0]] for n in self.getNeighbors(x, y)
+                if self.kinds[n[1], n[0]] == kind}
+            if len(joined) == 0:
+                label = self.newLabel()
+            else:
+                label = max(joined, key=lambda l: self.sizes[l])
+                for other in joined - {label}:
+                    self.labels[self.labels == other] = label
+                    self.sizes[label] += self.sizes.pop(other)
+            self.labels[y, x] = label
+            self.sizes[label] += 1
+
+
+# ---------------------------------------------------------------------
+
+class RegionIndex(object):
+    """ Keeps track of which walkable cells are connected and splits
+    them into rooms and corridors, so reachability can be checked
+    without searching. Attach it to the dungeon to follow its edits;
+    call rebuild() after loading a new level.
+    """
+
+    def __init__(self, dungeon):
+        self.dungeon = dungeon
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        self.walkable   = self.dungeon.getMask(tiles.WALKABLE)
+        self.components = Labeling(self.walkable)
+        self.regions    = Labeling(computeKinds(self.walkable))
+        self.graph      = None
+
+    def attach(self, dungeon) -> None:
+        dungeon.listeners.append(self.onChange)
+
+    def detach(self, dungeon) -> None:
+        dungeon.listeners.remove(self.onChange)
+
+    def onChange(self, pos, cell) -> None:
+        x, y = pos
+        walkable = cell.isWalkable()
+        if self.walkable[y, x] == walkable:
+            return
+        self.walkable[y, x] = walkable
+        self.components.set(x, y, int(walkable))
+
+        # only the 2x2 blocks around the cell can change
+        x0, y0 = max(x - 2, 0), max(y - 2, 0)
+        kinds = computeKinds(self.walkable[y0:y + 3, x0:x + 3])
+        for ky, kx in numpy.ndindex(kinds.shape):
+            cx, cy = x0 + kx, y0 + ky
+            if abs(cx - x) <= 1 and abs(cy - y) <= 1:
+                self.regions.set(cx, cy, kinds[ky, kx])
+        self.graph = None
+
+    def lookup(self, labeling, xs, ys):
+        xs = numpy.asarray(xs)
+        ys = numpy.asarray(ys)
+        h, w = labeling.labels.shape
+        inside = (xs >= 0) & (ys >= 0) & (xs < w) & (ys < h)
+        result = numpy.full(xs.shape, -1, dtype=numpy.int32)
+        result[inside] = labeling.labels[ys[inside], xs[inside]]
+        return result
+
+    def getComponents(self, xs, ys):
+        """ Returns the component label per cell, -1 if not walkable.
+        """
+        return self.lookup(self.components, xs, ys)
+
+    def getComponent(self, pos) -> int:
+        return int(self.getComponents(pos[0], pos[1]))
+
+    def isReachable(self, a, b) -> bool:
+        label = self.getComponent(a)
+        return label > -1 and label == self.getComponent(b)
+
+    def getRegion(self, pos) -> int:
+        """ Returns the room or corridor label of a cell, -1 if it is
+        not walkable.
+        """
+        return int(self.lookup(self.regions, pos[0], pos[1]))
+
+    def isRoom(self, pos) -> bool:
+        x, y = pos
+        return self.dungeon.has(x, y) and self.regions.kinds[y, x] == ROOM
+
+    def getRegionGraph(self) -> dict:
+        """ Returns the adjacency of regions as region -> set of regions,
+        each region being a room or a corridor.
+        """
+        if self.graph is None:
+            labels = self.regions.labels
+            graph = {label: set() for label in self.regions.sizes}
+            pairs = [(labels[:, :-1], labels[:, 1:]), (labels[:-1, :], labels[1:, :])]
+            for a, b in pairs:
+                mask = (a > -1) & (b > -1) & (a != b)
+                for u, v in set(zip(a[mask].tolist(), b[mask].tolist())):
+                    graph[u].add(v)
+                    graph[v].add(u)
+            self.graph = graph
+        return self.graph
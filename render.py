@@ -1,11 +1,55 @@
 #!/usr/bin/python3 
 # -*- coding: utf-8 -*-
 
-import math
+import math, functools
 
+import numpy
 import pygame
 import OpenGL.GL as gl
 
+import simulation, tiles
+
+
+# key bindings, in order of priority
+KEY_ACTIONS = [
+    (pygame.K_w, simulation.AHEAD),
+    (pygame.K_s, simulation.BACK),
+    (pygame.K_a, simulation.LEFT),
+    (pygame.K_d, simulation.RIGHT),
+    (pygame.K_q, simulation.TURN_LEFT),
+    (pygame.K_e, simulation.TURN_RIGHT)
+]
+
+
+def keysToAction(keys) -> int:
+    """ Returns the action of the first pressed key.
+    """
+    for key, action in KEY_ACTIONS:
+        if keys[key]:
+            return action
+    return simulation.NONE
+
+
+@functools.lru_cache(maxsize=64)
+def rotation(angle):
+    """ Returns (cos, sin) of `angle` degrees. Animations rotate in
+    fixed steps, so these are cached.
+    """
+    radians = angle * math.pi / 180.0
+    return math.cos(radians), math.sin(radians)
+
+
+def perspectiveMatrix(fovy, aspect, near, far):
+    """ Same as gluPerspective(), row-major.
+    """
+    f = 1.0 / math.tan(fovy * math.pi / 360.0)
+    return numpy.array([
+        [f / aspect, 0.0,                          0.0,                              0.0],
+        [       0.0,   f,                          0.0,                              0.0],
+        [       0.0, 0.0, (far + near) / (near - far), 2.0 * far * near / (near - far)],
+        [       0.0, 0.0,                         -1.0,                              0.0]
+    ], dtype=numpy.float32)
+
 
 class CameraAnimation(object):
     def __init__(self, camera):
@@ -40,6 +84,34 @@ class CameraAnimation(object):
         self.counts -= 1
 
 
+# ---------------------------------------------------------------------
+
+class CameraPose(object):
+    """ Immutable copy of a camera's transformation, which can be
+    handed to another thread (e.g. for rendering) and used in place
+    of the camera by the Renderer.
+    """
+    __slots__ = ('version', 'pos', 'angle', 'look', 'view', 'projection')
+
+    def __init__(self, camera):
+        self.version    = camera.version
+        self.pos        = camera.pos
+        self.angle      = camera.angle
+        self.look       = camera.look
+        self.view       = camera.getViewMatrix()
+        self.projection = camera.getProjectionMatrix()
+
+    def getViewMatrix(self):
+        return self.view
+
+    def getProjectionMatrix(self):
+        return self.projection
+
+    def apply(self):
+        # GL expects column-major order
+        gl.glMultMatrixf(self.view.T)
+
+
 # ---------------------------------------------------------------------
 
 class Camera(object):
@@ -49,6 +121,10 @@ class Camera(object):
         """               
         self.dungeon = dungeon
         self.scale = scale
+
+        # incremented whenever pose or projection change
+        self.version = 0
+        self.setProjection(45.0, 4.0 / 3.0, 0.1, 30.0)
         
         self.moveTo(0.0, 0.0, 0.0)
         self.look  = (0.0, 1.0)
@@ -58,6 +134,67 @@ class Camera(object):
 
         self.no_collision = False
     
+    def invalidate(self):
+        """ Drop cached matrices after the pose has changed.
+        """
+        self.version += 1
+        self.view    = None
+        self.frustum = None
+
+    def setProjection(self, fovy, aspect, near, far):
+        self.projection_params = (fovy, aspect, near, far)
+        self.projection = perspectiveMatrix(fovy, aspect, near, far)
+        self.projection.flags.writeable = False
+        self.invalidate()
+
+    def getProjectionMatrix(self):
+        return self.projection
+
+    def getViewMatrix(self):
+        """ Returns the row-major matrix applied by apply().
+        """
+        if self.view is None:
+            cosalpha, sinalpha = rotation(self.angle)
+            rotate = numpy.array([
+                [ cosalpha, 0.0, sinalpha, 0.0],
+                [      0.0, 1.0,      0.0, 0.0],
+                [-sinalpha, 0.0, cosalpha, 0.0],
+                [      0.0, 0.0,      0.0, 1.0]
+            ], dtype=numpy.float32)
+            translate = numpy.identity(4, dtype=numpy.float32)
+            translate[0:3, 3] = (-self.pos[0], -self.pos[1], -self.pos[2])
+            self.view = rotate @ translate
+            # replaced, never modified, so poses can share it
+            self.view.flags.writeable = False
+        return self.view
+
+    def getFrustum(self):
+        """ Returns the six normalized frustum planes (left, right,
+        bottom, top, near, far) as rows of (a, b, c, d) with the
+        normals pointing inwards.
+        """
+        if self.frustum is None:
+            m = self.projection @ self.getViewMatrix()
+            planes = numpy.array([m[3] + m[0], m[3] - m[0], m[3] + m[1],
+                m[3] - m[1], m[3] + m[2], m[3] - m[2]], dtype=numpy.float32)
+            planes /= numpy.linalg.norm(planes[:, 0:3], axis=1)[:, numpy.newaxis]
+            self.frustum = planes
+        return self.frustum
+
+    def cullSpheres(self, centers, radii=0.0):
+        """ Returns a mask of the (N, 3) world-space spheres which are
+        at least partly inside the view frustum.
+        """
+        planes = self.getFrustum()
+        distances = numpy.asarray(centers, dtype=numpy.float32) @ planes[:, 0:3].T + planes[:, 3]
+        return numpy.all(distances >= -numpy.asarray(radii)[..., numpy.newaxis], axis=-1)
+
+    def isVisible(self, point, radius=0.0) -> bool:
+        return bool(self.cullSpheres(numpy.array([point]), radius)[0])
+
+    def getPose(self):
+        return CameraPose(self)
+
     def getLookNormal(self):
         # calculate normal vector of looking direction within xz-plane
         # x = x * cos(90°) - y * sin(90°)
@@ -69,17 +206,25 @@ class Camera(object):
         """
         # x <- x * cos(alpha) - y * sin(alpha)
         # y <- x * sin(alpha) + y * cos(alpha)
-        radians  = angle * math.pi / 180.0
-        cosalpha = math.cos(radians)
-        sinalpha = math.sin(radians)
+        cosalpha, sinalpha = rotation(angle)
         x, z = self.look
         newx = x * cosalpha - z * sinalpha
         newz = x * sinalpha + z * cosalpha
         self.look  = (newx, newz)
         self.angle = (self.angle + angle) % 360.0
+        self.invalidate()
     
+    def setAngle(self, angle):
+        """ Turn to an absolute angle around the y-axis, e.g. when
+        restoring a saved pose. At 180° the camera looks along +z.
+        """
+        self.look  = (0.0, 1.0)
+        self.angle = 180.0
+        self.rotate(angle - 180.0)
+
     def moveTo(self, x: float, y: float, z: float):
         self.pos = (self.scale * x, self.scale * y, self.scale * z)
+        self.invalidate()
 
     def move(self, distance, ahead=True):
         into = self.look if ahead else self.getLookNormal()
@@ -88,15 +233,17 @@ class Camera(object):
         x += self.scale * distance * into[0]
         z += self.scale * distance * into[1]
         self.pos = (x, y, z)
+        self.invalidate()
 
     def moveUp(self, distance):
         x, y, z = self.pos
         y += self.scale * distance
         self.pos = (x, y, z)
+        self.invalidate()
 
     def apply(self):
-        gl.glRotate(self.angle, 0.0, 1.0, 0.0)
-        gl.glTranslate(-self.pos[0], -self.pos[1], -self.pos[2])
+        # GL expects column-major order
+        gl.glMultMatrixf(self.getViewMatrix().T)
 
     def getWorldPos(self, step=0, ahead=True):
         # get position in world scale
@@ -110,45 +257,77 @@ class Camera(object):
                 into = (-into[0], -into[1])
             x += into[0]
             y += into[1]
-        return (int(x), int(y))
+        return (math.floor(x), math.floor(y))
     
     def update(self, keys):
         """ Handle input key input
         """
         if self.animation.isIdle():
-            if keys[pygame.K_w]:
-                # test if walkable
-                pos = self.getWorldPos(step=1, ahead=True)
-                if self.dungeon[pos].isWalkable() or self.no_collision:
-                    # trigger movement
-                    self.animation.startAhead(1)
-                
-            elif keys[pygame.K_s]:
-                # test if walkable
-                pos = self.getWorldPos(step=-1, ahead=True)
-                if self.dungeon[pos].isWalkable() or self.no_collision: 
-                    # trigger movement
-                    self.animation.startAhead(-1)
-                
-            elif keys[pygame.K_a]:
-                # test if walkable
-                pos = self.getWorldPos(step=-1, ahead=False)
-                if self.dungeon[pos].isWalkable() or self.no_collision:
-                    # trigger movement
-                    self.animation.startSideways(-1)
-                
-            elif keys[pygame.K_d]:  
-                # test if walkable
-                pos = self.getWorldPos(step=1, ahead=False)
-                if self.dungeon[pos].isWalkable() or self.no_collision: 
-                    # trigger movement
-                    self.animation.startSideways(1)
-                
-            elif keys[pygame.K_q]:
-                self.animation.startRotate(-1)
-                
-            elif keys[pygame.K_e]:
-                self.animation.startRotate(1)
-        
+            self.perform(keysToAction(keys))
         self.animation()
 
+    def perform(self, action):
+        """ Trigger the animation of a simulation action, moves are
+        only triggered if walkable.
+        """
+        if action in simulation.MOVES:
+            step, ahead = simulation.MOVES[action]
+            x, y = self.getWorldPos(step=step, ahead=ahead)
+            walkable = self.dungeon.has(x, y) and tiles.registry.flags[self.dungeon.tiles[y, x]] & tiles.WALKABLE
+            if walkable or self.no_collision:
+                if ahead:
+                    self.animation.startAhead(step)
+                else:
+                    self.animation.startSideways(step)
+
+        elif action in simulation.TURNS:
+            self.animation.startRotate(simulation.TURNS[action])
+
+
+# ---------------------------------------------------------------------
+
+class SceneTracker(object):
+    """ Decides whether the scene needs to be redrawn. Changes are
+    either reported via markDirty() (e.g. on window expose events) or
+    detected by poll(), which compares watched values with the ones
+    seen at the last redraw.
+    """
+
+    def __init__(self):
+        self.reasons = set()
+        self.watched = dict() # name -> (getter, last value)
+
+        self.drawn   = 0
+        self.skipped = 0
+
+    def markDirty(self, reason='manual'):
+        self.reasons.add(reason)
+
+    def watch(self, name, getter):
+        """ Redraw whenever the value returned by `getter` changes,
+        e.g. Camera.version or a sprite's texrect.
+        """
+        self.watched[name] = (getter, None)
+        self.markDirty(name)
+
+    def poll(self) -> bool:
+        """ Returns whether a redraw is necessary.
+        """
+        for name, (getter, last) in self.watched.items():
+            value = getter()
+            if value != last:
+                self.watched[name] = (getter, value)
+                self.reasons.add(name)
+        return len(self.reasons) > 0
+
+    def isDirty(self) -> bool:
+        return len(self.reasons) > 0
+
+    def clear(self, drawn=True):
+        """ Call after each frame with whether it was drawn.
+        """
+        if drawn:
+            self.drawn += 1
+        else:
+            self.skipped += 1
+        self.reasons.clear()
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import struct, time
+
+import pygame
+
+
+# keys handled by render.Camera.update()
+TRACKED_KEYS = (pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d, pygame.K_q, pygame.K_e)
+
+MAGIC   = b'PCIN'
+VERSION = 1
+
+header = struct.Struct('<4sBB')  # magic, version, number of keys
+key    = struct.Struct('<I')
+tick   = struct.Struct('<IB')    # key bitmask, number of clicks
+click  = struct.Struct('<BHH')   # mouse button, x, y
+
+
+class KeyState(object):
+    """ Stand-in for pygame.key.get_pressed() built from a bitmask over
+    the tracked keys. All other keys are released.
+    """
+
+    def __init__(self, mask: int, keys=TRACKED_KEYS):
+        self.mask = mask
+        self.bits = {k: 1 << i for i, k in enumerate(keys)}
+
+    def __getitem__(self, k) -> bool:
+        return bool(self.mask & self.bits.get(k, 0))
+
+    @staticmethod
+    def encode(pressed, keys=TRACKED_KEYS) -> int:
+        mask = 0
+        for i, k in enumerate(keys):
+            if pressed[k]:
+                mask |= 1 << i
+        return mask
+
+
+# ---------------------------------------------------------------------
+
+class InputRecorder(object):
+    """ Writes the per-tick input of a session to a compact binary
+    file: a bitmask of the tracked keys and the mouse clicks.
+    """
+
+    def __init__(self, fname: str, keys=TRACKED_KEYS, flush_after=600):
+        self.keys        = keys
+        self.flush_after = flush_after
+        self.ticks       = 0
+        self.buffer      = bytearray(header.pack(MAGIC, VERSION, len(keys)))
+        for k in keys:
+            self.buffer += key.pack(k)
+        self.handle = open(fname, 'wb')
+
+    def record(self, pressed, clicks=tuple()) -> None:
+        """ Record one tick. `clicks` holds (button, x, y) tuples.
+        """
+        self.buffer += tick.pack(KeyState.encode(pressed, self.keys), len(clicks))
+        for button, x, y in clicks:
+            self.buffer += click.pack(button, x, y)
+        self.ticks += 1
+        if self.ticks % self.flush_after == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        self.handle.write(self.buffer)
+        self.handle.flush()
+        self.buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# ---------------------------------------------------------------------
+
+class InputReplay(object):
+    """ Reads a file written by InputRecorder and yields the input of
+    each tick as (keys, clicks), where `keys` can be passed to
+    render.Camera.update().
+    """
+
+    def __init__(self, fname: str):
+        with open(fname, 'rb') as h:
+            self.raw = h.read()
+
+        magic, version, n = header.unpack_from(self.raw, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{0} is not an input recording'.format(fname))
+        offset = header.size
+        self.keys = list()
+        for i in range(n):
+            self.keys.append(key.unpack_from(self.raw, offset)[0])
+            offset += key.size
+        self.start = offset
+
+    def __iter__(self):
+        offset = self.start
+        states = dict() # reuse KeyState per bitmask
+        while offset + tick.size <= len(self.raw):
+            mask, n = tick.unpack_from(self.raw, offset)
+            offset += tick.size
+            clicks = list()
+            for i in range(n):
+                clicks.append(click.unpack_from(self.raw, offset))
+                offset += click.size
+            if mask not in states:
+                states[mask] = KeyState(mask, self.keys)
+            yield states[mask], clicks
+
+
+def run(fname: str, step) -> tuple:
+    """ Feeds a recording into `step(keys, clicks)` as fast as possible.
+    Returns the number of ticks and the elapsed seconds.
+    """
+    ticks = 0
+    start = time.perf_counter()
+    for keys, clicks in InputReplay(fname):
+        step(keys, clicks)
+        ticks += 1
+    return ticks, time.perf_counter() - start
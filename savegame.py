@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections, json, os, struct, threading, time, zlib
+
+import numpy
+
+
+MAGIC   = b'PCSG'
+VERSION = 1
+
+# magic, version, size of the JSON index; followed by the compressed
+# index and blobs
+header = struct.Struct('<4sHI')
+
+# Copy of everything needed to restore a game. Only holds arrays owned
+# by the state itself, so it can be handed to another thread.
+SaveState = collections.namedtuple('SaveState',
+    ['tick', 'pos', 'angle', 'symbols', 'ids', 'next_id', 'columns'])
+
+
+def capture(game):
+    """ Copies the game state. This is done on the thread which owns
+    the game and only copies a few arrays, all encoding is left to
+    serialize().
+    """
+    store = game.entities
+    n = len(store)
+    columns = {name: column[:n].copy() for name, column in store.columns.items()}
+    # symbols are ASCII, so keep one byte instead of UCS-4 per cell
+    symbols = game.dungeon.symbols.view(numpy.uint32).astype(numpy.uint8)
+    return SaveState(game.ticks, game.cam.pos, game.cam.angle, symbols,
+        store.getIds().copy(), store.next_id, columns)
+
+
+def serialize(state) -> bytes:
+    index  = {'tick': state.tick, 'pos': state.pos, 'angle': state.angle,
+        'next_id': state.next_id, 'blobs': list()}
+    blobs = [('symbols', state.symbols), ('ids', state.ids)]
+    blobs += [('column:' + name, column) for name, column in sorted(state.columns.items())]
+
+    offset = 0
+    for name, array in blobs:
+        index['blobs'].append({'name': name, 'dtype': array.dtype.str,
+            'shape': array.shape, 'offset': offset, 'size': array.nbytes})
+        offset += array.nbytes
+
+    raw = json.dumps(index).encode('utf-8')
+    payload = zlib.compress(raw + b''.join(array.tobytes() for name, array in blobs), 6)
+    return header.pack(MAGIC, VERSION, len(raw)) + payload
+
+
+def deserialize(data: bytes):
+    magic, version, size = header.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a savegame')
+    payload = zlib.decompress(data[header.size:])
+    index = json.loads(payload[:size].decode('utf-8'))
+
+    arrays = dict()
+    for blob in index['blobs']:
+        start = size + blob['offset']
+        array = numpy.frombuffer(payload[start:start + blob['size']], dtype=blob['dtype'])
+        arrays[blob['name']] = array.reshape(blob['shape']).copy()
+
+    columns = {name[len('column:'):]: array for name, array in arrays.items()
+        if name.startswith('column:')}
+    return SaveState(index['tick'], tuple(index['pos']), index['angle'],
+        arrays['symbols'], arrays['ids'], index['next_id'], columns)
+
+
+def saveToFile(fname: str, state) -> None:
+    """ Writes the state atomically: a crash while saving leaves the
+    previous savegame intact.
+    """
+    data = serialize(state)
+    tmp = fname + '.tmp'
+    with open(tmp, 'wb') as h:
+        h.write(data)
+        h.flush()
+        os.fsync(h.fileno())
+    os.replace(tmp, fname)
+
+
+def loadFromFile(fname: str):
+    with open(fname, 'rb') as h:
+        return deserialize(h.read())
+
+
+def restore(game, state) -> None:
+    """ Applies a loaded state to a game running the same level.
+    """
+    symbols = state.symbols.astype(numpy.uint32).view('U1')
+    game.dungeon.loadFromArray(symbols)
+    game.onLevelLoaded()
+
+    game.ticks = state.tick
+    game.clock.tick = state.tick
+    game.swing_started = state.tick - game.swing.getDuration()
+    game.cam.pos = tuple(state.pos)
+    game.cam.setAngle(state.angle)
+
+    store = game.entities
+    n = len(state.ids)
+    if len(store.ids) < n:
+        store.ids = store.grow(store.ids, n, 0)
+        for name, column in store.columns.items():
+            store.columns[name] = store.grow(column, n, store.fills[name])
+    for name, column in store.columns.items():
+        column[:] = store.fills[name]
+        if name in state.columns:
+            column[:n] = state.columns[name]
+    if len(store.lookup) < state.next_id:
+        store.lookup = store.grow(store.lookup, state.next_id, -1)
+    store.lookup[:] = -1
+    store.ids[:n] = state.ids
+    store.lookup[state.ids] = numpy.arange(n)
+    store.count   = n
+    store.next_id = state.next_id
+    game.scene.markDirty('restore')
+
+
+# ---------------------------------------------------------------------
+
+class Autosaver(threading.Thread):
+    """ Writes savegames in the background. The owner of the game calls
+    isDue() once per tick and, if so, submit(capture(game)); encoding,
+    compression and writing happen on this thread. If a save is still
+    in progress, only the latest submitted state is kept.
+    """
+
+    def __init__(self, fname: str, interval=60.0):
+        super().__init__(name='autosave', daemon=True)
+        self.fname     = fname
+        self.interval  = interval
+        self.next_save = time.monotonic() + interval
+
+        self.pending = None
+        self.wakeup  = threading.Event()
+        self.stopped = False
+        self.saved   = 0
+        self.error   = None
+
+    def isDue(self) -> bool:
+        return time.monotonic() >= self.next_save
+
+    def submit(self, state) -> None:
+        self.next_save = time.monotonic() + self.interval
+        self.pending = state
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            state, self.pending = self.pending, None
+            if state is not None:
+                try:
+                    saveToFile(self.fname, state)
+                    self.saved += 1
+                except Exception as error:
+                    self.error = error
+            if self.stopped and self.pending is None:
+                break
+
+    def stop(self):
+        """ Write a pending state, then join the thread. Re-raises the
+        last error that occurred while saving.
+        """
+        self.stopped = True
+        self.wakeup.set()
+        self.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections, sys, threading, time
+
+import numpy
+
+import tiles
+
+
+# actions of a crawler, see render.KEY_ACTIONS for the key bindings
+NONE       = 0
+AHEAD      = 1
+BACK       = 2
+LEFT       = 3
+RIGHT      = 4
+TURN_LEFT  = 5
+TURN_RIGHT = 6
+
+# action -> (step, ahead), as for Camera.getWorldPos()
+MOVES = {AHEAD: (1, True), BACK: (-1, True), LEFT: (-1, False), RIGHT: (1, False)}
+
+# action -> rotation direction, as for CameraAnimation.startRotate()
+TURNS = {TURN_LEFT: -1, TURN_RIGHT: 1}
+
+# ticks per move and per turn, as played by CameraAnimation
+MOVE_TICKS = 20
+TURN_TICKS = 18
+
+# looking directions (x, y) on the grid, turning left increases the index
+DIRECTIONS = numpy.array([(0, 1), (1, 0), (0, -1), (-1, 0)], dtype=numpy.int32)
+
+
+class SimulationThread(threading.Thread):
+    """ Runs the game logic on a worker thread at a fixed rate. Each
+    tick calls `step(keys, clicks)` and publishes the result of
+    `capture()` as `latest`, which must be an immutable snapshot.
+
+    Publishing and reading `latest` as well as feeding new input are
+    plain reference swaps, so the render thread never takes a lock.
+    `fed` counts the calls of feed() and `consumed` how many of them
+    the last step had seen.
+    """
+
+    def __init__(self, step, capture, rate=60.0):
+        super().__init__(name='simulation', daemon=True)
+        self.step     = step
+        self.capture  = capture
+        self.interval = 1.0 / rate
+
+        self.keys     = None
+        self.clicks   = collections.deque()
+        self.fed      = 0
+        self.consumed = 0
+        self.latest   = None
+        self.ticks    = 0
+        self.late     = 0 # ticks which started behind schedule
+        self.error    = None
+        self.stopped  = threading.Event()
+
+    def feed(self, keys, clicks=tuple()):
+        """ Called by the render thread with the current input. Clicks
+        are queued until the next tick.
+        """
+        self.keys = keys
+        self.clicks.extend(clicks)
+        # counted last, so the input seen along with a count is never older
+        self.fed += 1
+
+    def run(self):
+        next_tick = time.perf_counter()
+        try:
+            while not self.stopped.is_set():
+                fed  = self.fed
+                keys = self.keys
+                if keys is not None:
+                    clicks = list()
+                    while len(self.clicks) > 0:
+                        clicks.append(self.clicks.popleft())
+                    self.step(keys, clicks)
+                    self.consumed = fed
+                    self.latest = self.capture()
+                    self.ticks += 1
+
+                next_tick += self.interval
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    self.stopped.wait(delay)
+                else:
+                    # do not try to catch up after a spike
+                    self.late += 1
+                    next_tick = time.perf_counter()
+        except Exception as error:
+            self.error = error
+
+    def stop(self):
+        """ Stop and join the thread. Re-raises an exception that
+        terminated the simulation.
+        """
+        self.stopped.set()
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+# ---------------------------------------------------------------------
+
+class Level(object):
+    """ Immutable level data, which can be shared by any number of
+    crawlers (and threads).
+    """
+
+    def __init__(self, dungeon):
+        self.size = dungeon.size
+        self.walkable = dungeon.getMask(tiles.WALKABLE)
+        self.walkable.flags.writeable = False
+
+    def isWalkable(self, x, y):
+        """ Vectorized Cell.isWalkable(), outside the level is wall.
+        """
+        x = numpy.asarray(x)
+        y = numpy.asarray(y)
+        inside = (x >= 0) & (y >= 0) & (x < self.size[0]) & (y < self.size[1])
+        result = numpy.zeros(x.shape, dtype=bool)
+        result[inside] = self.walkable[y[inside], x[inside]]
+        return result
+
+
+# ---------------------------------------------------------------------
+
+class CrawlerBatch(object):
+    """ Steps many independent crawlers on a shared Level, following
+    the same rules as the Camera: moves and turns are triggered by an
+    action, checked for collision and then animated over several ticks
+    during which further actions are ignored. Everything is done with a
+    few numpy operations per tick, without pygame or OpenGL.
+    """
+
+    def __init__(self, level, count: int, scale=3.0):
+        self.level = level
+        self.scale = scale
+        self.ticks = 0
+
+        self.cells  = numpy.zeros((count, 2), dtype=numpy.int32) # x, y
+        self.facing = numpy.zeros(count, dtype=numpy.int8)       # see DIRECTIONS
+        self.action = numpy.zeros(count, dtype=numpy.int8)       # running action
+        self.counts = numpy.zeros(count, dtype=numpy.int32)      # its remaining ticks
+
+        # statistics
+        self.moves = numpy.zeros(count, dtype=numpy.int64) # finished moves
+        self.bumps = numpy.zeros(count, dtype=numpy.int64) # moves blocked by walls
+
+        # per action: step along the looking direction and its normal
+        self.ahead = numpy.zeros(7, dtype=numpy.int32)
+        self.aside = numpy.zeros(7, dtype=numpy.int32)
+        for action, (step, ahead) in MOVES.items():
+            if ahead:
+                self.ahead[action] = step
+            else:
+                self.aside[action] = step
+        self.turns = numpy.zeros(7, dtype=numpy.int8)
+        for action, direction in TURNS.items():
+            self.turns[action] = -direction # left is counter-clockwise
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def place(self, x: int, y: int, facing=0, which=slice(None)) -> None:
+        """ Put the selected crawlers (default: all) onto a cell.
+        """
+        self.cells[which] = (x, y)
+        self.facing[which] = facing
+        self.action[which] = NONE
+        self.counts[which] = 0
+
+    def isIdle(self):
+        return self.counts <= 0
+
+    def getDelta(self, actions):
+        """ Returns the grid offset per crawler if it performs the
+        given actions.
+        """
+        look = DIRECTIONS[self.facing]
+        normal = numpy.stack((-look[:, 1], look[:, 0]), axis=1)
+        return self.ahead[actions][:, numpy.newaxis] * look + self.aside[actions][:, numpy.newaxis] * normal
+
+    def step(self, actions) -> None:
+        """ Advance all crawlers by one tick. `actions` holds one action
+        per crawler, which is ignored while it is still animating.
+        """
+        actions = numpy.asarray(actions, dtype=numpy.int8)
+        idle = self.isIdle()
+
+        # start new moves and turns
+        is_move = (self.ahead[actions] != 0) | (self.aside[actions] != 0)
+        is_turn = self.turns[actions] != 0
+        target = self.cells + self.getDelta(actions)
+        free = self.level.isWalkable(target[:, 0], target[:, 1])
+        start = idle & ((is_move & free) | is_turn)
+        self.bumps += idle & is_move & ~free
+        self.action[start] = actions[start]
+        self.counts[start] = numpy.where(is_move[start], MOVE_TICKS, TURN_TICKS)
+
+        # animate, actions take effect once they are finished
+        running = self.counts > 0
+        self.counts[running] -= 1
+        done = running & (self.counts == 0)
+        if done.any():
+            finished = self.action[done]
+            self.cells[done] += self.getDelta(self.action)[done]
+            self.moves[done] += (self.ahead[finished] != 0) | (self.aside[finished] != 0)
+            self.facing[done] = (self.facing[done] + self.turns[finished]) % 4
+            self.action[done] = NONE
+        self.ticks += 1
+
+    def getProgress(self):
+        """ Returns how far each crawler is into its action (0 to 1).
+        """
+        total = numpy.where(self.turns[self.action] != 0, TURN_TICKS, MOVE_TICKS)
+        return numpy.where(self.counts > 0, 1.0 - self.counts / total, 0.0)
+
+    def getPositions(self):
+        """ Returns the world positions (x, z) of all crawlers, as the
+        Camera would have them.
+        """
+        progress = self.getProgress()[:, numpy.newaxis]
+        pos = self.cells + 0.5 + progress * self.getDelta(self.action)
+        return pos * self.scale
+
+    def getAngles(self):
+        """ Returns the angles of all crawlers as in Camera.angle.
+        """
+        angles = 180.0 - 90.0 * (self.facing + self.turns[self.action] * self.getProgress())
+        return angles % 360.0
+
+
+def benchmark(fname: str, count: int, ticks: int, seed=0) -> tuple:
+    """ Lets `count` crawlers walk randomly through a level for some
+    ticks. Returns the number of ticks per second and the batch.
+    """
+    import dungeon
+
+    d = dungeon.Dungeon()
+    d.loadFromFile(fname)
+    level = Level(d)
+    batch = CrawlerBatch(level, count)
+    y, x = numpy.argwhere(level.walkable)[0]
+    batch.place(x, y)
+
+    rng = numpy.random.default_rng(seed)
+    start = time.perf_counter()
+    for i in range(ticks):
+        batch.step(rng.integers(0, 7, count, dtype=numpy.int8))
+    seconds = time.perf_counter() - start
+    return ticks / max(seconds, 1e-9), batch
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: simulation.py LEVEL [CRAWLERS [TICKS]]')
+        print('e.g.   simulation.py demo.txt 10000 600')
+        sys.exit(1)
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    ticks = int(sys.argv[3]) if len(sys.argv) > 3 else 600
+    rate, batch = benchmark(sys.argv[1], count, ticks)
+    print('{0} crawlers: {1:.0f} ticks/s ({2:.0f} crawler ticks/s)'.format(count, rate, rate * count))
+    print('{0} moves, {1} bumps'.format(batch.moves.sum(), batch.bumps.sum()))
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest, time
+
+import numpy
+
+import ai, dungeon, entity, regions
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        # entities at tile distances 0, 10 and 20 from the player at (0, 0)
+        self.store = entity.EntityStore()
+        for tiles in [0, 10, 20]:
+            self.store.spawn(position=(tiles * 3.0 + 1.5, 0.0, 1.5))
+
+    def test_getTiers(self):
+        s = ai.Scheduler(self.store)
+        self.assertEqual(s.getTiers((0, 0)).tolist(), [0, 1, 2])
+        self.assertEqual(s.getTiers((10, 0)).tolist(), [1, 0, 1])
+        self.assertEqual(s.getTiers((0, 0), visible=[False, False, True]).tolist(), [0, 1, 0])
+
+    def test_tick_periods(self):
+        s = ai.Scheduler(self.store)
+        counts = numpy.zeros(3, dtype=int)
+        elapsed = dict()
+        def update(ids, ticks):
+            counts[ids] += 1
+            elapsed.update(zip(ids.tolist(), ticks.tolist()))
+        for i in range(32):
+            s.tick((0, 0), update)
+
+        # near every tick, middle every 4th, far every 16th
+        self.assertEqual(counts.tolist(), [32, 8, 2])
+        self.assertEqual(elapsed, {0: 1, 1: 4, 2: 16})
+
+    def test_tick_staggered(self):
+        store = entity.EntityStore()
+        for i in range(16):
+            store.spawn(position=(60.0, 0.0, 60.0))
+        s = ai.Scheduler(store)
+        per_tick = list()
+        for i in range(16):
+            per_tick.append(s.tick((0, 0), lambda ids, ticks: None))
+        # far entities are spread evenly over the period
+        self.assertEqual(per_tick, [1] * 16)
+
+    def test_tick_active(self):
+        s = ai.Scheduler(self.store)
+        seen = list()
+        s.tick((0, 0), lambda ids, ticks: seen.extend(ids.tolist()), active=[False, True, True])
+        self.assertNotIn(0, seen)
+
+    def test_budget_carries_over(self):
+        store = entity.EntityStore()
+        for i in range(10):
+            store.spawn()
+        s = ai.Scheduler(store, budget=0.0, batch=3)
+        seen = list()
+        def update(ids, ticks):
+            seen.append(ids.tolist())
+
+        # one batch per tick, the rest is deferred
+        s.tick((0, 0), update)
+        self.assertEqual(seen, [[0, 1, 2]])
+        self.assertEqual(s.deferred, 7)
+        s.tick((0, 0), update)
+        self.assertEqual(seen[-1], [3, 4, 5])
+        # entities are not queued twice
+        self.assertEqual(s.deferred + 3, 10)
+
+        # dead entities are skipped
+        store.kill(6)
+        s.tick((0, 0), update)
+        self.assertEqual(seen[-1], [7, 8])
+
+    def test_budget_is_enforced(self):
+        store = entity.EntityStore()
+        for i in range(100):
+            store.spawn()
+        s = ai.Scheduler(store, budget=5.0, batch=1)
+        s.tick((0, 0), lambda ids, ticks: time.sleep(0.002))
+        self.assertLess(s.updated, 100)
+        self.assertEqual(s.deferred, 100 - s.updated)
+
+
+# ---------------------------------------------------------------------
+
+class AwarenessTest(unittest.TestCase):
+
+    def test_update(self):
+        store = entity.EntityStore()
+        near = store.spawn(position=(4.5, 0.0, 4.5))
+        far  = store.spawn(position=(40.5, 0.0, 4.5))
+        update = ai.awareness(store, (1, 1), radius=3)
+        update(numpy.array([near, far]), numpy.array([1, 1]))
+        self.assertEqual(store.get(near, 'ai'), entity.CHASE)
+        self.assertEqual(store.get(far, 'ai'), entity.IDLE)
+
+    def test_unreachable(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('5x3\n..#..\n..#..\n..#..')
+        index = regions.RegionIndex(d)
+        store = entity.EntityStore()
+        same  = store.spawn(position=(1.5, 0.0, 4.5))
+        other = store.spawn(position=(10.5, 0.0, 4.5))
+        update = ai.awareness(store, (1, 1), radius=3, index=index)
+        update(numpy.array([same, other]), numpy.array([1, 1]))
+        self.assertEqual(store.get(same, 'ai'), entity.CHASE)
+        self.assertEqual(store.get(other, 'ai'), entity.IDLE)
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest, tempfile, os
+
+import numpy
+from PIL import Image
+
+import bundle, dungeon
+
+
+class BundleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname  = os.path.join(self.tmpdir.name, 'assets.bundle')
+
+        self.dungeon = dungeon.Dungeon()
+        self.dungeon.loadFromMemory('3x3\n# #\n .#\n#.#')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_write_read(self):
+        pixels = bytes(range(2 * 3 * 4))
+        vb = dungeon.VertexBuilder()
+        vb.loadFromDungeon(self.dungeon)
+        arrays = vb.toArrays()
+
+        with bundle.BundleWriter(self.fname) as w:
+            w.addTexture('tiny', 2, 3, pixels)
+            w.addLevel('level', self.dungeon)
+            w.addMesh('level', *arrays)
+
+        b = bundle.Bundle()
+        self.assertTrue(b.loadFromFile(self.fname))
+        self.assertEqual(b.names('texture'), ['tiny'])
+        self.assertEqual(b.names('level'), ['level'])
+        self.assertEqual(b.names('mesh'), ['level'])
+
+        w, h, data = b.texture('tiny')
+        self.assertEqual((w, h), (2, 3))
+        self.assertEqual(data.tobytes(), pixels)
+
+        symbols = b.level('level')
+        self.assertEqual(symbols.tolist(), self.dungeon.symbols.tolist())
+
+        mesh = b.mesh('level')
+        for loaded, built in zip(mesh, arrays):
+            numpy.testing.assert_array_equal(loaded, built)
+            # views onto the mapping, aligned for GL
+            self.assertFalse(loaded.flags.owndata)
+            self.assertFalse(loaded.flags.writeable)
+            self.assertEqual(loaded.__array_interface__['data'][0] % bundle.ALIGNMENT, 0)
+
+        with self.assertRaises(KeyError):
+            b.texture('level')
+
+        del data, symbols, mesh, loaded
+        b.close()
+
+    def test_invalid(self):
+        with bundle.BundleWriter(self.fname) as w:
+            with self.assertRaises(ValueError):
+                w.addTexture('broken', 2, 2, b'1234')
+
+        with open(self.fname, 'wb') as h:
+            h.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            bundle.Bundle().loadFromFile(self.fname)
+
+    def test_build(self):
+        png = os.path.join(self.tmpdir.name, 'red.png')
+        Image.new(mode='RGBA', size=(4, 2), color=(255, 0, 0, 255)).save(png, 'PNG')
+        level = os.path.join(self.tmpdir.name, 'demo.txt')
+        self.dungeon.saveToFile(level)
+
+        bundle.build(self.fname, [png, level])
+        b = bundle.Bundle()
+        b.loadFromFile(self.fname)
+        w, h, data = b.texture('red')
+        self.assertEqual((w, h), (4, 2))
+        self.assertEqual(data[:4].tolist(), [255, 0, 0, 255])
+
+        d = dungeon.Dungeon()
+        self.assertTrue(d.loadFromArray(b.level('demo')))
+        self.assertEqual(d.saveToMemory(), self.dungeon.saveToMemory())
+        self.assertEqual(len(b.mesh('demo')[0]), 4 * 20)
+
+        # baked with the same lighting as the game
+        lighting = dungeon.Lighting()
+        lighting.loadFromDungeon(d)
+        vb = dungeon.VertexBuilder()
+        vb.loadFromDungeon(d, lighting)
+        numpy.testing.assert_array_equal(b.mesh('demo')[2], vb.toArrays()[2])
+        self.assertTrue((b.mesh('demo')[2] < 1.0).any())
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import tempfile, os
+
+import numpy
+import pygame
+
+import capture
+from test.utils import OpenGLTest
+
+
+class CaptureTest(OpenGLTest):
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def fill(self, r, g, b):
+        import OpenGL.GL as gl
+
+        gl.glClearColor(r, g, b, 1.0)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        gl.glClearColor(0.0, 0.0, 0.0, 0.0)
+
+    def test_reader_latency(self):
+        reader = capture.FrameReader(640, 480, count=3)
+        reader.create()
+        self.assertEqual(len(reader.buffers), 3)
+        colors = [(1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0), (1.0, 1.0, 0.0)]
+        frames = list()
+        for color in colors:
+            self.fill(*color)
+            frames.append(reader.read())
+        self.assertIsNone(frames[0])
+        self.assertIsNone(frames[1])
+        self.assertIsNone(frames[2])
+        self.assertEqual(frames[3].shape, (480, 640, 4))
+        self.assertEqual(frames[3][0, 0].tolist(), [255, 0, 0, 255])
+
+        rest = reader.flush()
+        self.assertEqual([frame[10, 10, :3].tolist() for frame in rest],
+            [[0, 255, 0], [0, 0, 255], [255, 255, 0]])
+        reader.destroy()
+        self.assertEqual(reader.buffers, list())
+
+    def test_raw_video(self):
+        fname = os.path.join(self.tmpdir.name, 'video.rgba')
+        recorder = capture.Recorder(fname, 640, 480, latency=2)
+        self.fill(1.0, 0.0, 0.0)
+        recorder.grab()
+        recorder.repeat()
+        self.fill(0.0, 1.0, 0.0)
+        recorder.grab()
+        recorder.close()
+        self.assertEqual(recorder.writer.written, 3)
+
+        with open(fname, 'rb') as h:
+            video = numpy.frombuffer(h.read(), dtype=numpy.uint8).reshape(-1, 480, 640, 4)
+        self.assertEqual([frame[0, 0, :3].tolist() for frame in video],
+            [[255, 0, 0], [255, 0, 0], [0, 255, 0]])
+
+    def test_image_sequence(self):
+        import OpenGL.GL as gl
+
+        pattern = os.path.join(self.tmpdir.name, 'shot%03d.png')
+        recorder = capture.Recorder(pattern, 640, 480)
+        self.fill(0.0, 0.0, 1.0)
+        # mark the top left corner to check the orientation
+        gl.glEnable(gl.GL_SCISSOR_TEST)
+        gl.glScissor(0, 470, 10, 10)
+        self.fill(1.0, 1.0, 1.0)
+        gl.glDisable(gl.GL_SCISSOR_TEST)
+        recorder.grab()
+        recorder.close()
+
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ['shot000.png'])
+        image = pygame.image.load(pattern % 0)
+        self.assertEqual(image.get_size(), (640, 480))
+        self.assertEqual(tuple(image.get_at((0, 0)))[:3], (255, 255, 255))
+        self.assertEqual(tuple(image.get_at((0, 479)))[:3], (0, 0, 255))
+
+    def test_writer_errors(self):
+        writer = capture.FrameWriter(os.path.join(self.tmpdir.name, 'missing', 'video.rgba'), (4, 4))
+        writer.start()
+        writer.submit(numpy.zeros((4, 4, 4), dtype=numpy.uint8))
+        with self.assertRaises(OSError):
+            writer.stop()
+
+    def test_drops_when_behind(self):
+        writer = capture.FrameWriter(os.path.join(self.tmpdir.name, 'video.rgba'), (4, 4), backlog=2)
+        # not started, so nothing is consumed
+        frame = numpy.zeros((4, 4, 4), dtype=numpy.uint8)
+        self.assertTrue(writer.submit(frame))
+        self.assertTrue(writer.submit(frame))
+        self.assertFalse(writer.submit(frame))
+        self.assertEqual(writer.dropped, 1)
@@ -1,7 +1,10 @@
 #!/usr/bin/python3 
 # -*- coding: utf-8 -*- 
 
-import tempfile
+import tempfile, unittest
+from unittest import mock
+
+import numpy
 
 from PIL import Image
 
@@ -9,6 +12,68 @@ import draw
 from test.utils import OpenGLTest
 
 
+class RenderStateTest(OpenGLTest):
+
+    def test_bindTexture(self):
+        s = draw.RenderState()
+        s.bindTexture(0)
+        s.bindTexture(0)
+        self.assertEqual(s.texture, 0)
+        self.assertEqual(s.issued, 1)
+        self.assertEqual(s.skipped, 1)
+
+        s.reset()
+        self.assertIsNone(s.texture)
+        self.assertEqual(s.issued, 0)
+        self.assertEqual(s.skipped, 0)
+
+    def test_enable_disable(self):
+        import OpenGL.GL as gl
+        s = draw.RenderState()
+        s.enable(gl.GL_DEPTH_TEST)
+        s.enable(gl.GL_DEPTH_TEST)
+        self.assertTrue(gl.glIsEnabled(gl.GL_DEPTH_TEST))
+        s.disable(gl.GL_DEPTH_TEST)
+        s.disable(gl.GL_DEPTH_TEST)
+        self.assertFalse(gl.glIsEnabled(gl.GL_DEPTH_TEST))
+        self.assertEqual(s.issued, 2)
+        self.assertEqual(s.skipped, 2)
+
+    def test_matrixMode(self):
+        import OpenGL.GL as gl
+        s = draw.RenderState()
+        s.matrixMode(gl.GL_PROJECTION)
+        s.matrixMode(gl.GL_PROJECTION)
+        self.assertEqual(gl.glGetIntegerv(gl.GL_MATRIX_MODE), gl.GL_PROJECTION)
+        self.assertEqual(s.issued, 1)
+        self.assertEqual(s.skipped, 1)
+
+    def test_changeProjection(self):
+        s = draw.RenderState()
+        self.assertTrue(s.changeProjection(('ortho', (640, 480))))
+        self.assertFalse(s.changeProjection(('ortho', (640, 480))))
+        self.assertTrue(s.changeProjection(('ortho', (320, 240))))
+        self.assertEqual(s.skipped, 1)
+
+    def test_sprites_share_bound_texture(self):
+        t = draw.Texture()
+        img = Image.new(mode='RGB', size=(16, 16))
+        with tempfile.NamedTemporaryFile('wb') as h:
+            img.save(h.name, 'PNG')
+            t.loadFromFile(h.name)
+
+        self.ortho()
+        sprites = [draw.Sprite2D() for i in range(3)]
+        for s in sprites:
+            s.texture = t
+            s.render()
+        self.assertEqual(draw.state.texture, t.id)
+        # texture was bound once while loading, sprites skip it
+        self.assertGreaterEqual(draw.state.skipped, 3)
+
+
+# ---------------------------------------------------------------------
+
 class TextureTest(OpenGLTest):
     
     def test_ctor(self):
@@ -27,6 +92,14 @@ class TextureTest(OpenGLTest):
             self.assertTrue(t.loadFromFile(h.name))
 
 
+    def test_loadFromMemory(self):
+        import numpy
+        t = draw.Texture()
+        self.assertTrue(t.loadFromMemory(2, 2, numpy.zeros(16, dtype=numpy.uint8)))
+        self.assertIsNotNone(t.id)
+        self.assertEqual((t.w, t.h), (2, 2))
+
+
 # ---------------------------------------------------------------------
 
 class Sprite2DTest(OpenGLTest):
@@ -201,3 +274,361 @@ class Sprite3DTest(OpenGLTest):
         self.assertEqual(s.origin, (0.5, 0.5, 0.5))
         # @NOTE: the rest is done by .transform() within OpenGL
     
+
+
+# ---------------------------------------------------------------------
+
+class BillboardSystemTest(OpenGLTest):
+
+    def test_add_remove(self):
+        b = draw.BillboardSystem(capacity=1)
+        t = draw.Texture()
+        i = b.add(t, 1.0, 2.0, 3.0)
+        j = b.add(None, 4.0, 5.0, 6.0, 0.5, 0.25)
+        self.assertEqual((i, j), (0, 1))
+        self.assertEqual(len(b.active), 2) # grown
+        self.assertEqual(b.textures, [t, None])
+        self.assertEqual(b.sizes[j].tolist(), [0.5, 0.25])
+
+        # slots are reused
+        b.remove(i)
+        self.assertFalse(b.active[i])
+        self.assertEqual(b.add(t, 0.0, 0.0, 0.0), i)
+
+    def test_getFrames(self):
+        b = draw.BillboardSystem()
+        once = b.add(None, 0.0, 0.0, 0.0)
+        loop = b.add(None, 0.0, 0.0, 0.0)
+        b.animate(once, 4, 2)
+        b.animate(loop, 4, 2, loop=True)
+        frames = list()
+        for i in range(12):
+            frames.append(b.getFrames().tolist())
+            b.step()
+        self.assertEqual([f[once] for f in frames], [0, 0, 1, 1, 2, 2, 3, 3, 3, 3, 3, 3])
+        self.assertEqual([f[loop] for f in frames], [0, 0, 1, 1, 2, 2, 3, 3, 0, 0, 1, 1])
+
+    def test_isIdle(self):
+        b = draw.BillboardSystem()
+        self.assertTrue(b.isIdle())
+        i = b.add(None, 0.0, 0.0, 0.0)
+        self.assertTrue(b.isIdle())
+
+        b.animate(i, 2, 2)
+        for n in range(2):
+            self.assertFalse(b.isIdle())
+            b.step()
+        self.assertTrue(b.isIdle())
+
+        b.animate(i, 2, 2, loop=True)
+        for n in range(10):
+            b.step()
+        self.assertFalse(b.isIdle())
+        b.remove(i)
+        self.assertTrue(b.isIdle())
+
+    def test_update(self):
+        b = draw.BillboardSystem()
+        b.add(None, 4.5, 0.0, 4.5)
+        b.update((4.5, 0.5, 1.5), 180.0)
+
+        # camera looks along +z, so right is -x
+        self.assertEqual(b.vertices.shape, (4, 3))
+        self.assertEqual(b.vertices.tolist(), [
+            [5.0, 0.0, 4.5], [4.0, 0.0, 4.5], [4.0, 1.0, 4.5], [5.0, 1.0, 4.5]])
+        # texcoords as built by Sprite2D.clip()
+        s = draw.Sprite2D()
+        self.assertEqual([tuple(t) for t in b.texcoords.tolist()], list(s.texcoords))
+
+        # rotated camera faces quads along x
+        b.update((4.5, 0.5, 1.5), 90.0)
+        for a, e in zip(b.vertices.tolist(), [[4.5, 0.0, 4.0], [4.5, 0.0, 5.0], [4.5, 1.0, 5.0], [4.5, 1.0, 4.0]]):
+            for x, y in zip(a, e):
+                self.assertAlmostEqual(x, y, places=5)
+
+    def test_update_from_state(self):
+        b = draw.BillboardSystem()
+        i = b.add(None, 4.5, 0.0, 4.5)
+        b.animate(i, 4, 1)
+        state = b.getState()
+
+        # later changes do not leak into the copied state
+        b.moveTo(i, 0.0, 0.0, 0.0)
+        b.step()
+        self.assertEqual(state.positions.tolist(), [[4.5, 0.0, 4.5]])
+        self.assertEqual(b.getFrames(state).tolist(), [0])
+        self.assertEqual(b.getFrames().tolist(), [1])
+        b.update((4.5, 0.5, 1.5), 180.0, state)
+        self.assertEqual(b.vertices[0].tolist(), [5.0, 0.0, 4.5])
+        self.assertEqual(b.texcoords[:, 0].tolist(), [0.0, 0.25, 0.25, 0.0])
+
+        # views follow the sprites
+        self.assertEqual(b.getState(copy=False).positions.tolist(), [[0.0, 0.0, 0.0]])
+
+    def test_update_animation_texcoords(self):
+        b = draw.BillboardSystem()
+        i = b.add(None, 0.0, 0.0, 0.0)
+        b.animate(i, 4, 1)
+        b.step()
+        b.update((0.0, 0.0, -5.0), 180.0)
+        u = b.texcoords[:, 0].tolist()
+        self.assertEqual(u, [0.25, 0.5, 0.5, 0.25])
+
+    def test_update_sorting(self):
+        b = draw.BillboardSystem()
+        t1 = draw.Texture()
+        t2 = draw.Texture()
+        far  = b.add(t1, 0.0, 0.0, 9.0)
+        near = b.add(t1, 0.0, 0.0, 3.0)
+        mid  = b.add(t2, 0.0, 0.0, 5.0)
+        b.update((0.0, 0.0, 0.0), 180.0)
+
+        # grouped by texture, front to back within
+        self.assertEqual(b.batches, [(t1, 0, 8), (t2, 8, 4)])
+        self.assertEqual(b.vertices[0::4, 2].tolist(), [3.0, 9.0, 5.0])
+        self.assertEqual(b.vertices[0::4, 2].tolist(), [b.positions[i, 2] for i in (near, far, mid)])
+
+    def test_render(self):
+        t = draw.Texture()
+        img = Image.new(mode='RGB', size=(64, 16))
+        with tempfile.NamedTemporaryFile('wb') as h:
+            img.save(h.name, 'PNG')
+            t.loadFromFile(h.name)
+
+        b = draw.BillboardSystem()
+        for i in range(10):
+            b.animate(b.add(t, i, 0.0, 5.0), 4, 8, loop=True)
+        b.update((0.0, 0.0, 0.0), 180.0)
+
+        # rendering does not crash
+        self.perspective()
+        b.render()
+
+
+
+# ---------------------------------------------------------------------
+
+class RenderTargetTest(OpenGLTest):
+
+    def test_create_bind(self):
+        import OpenGL.GL as gl
+
+        target = draw.RenderTarget()
+        self.assertTrue(target.create(64, 32))
+        self.assertEqual((target.texture.w, target.texture.h), (64, 32))
+
+        target.bind()
+        gl.glClearColor(1.0, 0.0, 0.0, 1.0)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        pixel = gl.glReadPixels(10, 10, 1, 1, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        self.assertEqual(bytes(pixel), b'\xff\x00\x00\xff')
+        draw.RenderTarget.release(640, 480)
+        gl.glClearColor(0.0, 0.0, 0.0, 0.0)
+
+        target.destroy()
+        self.assertIsNone(target.fbo)
+
+    def test_depth(self):
+        target = draw.RenderTarget()
+        self.assertTrue(target.create(64, 32, depth=True))
+        self.assertIsNotNone(target.depth)
+        target.destroy()
+        self.assertIsNone(target.depth)
+
+
+# ---------------------------------------------------------------------
+
+class HudLayerTest(OpenGLTest):
+
+    def test_render_only_on_change(self):
+        import OpenGL.GL as gl
+
+        self.ortho()
+        heart = draw.Sprite2D(32, 32)
+        heart.moveTo(100, 100)
+        layer = draw.HudLayer()
+        layer.add(heart)
+
+        layer.render(640, 480)
+        self.assertEqual(layer.redraws, 1)
+        self.assertEqual(layer.screen.texture, layer.target.texture)
+        layer.render(640, 480)
+        self.assertEqual(layer.redraws, 1)
+
+        # changed sprites are noticed
+        heart.moveBy(5, 0)
+        layer.render(640, 480)
+        self.assertEqual(layer.redraws, 2)
+        heart.colorize((1.0, 0.0, 0.0))
+        layer.render(640, 480)
+        self.assertEqual(layer.redraws, 3)
+
+        layer.invalidate()
+        layer.render(640, 480)
+        self.assertEqual(layer.redraws, 4)
+
+        # resized screen
+        layer.render(320, 240)
+        self.assertEqual(layer.redraws, 5)
+        self.assertEqual((layer.screen.w, layer.screen.h), (320.0, 240.0))
+
+        # the composed sprite shows up on screen
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        draw.RenderTarget.release(640, 480)
+        layer.render(640, 480)
+        pixel = gl.glReadPixels(110, 480 - 110, 1, 1, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        self.assertEqual(bytes(pixel)[:3], b'\xff\x00\x00')
+
+
+# ---------------------------------------------------------------------
+
+class ResolutionScalerTest(unittest.TestCase):
+
+    def test_lowers_when_slow(self):
+        scaler = draw.ResolutionScaler(target=0.010, step=0.25, cooldown=2)
+        self.assertTrue(scaler.update(0.040))
+        self.assertEqual(scaler.scale, 0.75)
+        self.assertEqual(scaler.getSize(640, 480), (480, 360))
+
+        # waits for the average to settle
+        self.assertFalse(scaler.update(0.040))
+        self.assertFalse(scaler.update(0.040))
+        self.assertTrue(scaler.update(0.040))
+        self.assertEqual(scaler.scale, 0.5)
+        for i in range(10):
+            scaler.update(0.040)
+        self.assertEqual(scaler.scale, 0.25)
+
+    def test_raises_with_headroom(self):
+        scaler = draw.ResolutionScaler(target=0.010, step=0.25, cooldown=0)
+        scaler.scale = 0.5
+        # twice the area would not fit
+        self.assertFalse(scaler.update(0.0045))
+        self.assertEqual(scaler.scale, 0.5)
+
+        scaler = draw.ResolutionScaler(target=0.010, step=0.25, cooldown=0)
+        scaler.scale = 0.5
+        self.assertTrue(scaler.update(0.002))
+        self.assertEqual(scaler.scale, 0.75)
+        for i in range(10):
+            scaler.update(0.002)
+        self.assertEqual(scaler.scale, 1.0)
+        self.assertEqual(scaler.getSize(640, 480), (640, 480))
+
+
+class ScaledSceneTest(OpenGLTest):
+
+    def test_upscale(self):
+        import OpenGL.GL as gl
+
+        scaler = draw.ResolutionScaler(target=10.0)
+        scaler.scale = 0.25
+        scaled = draw.ScaledScene(scaler)
+        scaled.begin(640, 480)
+        self.assertEqual((scaled.target.texture.w, scaled.target.texture.h), (160, 120))
+        self.assertIsNotNone(scaled.target.depth)
+
+        # one low-res pixel covers 4x4 on screen
+        gl.glEnable(gl.GL_SCISSOR_TEST)
+        gl.glScissor(10, 10, 1, 1)
+        gl.glClearColor(1.0, 0.0, 0.0, 1.0)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        gl.glDisable(gl.GL_SCISSOR_TEST)
+        gl.glClearColor(0.0, 0.0, 0.0, 0.0)
+        scaled.end(640, 480)
+
+        self.ortho()
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        scaled.render(640, 480)
+        pixels = gl.glReadPixels(40, 40, 4, 4, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        self.assertEqual(bytes(pixels), b'\xff\x00\x00\xff' * 16)
+        pixel = gl.glReadPixels(44, 40, 1, 1, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        self.assertEqual(bytes(pixel)[:3], b'\x00\x00\x00')
+
+    def test_timer_queries(self):
+        import OpenGL.GL as gl
+
+        if not draw.ScaledScene.isTimerSupported():
+            self.skipTest('no timer queries')
+        scaler = draw.ResolutionScaler(target=10.0)
+        scaled = draw.ScaledScene(scaler, count=2)
+        with mock.patch.object(scaler, 'update', wraps=scaler.update) as update:
+            for i in range(3):
+                scaled.begin(640, 480)
+                scaled.end(640, 480)
+                # results are picked up later, never more than `count` in flight
+                self.assertLessEqual(len(scaled.pending), 2)
+            gl.glFinish()
+            scaled.begin(640, 480)
+            scaled.end(640, 480)
+        self.assertGreater(update.call_count, 0)
+        self.assertLess(scaler.average, 1.0)
+
+    def test_timing_without_queries(self):
+        scaler = draw.ResolutionScaler(target=10.0)
+        scaled = draw.ScaledScene(scaler, interval=3)
+        with mock.patch.object(draw.ScaledScene, 'isTimerSupported', staticmethod(lambda: False)), \
+                mock.patch.object(scaler, 'update', wraps=scaler.update) as update:
+            for i in range(7):
+                scaled.begin(640, 480)
+                scaled.end(640, 480)
+        # frames 0, 3 and 6 are finished and timed
+        self.assertEqual(update.call_count, 3)
+        self.assertEqual(len(scaled.queries), 0)
+
+
+# ---------------------------------------------------------------------
+
+class AnimationTest(OpenGLTest):
+
+    def test_texcoords_match_clip(self):
+        anim = draw.Animation(None, 4, 8, rect=(0.0, 0.5, 1.0, 0.5))
+        self.assertEqual(anim.texcoords.shape, (4, 4, 2))
+        sprite = draw.Sprite2D()
+        for frame in range(4):
+            sprite.clip(0.25 * frame, 0.5, 0.25, 0.5)
+            self.assertEqual(anim.frames[frame], sprite.texcoords)
+            self.assertEqual(anim.rects[frame], sprite.texrect)
+
+        other = draw.Sprite2D()
+        other.showFrame(anim, 2)
+        self.assertEqual(other.texcoords, anim.frames[2])
+        self.assertEqual(other.texrect, (0.5, 0.5, 0.25, 0.5))
+
+    def test_getFrame(self):
+        once = draw.Animation(None, 4, 8)
+        self.assertEqual(once.getDuration(), 32)
+        self.assertEqual([int(once.getFrame(t)) for t in [-1, 0, 7, 8, 31, 32, 100]], [0, 0, 0, 1, 3, 3, 3])
+        self.assertFalse(once.isFinished(31))
+        self.assertTrue(once.isFinished(32))
+
+        loop = draw.Animation(None, 4, 8, loop=True)
+        self.assertEqual(loop.getFrame(numpy.array([0, 8, 32, 40])).tolist(), [0, 1, 0, 1])
+        self.assertFalse(loop.isFinished(1000))
+
+    def test_billboards_play(self):
+        clock = draw.AnimationClock()
+        tex = draw.Texture()
+        walk = draw.Animation(tex, 4, 2, loop=True, rect=(0.0, 0.0, 1.0, 0.5))
+        bs = draw.BillboardSystem(clock=clock)
+        a = bs.add(tex, 0.0, 0.0, 1.0)
+        b = bs.add(tex, 1.0, 0.0, 1.0)
+        bs.play(a, walk)
+        bs.clip(b, 0.0, 0.0, 1.0, 0.5)
+        bs.animate(b, 4, 2, loop=True)
+        self.assertEqual(len(bs.animations), 1)
+        bs.play(b, walk)
+        self.assertEqual(len(bs.animations), 1)
+
+        # the shared clock drives the system
+        for i in range(3):
+            clock.step()
+        self.assertEqual(bs.tick, 3)
+        bs.update((0.0, 0.0, 0.0), 180.0)
+        self.assertEqual(bs.texcoords[0:4].tolist(), walk.texcoords[1].tolist())
+        self.assertEqual(bs.texcoords[4:8].tolist(), walk.texcoords[1].tolist())
+
+        # clip() goes back to the sprite's own rect
+        bs.clip(a, 0.0, 0.0, 1.0, 1.0)
+        bs.update((0.0, 0.0, 0.0), 180.0)
+        self.assertEqual(bs.texcoords[0:4, 1].tolist(), [1.0, 1.0, 0.0, 0.0])
@@ -1,9 +1,12 @@
 #!/usr/bin/python3 
 # -*- coding: utf-8 -*- 
 
-import unittest, tempfile
+import unittest, tempfile, os
+from unittest import mock
 
-import dungeon
+import numpy
+
+import dungeon, tiles
 
 
 
@@ -155,6 +158,127 @@ class VertexBuilderTest(unittest.TestCase):
         self.assertEqual(vb.data[19], ((1, 2,  0), ('E', 3.0, 2.0), (None, None, None, None)))
 
 
+    def test_toArrays(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('3x3\n# #\n .#\n#.#')
+        vb = dungeon.VertexBuilder()
+        vb.loadFromDungeon(d)
+
+        vertices, texcoords, colors = vb.toArrays()
+        self.assertEqual(vertices.shape, (4 * len(vb.data), 3))
+        self.assertEqual(texcoords.shape, (4 * len(vb.data), 2))
+        self.assertEqual(colors.shape, (4 * len(vb.data), 3))
+        self.assertEqual(vertices.dtype.name, 'float32')
+        v, t, c = vb.data[1]
+        self.assertEqual(vertices[4:8].tolist(), [list(p) for p in v])
+        self.assertEqual(texcoords[4:8].tolist(), [list(p) for p in t])
+        self.assertEqual(colors[4:8].tolist(), [list(p) for p in c])
+
+        # empty mesh
+        self.assertEqual(dungeon.VertexBuilder().toArrays()[0].shape, (0, 3))
+
+    def assertSameQuads(self, arrays, expected):
+        # equal up to the order of quads
+        def quads(arrays):
+            rows = numpy.concatenate(arrays, axis=1).reshape(-1, 4 * 8)
+            return sorted(map(tuple, numpy.round(rows, 5).tolist()))
+        self.assertEqual(quads(arrays), quads(expected))
+
+    def test_patch(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        lighting = dungeon.Lighting()
+        lighting.addLight(2, 2)
+        vb = dungeon.VertexBuilder()
+        vb.loadFromDungeon(d, lighting)
+        arrays = vb.toArrays()
+
+        # close a cell, open another and punch a pit
+        changes = [((2, 2), '#'), ((4, 3), '.'), ((6, 6), ' ')]
+        for (x, y), symbol in changes:
+            d[(x, y)] = dungeon.Cell(x, y, symbol)
+        arrays = vb.patch(d, [pos for pos, symbol in changes], arrays, lighting)
+        self.assertEqual(vb.starts[-1], len(vb.data))
+        self.assertEqual(len(arrays[0]), 4 * len(vb.data))
+        self.assertEqual(len(vb.getQuads(2, 2)), 0)
+
+        expected = dungeon.VertexBuilder()
+        expected.loadFromDungeon(d, lighting)
+        self.assertSameQuads(arrays, expected.toArrays())
+        self.assertSameQuads(arrays, vb.toArrays())
+        # patched quads stay in the order of a full build
+        for patched, built in zip(arrays, expected.toArrays()):
+            numpy.testing.assert_allclose(patched, built, atol=1e-6)
+        numpy.testing.assert_array_equal(vb.starts, expected.starts)
+
+    def test_patch_only_builds_affected_cells(self):
+        # timings: see benchmark.py
+        d = dungeon.Dungeon()
+        d.loadFromMemory('200x200\n' + '\n'.join(('#.' * 100) if y % 2 else ('.' * 200) for y in range(200)))
+        vb = dungeon.VertexBuilder()
+        vb.loadFromDungeon(d)
+        arrays = vb.toArrays()
+
+        d[(100, 100)] = dungeon.Cell(100, 100, '#')
+        with mock.patch.object(vb, 'buildCell', wraps=vb.buildCell) as build:
+            arrays = vb.patch(d, [(100, 100)], arrays)
+        self.assertEqual(build.call_count, 9)
+        self.assertEqual(len(arrays[0]), 4 * len(vb.data))
+
+    def test_lighting(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('4x3\n####\n#..#\n####')
+        vb = dungeon.VertexBuilder()
+        vb.loadFromDungeon(d)
+        white = vb.toArrays()[2]
+        self.assertTrue((white == 1.0).all())
+        self.assertEqual(vb.getQuads(1, 1), range(0, 4))
+        self.assertEqual(vb.starts[-1], len(vb.data))
+
+        # ambient occlusion: floor corners next to more walls are darker
+        lighting = dungeon.Lighting(ambient=0.8, occlusion=0.1)
+        vb.loadFromDungeon(d, lighting)
+        v, t, c = vb.data[0]
+        self.assertEqual(v[0], (3.0, 0.0, 3.0))
+        self.assertAlmostEqual(c[0][0], 0.8 * 0.7, places=5)
+        # upper wall edges are not occluded
+        v, t, c = vb.data[1]
+        self.assertEqual(v[0][1], 2.0)
+        self.assertAlmostEqual(c[0][0], 0.8, places=5)
+
+        # a light brightens nearby vertices, relight only touches nearby quads
+        arrays = vb.toArrays()
+        before = arrays[2].copy()
+        lighting.addLight(2, 1, radius=1.0, color=(0.5, 0.0, 0.0))
+        relit = vb.relight(d, lighting, 2, 1, 1.0, arrays)
+        self.assertIs(relit[0], arrays[0])
+        after = relit[2]
+        self.assertTrue(numpy.array_equal(after, vb.toArrays()[2]))
+        self.assertTrue((after[:, 0] >= before[:, 0]).all())
+        self.assertTrue((after[:, 0] > before[:, 0]).any())
+        self.assertTrue((after[:, 1:] == before[:, 1:]).all())
+        # the given arrays are not modified
+        self.assertTrue((arrays[2] == before).all())
+        far = vb.relight(d, lighting, 10, 10, 1.0, relit)
+        self.assertTrue(numpy.array_equal(far[2], after))
+
+        # the unlit colors are kept
+        lighting.removeLight(2, 1)
+        vb.bake(d, lighting)
+        self.assertTrue(numpy.allclose(vb.toArrays()[2], before))
+
+    def test_lights_from_level(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('5x3\n#####\n#*.*#\n#####')
+        lighting = dungeon.Lighting()
+        lighting.addLight(0, 0)
+        self.assertEqual(lighting.loadFromDungeon(d, radius=2.0), 2)
+        self.assertEqual(sorted(lighting.lights), [(1, 1), (3, 1)])
+        self.assertEqual(lighting.lights[(1, 1)][0], 2.0)
+        # torches stand on floor
+        self.assertTrue(d[(1, 1)].isFloor())
+
+
 # ---------------------------------------------------------------------
 
 class CellTest(unittest.TestCase):
@@ -204,6 +328,38 @@ class CellTest(unittest.TestCase):
         self.assertTrue(wall_cell.isSolid())
         self.assertTrue(floor_cell.isSolid())
 
+    def test_unknown_symbol(self):
+        cell = dungeon.Cell(0, 0, '?')
+        self.assertTrue(cell.isSolid())
+        self.assertFalse(cell.isWall())
+        self.assertFalse(cell.isFloor())
+        self.assertFalse(cell.isWalkable())
+
+    def test_registered_tile(self):
+        tiles.registry.register('=', 'grate', tiles.WALKABLE | tiles.SOLID, floor=(0.0, 0.25, 1.0, 0.25))
+        cell = dungeon.Cell(0, 0, '=')
+        self.assertTrue(cell.isFloor())
+        self.assertTrue(cell.isWalkable())
+        self.assertFalse(cell.isWall())
+
+        d = dungeon.Dungeon()
+        d.loadFromMemory('3x3\n###\n#=#\n###')
+        vb = dungeon.VertexBuilder()
+        vb.loadFromDungeon(d)
+        self.assertEqual(vb.data[0][1], ((0.0, 0.25), (1.0, 0.25), (1.0, 0.5), (0.0, 0.5)))
+        # walls keep their region
+        self.assertEqual(vb.data[1][1], ((0.0, 0.5), (1.0, 0.5), (1.0, 1.0), (0.0, 1.0)))
+
+    def test_reregistered_tile(self):
+        tiles.registry.register('~', 'water', tiles.SOLID)
+        d = dungeon.Dungeon()
+        d.loadFromMemory('2x1\n~.')
+        # existing cells would disagree with the grid
+        with self.assertRaises(ValueError):
+            tiles.registry.register('~', 'shallow water', tiles.WALKABLE | tiles.SOLID)
+        self.assertFalse(d[(0, 0)].isWalkable())
+        self.assertEqual(d.getMask(tiles.WALKABLE).tolist(), [[False, True]])
+
     def test_getNeighbor(self):
         # load test dungeon
         raw = '''3x3
@@ -302,7 +458,30 @@ class DungeonTest(unittest.TestCase):
         # save to string
         out = d.saveToMemory()
         self.assertEqual(raw, out)
+
+    def test_parseSymbols(self):
+        symbols = dungeon.parseSymbols('3x2\n#.\n.#.\n')
+        self.assertEqual(symbols.tolist(), [['#', '.', ' '], ['.', '#', '.']])
+        with self.assertRaises(KeyError):
+            dungeon.parseSymbols('2x1\n...')
+        with self.assertRaises(KeyError):
+            dungeon.parseSymbols('2x1\n..\n..')
         
+    def test_loadFromArray(self):
+        src = dungeon.Dungeon()
+        src.loadFromMemory('5x3\n#####\n #..#\n#####')
+
+        d = dungeon.Dungeon()
+        self.assertTrue(d.loadFromArray(src[1:4, 0:3].toArray()))
+        self.assertEqual(d.size, (3, 3))
+        self.assertEqual(d.saveToMemory(), '3x3\n###\n#..\n###')
+        self.assertEqual(d[(2, 1)].pos, (2, 1))
+
+        # owns its symbols
+        d[(0, 0)] = dungeon.Cell.Floor(x=0, y=0)
+        self.assertEqual(src[(1, 0)].symbol, '#')
+        self.assertEqual(src.symbols[0, 1], '#')
+
     def test_loadFromFile_saveToFile(self):
         raw = '5x3\n#####\n #..#\n#####'
         d = dungeon.Dungeon()
@@ -325,3 +504,243 @@ class DungeonTest(unittest.TestCase):
             # read file
             content = tmp.read()
             self.assertEqual(content, raw)
+
+    def test_listeners(self):
+        d = dungeon.Dungeon()
+        d.resize(3, 4)
+        changes = list()
+        d.listeners.append(lambda pos, cell: changes.append((pos, cell.symbol)))
+
+        d[(2, 3)] = dungeon.Cell.Floor(x=2, y=3)
+        self.assertEqual(changes, [((2, 3), '.')])
+
+        # invalid positions are not reported
+        with self.assertRaises(KeyError):
+            d[(3, 3)] = dungeon.Cell.Floor(x=3, y=3)
+        self.assertEqual(len(changes), 1)
+
+
+    def test_symbols(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('3x2\n#.#\n  .')
+        self.assertEqual(d.symbols.shape, (2, 3))
+        self.assertEqual(d.symbols.tolist(), [['#', '.', '#'], [' ', ' ', '.']])
+
+        d[(0, 1)] = dungeon.Cell.Wall(x=0, y=1)
+        self.assertEqual(d.symbols[1, 0], '#')
+
+        d.resize(4, 1)
+        self.assertEqual(d.symbols.tolist(), [[' ', ' ', ' ', ' ']])
+
+    def test_tiles(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('3x2\n#.#\n  .')
+        wall, floor = tiles.registry.getId('#'), tiles.registry.getId('.')
+        self.assertEqual(d.tiles.dtype, numpy.uint8)
+        self.assertEqual(d.tiles[0].tolist(), [wall, floor, wall])
+        self.assertEqual(d.getMask(tiles.OPAQUE).tolist(), [[True, False, True], [False, False, False]])
+
+        d[(1, 1)] = dungeon.Cell.Wall(x=1, y=1)
+        self.assertEqual(d.tiles[1, 1], wall)
+
+        other = dungeon.Dungeon()
+        other.loadFromArray(d.symbols)
+        self.assertTrue((other.tiles == d.tiles).all())
+
+    def test_view(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('4x3\n####\n#..#\n#. #')
+
+        v = d[1:3, 1:3]
+        self.assertIsInstance(v, dungeon.DungeonView)
+        self.assertEqual(v.offset, (1, 1))
+        self.assertEqual(v.size, (2, 2))
+        self.assertEqual(len(v), 4)
+
+        # relative access, walls outside the view
+        self.assertTrue(v[(0, 0)].isFloor())
+        self.assertEqual(v[(1, 1)].pos, (2, 2))
+        self.assertTrue(v[(2, 0)].isWall())
+
+        # bulk access
+        self.assertEqual([[c.symbol for c in row] for row in v.rows()], [['.', '.'], ['.', ' ']])
+        self.assertIs(next(next(v.rows())), d[(1, 1)])
+        self.assertEqual([c.pos for c in v], [(1, 1), (2, 1), (1, 2), (2, 2)])
+
+        # export shares memory with the dungeon
+        a = v.toArray()
+        self.assertEqual(a.tolist(), [['.', '.'], ['.', ' ']])
+        d[(2, 2)] = dungeon.Cell.Floor(x=2, y=2)
+        self.assertEqual(a[1, 1], '.')
+
+    def test_view_clipping(self):
+        d = dungeon.Dungeon()
+        d.resize(4, 3)
+
+        self.assertEqual(d[2:10, :].size, (2, 3))
+        self.assertEqual(d[-1:, 0].size, (1, 1))
+        self.assertEqual(d[3:1, 0:1].size, (0, 1))
+        self.assertEqual(len(list(d[3:1, 0:1])), 0)
+        with self.assertRaises(ValueError):
+            d[::2, :]
+
+
+# ---------------------------------------------------------------------
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname  = os.path.join(self.tmpdir.name, 'level.txt')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_save_load(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('5x3\n#####\n #..#\n#####')
+        j = dungeon.Journal(self.fname)
+        j.attach(d)
+
+        # first save writes a snapshot
+        self.assertEqual(j.save(d), 0)
+        self.assertTrue(os.path.exists(self.fname))
+
+        # later saves only append the edits
+        d[(1, 1)] = dungeon.Cell.Floor(x=1, y=1)
+        d[(2, 1)] = dungeon.Cell.Wall(x=2, y=1)
+        d[(2, 1)] = dungeon.Cell.Void(x=2, y=1)
+        self.assertEqual(j.save(d), 2)
+        self.assertEqual(os.path.getsize(j.logname), 2 * j.record.size)
+        self.assertEqual(j.save(d), 0)
+
+        # snapshot is untouched, but loading replays the log
+        with open(self.fname) as h:
+            self.assertEqual(h.read(), '5x3\n#####\n #..#\n#####')
+        e = dungeon.Dungeon()
+        self.assertTrue(dungeon.Journal(self.fname).load(e))
+        self.assertEqual(e.saveToMemory(), '5x3\n#####\n . .#\n#####')
+        self.assertEqual(e[(2, 1)].pos, (2, 1))
+
+    def test_compact(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('3x1\n...')
+        j = dungeon.Journal(self.fname, compact_after=2)
+        j.attach(d)
+        j.save(d)
+
+        d[(0, 0)] = dungeon.Cell.Wall(x=0, y=0)
+        j.save(d)
+        self.assertEqual(j.logged, 1)
+        d[(2, 0)] = dungeon.Cell.Wall(x=2, y=0)
+        j.save(d)
+
+        # log was folded into the snapshot
+        self.assertEqual(j.logged, 0)
+        self.assertEqual(os.path.getsize(j.logname), 0)
+        with open(self.fname) as h:
+            self.assertEqual(h.read(), '3x1\n#.#')
+
+    def test_compact_with_pending_edits(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('3x1\n...')
+        j = dungeon.Journal(self.fname)
+        j.attach(d)
+        j.save(d)
+        d[(0, 0)] = dungeon.Cell.Wall(x=0, y=0)
+        j.save(d)
+        d[(0, 0)] = dungeon.Cell.Floor(x=0, y=0)
+
+        # crash after the snapshot was replaced, before the log is truncated
+        replace = os.replace
+        def crash(src, dst):
+            replace(src, dst)
+            raise RuntimeError('crash')
+        with mock.patch('os.replace', crash):
+            with self.assertRaises(RuntimeError):
+                j.compact(d)
+        e = dungeon.Dungeon()
+        self.assertTrue(dungeon.Journal(self.fname).load(e))
+        self.assertEqual(e.saveToMemory(), '3x1\n...')
+
+    def test_load_ignores_truncated_record(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('3x1\n...')
+        j = dungeon.Journal(self.fname)
+        j.attach(d)
+        j.save(d)
+        d[(1, 0)] = dungeon.Cell.Wall(x=1, y=0)
+        j.save(d)
+        with open(j.logname, 'ab') as h:
+            h.write(b'\x01\x00')
+
+        e = dungeon.Dungeon()
+        k = dungeon.Journal(self.fname)
+        k.attach(e)
+        self.assertTrue(k.load(e))
+        self.assertEqual(e.saveToMemory(), '3x1\n.#.')
+        # replayed edits are not recorded again
+        self.assertEqual(k.pending, dict())
+
+        # the torn record is gone, so new edits can be replayed
+        self.assertEqual(os.path.getsize(j.logname), j.record.size)
+        e[(2, 0)] = dungeon.Cell.Wall(x=2, y=0)
+        k.save(e)
+        f = dungeon.Dungeon()
+        self.assertTrue(dungeon.Journal(self.fname).load(f))
+        self.assertEqual(f.saveToMemory(), '3x1\n.##')
+
+
+
+# ---------------------------------------------------------------------
+
+class LevelWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname  = os.path.join(self.tmpdir.name, 'level.txt')
+        self.write('3x2\n...\n#.#')
+        self.dungeon = dungeon.Dungeon()
+        self.dungeon.loadFromFile(self.fname)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, raw):
+        with open(self.fname, 'w') as h:
+            h.write(raw)
+
+    def touch(self, watcher):
+        # make the change visible regardless of the timestamp resolution
+        watcher.mtime = None
+        watcher.next_check = 0.0
+
+    def test_poll(self):
+        edits = list()
+        self.dungeon.listeners.append(lambda pos, cell: edits.append((pos, cell.symbol)))
+        watcher = dungeon.LevelWatcher(self.fname, self.dungeon, interval=0.0)
+        self.assertIsNone(watcher.poll())
+
+        self.write('3x2\n.#.\n#. ')
+        self.touch(watcher)
+        self.assertEqual(sorted(watcher.poll()), [(1, 0), (2, 1)])
+        self.assertEqual(sorted(edits), [((1, 0), '#'), ((2, 1), ' ')])
+        self.assertEqual(self.dungeon.saveToMemory(), '3x2\n.#.\n#. ')
+        self.assertIsNone(watcher.poll())
+
+        # broken files are skipped
+        self.write('3x2\n.#.\n#. \n###')
+        self.touch(watcher)
+        self.assertIsNone(watcher.poll())
+
+        # resizing reloads the whole level
+        self.write('2x1\n..')
+        self.touch(watcher)
+        self.assertTrue(watcher.poll() is True)
+        self.assertEqual(self.dungeon.size, (2, 1))
+
+    def test_interval(self):
+        watcher = dungeon.LevelWatcher(self.fname, self.dungeon, interval=60.0)
+        self.write('3x2\n###\n###')
+        watcher.mtime = None
+        self.assertIsNone(watcher.poll())
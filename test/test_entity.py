@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections, unittest
+
+import numpy
+
+import draw, dungeon, entity, main
+
+
+class EntityStoreTest(unittest.TestCase):
+
+    def test_spawn(self):
+        s = entity.EntityStore(capacity=2)
+        a = s.spawn(position=(1.0, 0.0, 2.0), health=5)
+        b = s.spawn()
+        c = s.spawn(ai=entity.CHASE, sprite=7)
+        self.assertEqual((a, b, c), (0, 1, 2))
+        self.assertEqual(len(s), 3)
+        self.assertGreaterEqual(len(s.ids), 3) # grown
+
+        self.assertEqual(s['position'].shape, (3, 3))
+        self.assertEqual(s.get(a, 'position').tolist(), [1.0, 0.0, 2.0])
+        self.assertEqual(s['health'].tolist(), [5, 0, 0])
+        self.assertEqual(s['ai'].tolist(), [entity.IDLE, entity.IDLE, entity.CHASE])
+        self.assertEqual(s['sprite'].tolist(), [-1, -1, 7])
+
+        with self.assertRaises(KeyError):
+            s.spawn(mana=3)
+
+    def test_kill(self):
+        s = entity.EntityStore()
+        ids = [s.spawn(health=i) for i in range(4)]
+        s.kill(ids[1])
+
+        # last row moved into the gap, ids stay valid
+        self.assertEqual(len(s), 3)
+        self.assertNotIn(ids[1], s)
+        self.assertEqual(s.getIds().tolist(), [0, 3, 2])
+        for i in [0, 2, 3]:
+            self.assertIn(ids[i], s)
+            self.assertEqual(s.get(ids[i], 'health'), i)
+        self.assertEqual(s.getRows(ids).tolist(), [0, -1, 2, 1])
+
+        # ids are not reused
+        self.assertEqual(s.spawn(), 4)
+        with self.assertRaises(KeyError):
+            s.kill(ids[1])
+
+        # kill the last row
+        s.kill(4)
+        self.assertEqual(s.getIds().tolist(), [0, 3, 2])
+
+    def test_dead_ids(self):
+        s = entity.EntityStore()
+        a = s.spawn(health=1)
+        b = s.spawn(health=2)
+        s.kill(a)
+        for eid in [a, 5, -1]:
+            with self.assertRaises(KeyError):
+                s.get(eid, 'health')
+            with self.assertRaises(KeyError):
+                s.set(eid, 'health', 7)
+        # the last row is untouched
+        self.assertEqual(s.get(b, 'health'), 2)
+
+    def test_killWhere(self):
+        s = entity.EntityStore()
+        for i in range(6):
+            s.spawn(health=i % 3)
+
+        # vectorized update of all entities, then remove dead ones
+        health = s['health']
+        health -= 1
+        self.assertEqual(s.killWhere(s['health'] <= 0), 4)
+        self.assertEqual(s.getIds().tolist(), [2, 5])
+        self.assertEqual(s['health'].tolist(), [1, 1])
+        self.assertEqual(s.getRows([0, 2, 5]).tolist(), [-1, 0, 1])
+        self.assertEqual(s.killWhere(s['health'] <= 0), 0)
+
+    def test_addColumn(self):
+        s = entity.EntityStore()
+        s.spawn()
+        s.addColumn('mana', numpy.float32, fill=2.5)
+        eid = s.spawn(mana=1.0)
+        self.assertEqual(s['mana'].tolist(), [2.5, 1.0])
+        s.set(eid, 'mana', 4.0)
+        self.assertEqual(s.get(eid, 'mana'), 4.0)
+
+    def test_syncBillboards(self):
+        b = draw.BillboardSystem()
+        sprite = b.add(None, 0.0, 0.0, 0.0)
+        s = entity.EntityStore()
+        eid = s.spawn(position=(1.0, 2.0, 3.0), sprite=sprite)
+        s.spawn(position=(5.0, 5.0, 5.0)) # no sprite
+
+        entity.syncBillboards(s, b)
+        self.assertEqual(b.positions[sprite].tolist(), [1.0, 2.0, 3.0])
+        s['position'][:, 0] += 1.0
+        entity.syncBillboards(s, b)
+        self.assertEqual(b.positions[sprite].tolist(), [2.0, 2.0, 3.0])
+        self.assertEqual(b.positions[sprite].tolist(), s.get(eid, 'position').tolist())
+
+
+# ---------------------------------------------------------------------
+
+class GameTest(unittest.TestCase):
+
+    def test_attack_kills(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        game = main.Game(d, collections.defaultdict(draw.Texture))
+        game.cam.moveTo(1.1, 0.175, 1.1)
+        game.cam.setAngle(135.0)
+        target = game.getTarget()
+        sprite = game.entities.get(target, 'sprite')
+        for i in range(3):
+            self.assertEqual(game.getTarget(), target)
+            game.attack()
+        self.assertNotIn(target, game.entities)
+        self.assertFalse(game.billboards.active[sprite])
+        # the goblin behind it is hit now
+        self.assertEqual(game.getTarget(), 0)
+
+    def test_edited_torch_relights(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        game = main.Game(d, collections.defaultdict(draw.Texture))
+        for pos, symbol in [((3, 2), '*'), ((1, 2), '.')]:
+            d[pos] = dungeon.Cell(pos[0], pos[1], symbol)
+            game.onLevelEdited([pos])
+        self.assertEqual(set(game.lighting.lights), {(3, 2), (5, 6)})
+
+        # same colors as when built from scratch
+        other = main.Game(d, collections.defaultdict(draw.Texture))
+        for patched, built in zip(game.terrain, other.terrain):
+            self.assertTrue(numpy.allclose(patched, built))
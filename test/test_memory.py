@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest, tempfile, os, json, collections, sys, tracemalloc
+
+import numpy
+
+import capture, draw, dungeon, main, memory, text
+from test.utils import OpenGLTest
+
+
+class DeepSizeOfTest(unittest.TestCase):
+
+    def test_containers(self):
+        data = [1000, 'abc', (2000, 3000)]
+        size, count = memory.deepSizeOf([data])
+        self.assertEqual(count, 6)
+        expected = sum(sys.getsizeof(o) for o in [data, 1000, 'abc', data[2], 2000, 3000])
+        self.assertEqual(size, expected)
+
+    def test_shared_objects_are_counted_once(self):
+        shared = list(range(1000, 1100))
+        seen = set()
+        first = memory.deepSizeOf([{'a': shared}], seen)
+        second = memory.deepSizeOf([[shared]], seen)
+        self.assertGreater(first[0], sys.getsizeof(shared))
+        self.assertEqual(second[1], 1)
+
+    def test_numpy(self):
+        array = numpy.zeros(1000, dtype=numpy.float64)
+        size, count = memory.deepSizeOf([array])
+        self.assertGreaterEqual(size, 8000)
+        # views add no data
+        size, count = memory.deepSizeOf([array, array[10:20]])
+        self.assertLess(size, 8000 + 1000)
+
+    def test_instances(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('2x2\n..\n.#')
+        size, count = memory.deepSizeOf([d])
+        self.assertGreater(size, d.symbols.nbytes)
+        # cells and their symbols are reached
+        self.assertGreater(count, 4)
+
+    def test_textureBytes(self):
+        tex = draw.Texture()
+        self.assertEqual(memory.textureBytes(tex), 0)
+        tex.id, tex.w, tex.h = 1, 16, 8
+        self.assertEqual(memory.textureBytes(tex), 16 * 8 * 4)
+        self.assertEqual(memory.textureBytes(None), 0)
+
+
+# ---------------------------------------------------------------------
+
+class MemoryReportTest(unittest.TestCase):
+
+    def test_gameReport(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        game = main.Game(d, collections.defaultdict(draw.Texture))
+
+        tracemalloc.start()
+        try:
+            report = memory.gameReport(game)
+        finally:
+            tracemalloc.stop()
+        for name in ['dungeon', 'terrain', 'entities', 'textures', 'sprites']:
+            self.assertIn(name, report.sections)
+            self.assertGreater(report.sections[name]['bytes'], 0)
+        # vertex arrays are drawn from system memory
+        self.assertEqual(report.sections['terrain']['gpu_bytes'], 0)
+        self.assertEqual(report.sections['terrain']['array_bytes'], sum(a.nbytes for a in game.terrain))
+        self.assertGreater(report.sections['sprites']['array_bytes'], 0)
+        self.assertEqual(report.getTotal(), sum(s['bytes'] for s in report.sections.values()))
+        self.assertIsNotNone(report.heap)
+        self.assertIn('total', str(report))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'memory.json')
+            report.saveToFile(fname)
+            with open(fname) as h:
+                loaded = json.load(h)
+        self.assertEqual(loaded['total'], report.getTotal())
+        self.assertEqual(loaded['sections']['dungeon'], report.sections['dungeon'])
+
+
+class RendererReportTest(OpenGLTest):
+
+    def test_gameReport(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        game = main.Game(d, collections.defaultdict(draw.Texture))
+        renderer = main.Renderer(640, 480, draw.ScaledScene(draw.ResolutionScaler(1.0)))
+        renderer.scaled.begin(640, 480)
+        renderer.scaled.end(640, 480)
+        renderer.overlay = text.TextBatch(text.GlyphAtlas())
+        renderer.overlay.add('60 fps', 8, 8)
+        renderer.overlay.build()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            renderer.video = capture.Recorder(os.path.join(tmpdir, 'video.raw'), 640, 480, latency=2)
+            try:
+                report = memory.gameReport(game, renderer)
+            finally:
+                renderer.video.close()
+
+        # color texture and depth buffer
+        w, h = renderer.scaled.target.texture.w, renderer.scaled.target.texture.h
+        self.assertEqual(report.sections['render target']['gpu_bytes'], 2 * w * h * 4)
+        atlas = renderer.overlay.atlas.texture
+        self.assertEqual(report.sections['text']['gpu_bytes'], atlas.w * atlas.h * 4)
+        self.assertGreater(report.sections['text']['array_bytes'], 0)
+        if capture.FrameReader.isSupported():
+            self.assertEqual(report.sections['capture']['gpu_bytes'], 2 * 640 * 480 * 4)
+
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections, unittest
+
+import numpy
+
+import draw, dungeon, main, particles
+from test.utils import OpenGLTest
+
+
+# no randomness in speed and lifetime, no forces
+STILL = particles.ParticleType((1.0, 1.0), (1.0, 1.0), 0.0, 0.0, 0.0, None, (1.0, 0.5),
+    ((1.0, 0.0, 0.0), (0.0, 0.0, 1.0)), None)
+
+
+class ParticleEmitterTest(unittest.TestCase):
+
+    def test_emit_and_step(self):
+        emitter = particles.ParticleEmitter(STILL, capacity=8)
+        self.assertEqual(emitter.emit(3, (1.0, 2.0, 3.0), (2.0, 0.0, 0.0)), 3)
+        self.assertEqual(emitter.count, 3)
+        self.assertTrue(numpy.allclose(emitter.velocities[:3], (1.0, 0.0, 0.0)))
+
+        emitter.step(0.5)
+        self.assertTrue(numpy.allclose(emitter.positions[:3], (1.5, 2.0, 3.0)))
+        self.assertTrue(numpy.allclose(emitter.ages[:3], 0.5))
+
+        emitter.build((1.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+        self.assertEqual(emitter.vertices.shape, (12, 3))
+        self.assertEqual(emitter.colors.shape, (12, 3))
+        # halfway between birth and death
+        self.assertTrue(numpy.allclose(emitter.colors[0], (0.5, 0.0, 0.5)))
+        self.assertTrue(numpy.allclose(emitter.vertices[0], (1.5 - 0.375, 2.0 - 0.375, 3.0)))
+
+    def test_expired_are_packed(self):
+        emitter = particles.ParticleEmitter(STILL, capacity=8)
+        emitter.emit(2, (0.0, 0.0, 0.0))
+        emitter.step(0.5)
+        emitter.emit(1, (5.0, 0.0, 0.0))
+        emitter.step(0.6)
+        self.assertEqual(emitter.count, 1)
+        self.assertTrue(numpy.allclose(emitter.ages[0], 0.6))
+        self.assertTrue(numpy.allclose(emitter.positions[0], (5.0, 0.6, 0.0)))
+
+    def test_capacity(self):
+        emitter = particles.ParticleEmitter(STILL, capacity=4)
+        self.assertEqual(emitter.emit(3, (0.0, 0.0, 0.0)), 3)
+        self.assertEqual(emitter.emit(3, (0.0, 0.0, 0.0)), 1)
+        self.assertEqual(emitter.count, 4)
+        self.assertEqual(emitter.dropped, 2)
+
+    def test_bounce(self):
+        kind = STILL._replace(gravity=-10.0, bounce=0.5)
+        emitter = particles.ParticleEmitter(kind, capacity=1)
+        emitter.emit(1, (0.0, 0.01, 0.0), (0.0, -1.0, 0.0))
+        emitter.step(0.1)
+        self.assertEqual(emitter.positions[0, 1], 0.0)
+        self.assertGreater(emitter.velocities[0, 1], 0.0)
+
+    def test_many_build_in_place(self):
+        # timings: see benchmark.py
+        emitter = particles.ParticleEmitter(particles.SPARKS, capacity=50000)
+        emitter.emit(50000, (0.0, 1.0, 0.0))
+        for i in range(5):
+            emitter.step(1.0 / 60.0)
+            emitter.build((1.0, 0.0, 0.0), (0.0, 1.0, 0.0))
+            # no per-frame allocation of the batch
+            self.assertTrue(numpy.shares_memory(emitter.vertices, emitter.quads))
+            self.assertTrue(numpy.shares_memory(emitter.colors, emitter.tints))
+        # shortest lifetime is 0.2s, none expired yet
+        self.assertEqual(emitter.count, 50000)
+        self.assertEqual(emitter.vertices.shape, (200000, 3))
+        self.assertEqual(emitter.colors.shape, (200000, 3))
+
+
+# ---------------------------------------------------------------------
+
+class ParticleSystemTest(OpenGLTest):
+
+    def test_update(self):
+        system = particles.ParticleSystem(capacity=64, seed=1)
+        self.assertTrue(system.isIdle())
+        system.burst(STILL, 5, (0.0, 0.0, 0.0))
+        self.assertFalse(system.isIdle())
+        self.assertEqual(system.getCount(), 0) # emitted on the render side
+
+        system.update(10, (0.0, 0.0, 5.0), 0.0)
+        self.assertEqual(system.getCount(), 5)
+        system.update(16, (0.0, 0.0, 5.0), 0.0)
+        self.assertTrue(numpy.allclose(system.getEmitter(STILL).ages[:5], 0.1))
+        # catching up is limited
+        system.update(1000, (0.0, 0.0, 5.0), 0.0)
+        self.assertTrue(numpy.allclose(system.getEmitter(STILL).ages[:5], 0.1 + 10 / 60.0))
+        for tick in range(1010, 1060, 10):
+            system.update(tick, (0.0, 0.0, 5.0), 0.0)
+        self.assertTrue(system.isIdle())
+
+    def test_sources(self):
+        system = particles.ParticleSystem(capacity=64, seed=1)
+        system.addSource(STILL, (0.0, 0.0, 0.0), 30.0)
+        system.update(0, (0.0, 0.0, 5.0), 0.0)
+        system.update(10, (0.0, 0.0, 5.0), 0.0)
+        self.assertEqual(system.getCount(), 5)
+        self.assertFalse(system.isIdle())
+        # ambient particles never settle, so they can be ignored
+        self.assertTrue(system.isIdle(ambient=False))
+        system.burst(STILL, 1, (0.0, 0.0, 0.0))
+        self.assertFalse(system.isIdle(ambient=False))
+        system.update(20, (0.0, 0.0, 5.0), 0.0)
+        self.assertEqual(system.getEmitter(STILL).count, 1)
+        self.assertFalse(system.isIdle(ambient=False))
+
+    def test_render(self):
+        import OpenGL.GL as gl
+
+        self.perspective()
+        system = particles.ParticleSystem(capacity=16, seed=1)
+        system.burst(STILL._replace(sizes=(1.0, 1.0)), 1, (0.0, 0.0, -3.0), (0.0, 0.0, 1.0))
+        system.update(0, (0.0, 0.0, 0.0), 0.0)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        system.render()
+        pixel = gl.glReadPixels(320, 240, 1, 1, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE)
+        self.assertEqual(bytes(pixel)[:3], b'\xff\x00\x00')
+
+    def test_torches_let_the_game_idle(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        game = main.Game(d, collections.defaultdict(draw.Texture))
+        self.assertGreater(len(game.particles.sources), 0)
+        keys = collections.defaultdict(bool)
+        for i in range(30):
+            game.tick(keys, [])
+            game.shown = game.capture()
+            game.scene.clear(game.scene.poll())
+        # frames are only drawn for the walking goblins
+        self.assertTrue(game.particles.isIdle(ambient=False))
+        self.assertGreater(game.scene.skipped, 20)
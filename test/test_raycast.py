@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest, math
+
+import numpy
+
+import dungeon, raycast
+
+
+class RaycasterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dungeon = dungeon.Dungeon()
+        self.dungeon.loadFromMemory('5x4\n.....\n.#...\n.....\n...#.')
+        self.caster = raycast.Raycaster(self.dungeon, 3.0)
+
+    def test_traverse(self):
+        cells = [cell for cell, distance, normal in self.caster.traverse((1.5, 1.5), (1.0, 0.0), 9.0)]
+        self.assertEqual(cells, [(0, 0), (1, 0), (2, 0), (3, 0)])
+        # diagonal steps pass one axis at a time
+        cells = [cell for cell, distance, normal in self.caster.traverse((1.0, 1.5), (1.0, 1.0), 6.0)]
+        self.assertEqual(cells[:3], [(0, 0), (0, 1), (1, 1)])
+        with self.assertRaises(ValueError):
+            list(self.caster.traverse((0.0, 0.0), (0.0, 0.0)))
+
+    def test_cast(self):
+        hit = self.caster.cast((1.5, 4.5), (1.0, 0.0))
+        self.assertEqual(hit.cell, (1, 1))
+        self.assertAlmostEqual(hit.distance, 1.5)
+        self.assertEqual(hit.point, (3.0, 4.5))
+        self.assertEqual(hit.normal, (-1, 0))
+
+        # the outside blocks as well
+        hit = self.caster.cast((1.5, 1.5), (0.0, -1.0))
+        self.assertEqual(hit.cell, (0, -1))
+        self.assertEqual(hit.normal, (0, 1))
+
+        # out of range
+        self.assertIsNone(self.caster.cast((1.5, 1.5), (1.0, 0.0), 9.0))
+        self.assertEqual(self.caster.cast((1.5, 1.5), (1.0, 0.0), 30.0).cell, (5, 0))
+
+    def test_edits(self):
+        self.caster.attach(self.dungeon)
+        self.dungeon[(2, 0)] = dungeon.Cell.Wall(2, 0)
+        self.assertEqual(self.caster.cast((1.5, 1.5), (1.0, 0.0)).cell, (2, 0))
+        self.caster.detach(self.dungeon)
+
+    def test_isVisible(self):
+        self.assertTrue(self.caster.isVisible((1.5, 1.5), (13.5, 1.5)))
+        self.assertFalse(self.caster.isVisible((1.5, 4.5), (7.5, 4.5)))
+        self.assertTrue(self.caster.isVisible((1.5, 4.5), (1.5, 4.5)))
+        self.assertFalse(self.caster.isVisible((4.5, 4.5), (4.5, 4.5)))
+
+    def test_castMany_matches_cast(self):
+        rng = numpy.random.default_rng(1)
+        origins = rng.uniform(0.0, 15.0, (200, 2))
+        angles = rng.uniform(0.0, 2.0 * math.pi, 200)
+        directions = numpy.stack((numpy.cos(angles), numpy.sin(angles)), axis=1)
+        cells, distances = self.caster.castMany(origins, directions, 12.0)
+        for i in range(200):
+            hit = self.caster.cast(origins[i], directions[i], 12.0)
+            if hit is None:
+                self.assertEqual(distances[i], numpy.inf)
+            else:
+                self.assertEqual(tuple(cells[i]), hit.cell)
+                self.assertAlmostEqual(distances[i], hit.distance)
+
+    def test_isVisibleMany(self):
+        a = [(1.5, 1.5), (1.5, 4.5), (1.5, 4.5), (4.5, 4.5)]
+        b = [(13.5, 1.5), (7.5, 4.5), (1.5, 4.5), (4.5, 4.5)]
+        self.assertEqual(self.caster.isVisibleMany(a, b).tolist(), [True, False, True, False])
+
+    def test_isVisibleMany_matches_isVisible(self):
+        # timings: see benchmark.py
+        rng = numpy.random.default_rng(2)
+        a = rng.uniform(0.0, 15.0, (500, 2))
+        b = rng.uniform(0.0, 12.0, (500, 2))
+        visible = self.caster.isVisibleMany(a, b)
+        self.assertEqual(visible.tolist(), [self.caster.isVisible(a[i], b[i]) for i in range(len(a))])
+        self.assertTrue(visible.any() and not visible.all())
+
+    def test_pick(self):
+        centers = [(7.5, 1.5), (10.5, 1.5), (7.5, 7.5)]
+        self.assertEqual(self.caster.pick((1.5, 1.5), (1.0, 0.0), centers, 0.75), 0)
+        self.assertEqual(self.caster.pick((1.5, 1.5), (1.0, 0.0), centers[1:], 0.75), 0)
+        self.assertEqual(self.caster.pick((1.5, 1.5), (1.0, 0.0), centers, 0.75, 4.5), -1)
+        self.assertEqual(self.caster.pick((1.5, 1.5), (-1.0, 0.0), centers, 0.75), -1)
+        # hidden behind a wall
+        self.assertEqual(self.caster.pick((1.5, 4.5), (1.0, 0.0), [(7.5, 4.5)], 0.75), -1)
+        self.assertEqual(self.caster.pick((1.5, 4.5), (1.0, 0.0), [], 0.75), -1)
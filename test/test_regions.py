@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest, random
+
+import numpy
+
+import dungeon, regions
+
+
+class ComputeKindsTest(unittest.TestCase):
+
+    def test_rooms_and_corridors(self):
+        walkable = numpy.array([
+            [1, 1, 0, 0],
+            [1, 1, 1, 1],
+            [0, 0, 0, 1]], dtype=bool)
+        self.assertEqual(regions.computeKinds(walkable).tolist(), [
+            [1, 1, 0, 0],
+            [1, 1, 2, 2],
+            [0, 0, 0, 2]])
+        self.assertEqual(regions.computeKinds(numpy.ones((1, 3), dtype=bool)).tolist(), [[2, 2, 2]])
+
+
+# ---------------------------------------------------------------------
+
+class RegionIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dungeon = dungeon.Dungeon()
+        self.dungeon.loadFromMemory('6x4\n..#...\n..#...\n###.##\n#....#')
+        self.index = regions.RegionIndex(self.dungeon)
+        self.index.attach(self.dungeon)
+
+    def assertSamePartition(self, a, b):
+        # equal up to renaming the labels
+        self.assertEqual((a > -1).tolist(), (b > -1).tolist())
+        pairs = set(zip(a[a > -1].tolist(), b[b > -1].tolist()))
+        self.assertEqual(len(pairs), len({p[0] for p in pairs}))
+        self.assertEqual(len(pairs), len({p[1] for p in pairs}))
+
+    def assertConsistent(self):
+        expected = regions.RegionIndex(self.dungeon)
+        for name in ['components', 'regions']:
+            current = getattr(self.index, name)
+            rebuilt = getattr(expected, name)
+            self.assertEqual(current.kinds.tolist(), rebuilt.kinds.tolist())
+            self.assertSamePartition(current.labels, rebuilt.labels)
+            self.assertEqual(len(current), len(rebuilt))
+            for label, size in current.sizes.items():
+                self.assertEqual(size, numpy.count_nonzero(current.labels == label))
+
+    def test_components(self):
+        self.assertEqual(len(self.index.components), 2)
+        self.assertTrue(self.index.isReachable((0, 0), (1, 1)))
+        self.assertTrue(self.index.isReachable((3, 0), (1, 3)))
+        self.assertFalse(self.index.isReachable((0, 0), (3, 0)))
+        self.assertFalse(self.index.isReachable((2, 0), (2, 0)))
+        self.assertFalse(self.index.isReachable((-1, 0), (0, 0)))
+        self.assertEqual(self.index.getComponents([0, 3, 2, 7], [0, 3, 0, 0]).tolist(),
+            [self.index.getComponent((0, 0)), self.index.getComponent((3, 0)), -1, -1])
+
+    def test_regions(self):
+        self.assertTrue(self.index.isRoom((0, 0)))
+        self.assertFalse(self.index.isRoom((3, 2)))
+        self.assertFalse(self.index.isRoom((2, 0)))
+        self.assertFalse(self.index.isRoom((9, 9)))
+        room   = self.index.getRegion((4, 0))
+        door   = self.index.getRegion((3, 2))
+        hall   = self.index.getRegion((1, 3))
+        first  = self.index.getRegion((0, 0))
+        self.assertEqual(door, hall)
+        self.assertEqual(self.index.getRegion((2, 0)), -1)
+        graph = self.index.getRegionGraph()
+        self.assertEqual(graph[room], {door})
+        self.assertEqual(graph[door], {room})
+        self.assertEqual(graph[first], set())
+
+    def test_open_and_close_passage(self):
+        # joining both components
+        self.dungeon[(2, 1)] = dungeon.Cell.Floor(2, 1)
+        self.assertTrue(self.index.isReachable((0, 0), (1, 3)))
+        self.assertEqual(len(self.index.components), 1)
+        self.assertFalse(self.index.isRoom((2, 1)))
+        self.assertConsistent()
+
+        # and splitting them again
+        self.dungeon[(2, 1)] = dungeon.Cell.Wall(2, 1)
+        self.assertFalse(self.index.isReachable((0, 0), (1, 3)))
+        self.assertConsistent()
+
+        # closing the door splits the lower corridor off
+        self.dungeon[(3, 2)] = dungeon.Cell.Wall(3, 2)
+        self.assertFalse(self.index.isReachable((3, 0), (3, 3)))
+        self.assertEqual(len(self.index.components), 3)
+        self.assertConsistent()
+
+    def test_random_edits(self):
+        rng = random.Random(42)
+        d = dungeon.Dungeon()
+        d.loadFromMemory('12x10\n' + '\n'.join(''.join(rng.choice('#..') for x in range(12)) for y in range(10)))
+        self.dungeon = d
+        self.index = regions.RegionIndex(d)
+        self.index.attach(d)
+        for i in range(300):
+            x, y = rng.randrange(12), rng.randrange(10)
+            d[(x, y)] = dungeon.Cell(x, y, rng.choice('#. '))
+            if i % 30 == 0:
+                self.assertConsistent()
+        self.assertConsistent()
+
+        self.index.detach(d)
+        d[(0, 0)] = dungeon.Cell.Floor(0, 0)
+        d[(1, 0)] = dungeon.Cell.Floor(1, 0)
+        self.index.rebuild()
+        self.assertTrue(self.index.isReachable((0, 0), (1, 0)))
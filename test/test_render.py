@@ -1,8 +1,11 @@
 #!/usr/bin/python3 
 # -*- coding: utf-8 -*- 
 
-import math
+import math, unittest
 
+import numpy
+import OpenGL.GL as gl
+import OpenGL.GLU as glu
 from PIL import Image
 
 from test.utils import OpenGLTest
@@ -129,6 +132,83 @@ class CameraTest(OpenGLTest):
         # applying does not crash
         c.apply()
 
+    def test_getViewMatrix(self):
+        c = render.Camera(None, 2.5) # dummy dungeon
+        c.moveTo(1.2, 3.4, 5.6)
+        c.rotate(35.0)
+
+        # compare against fixed-function transformations
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+        gl.glLoadIdentity()
+        gl.glRotate(c.angle, 0.0, 1.0, 0.0)
+        gl.glTranslate(-c.pos[0], -c.pos[1], -c.pos[2])
+        expected = numpy.array(gl.glGetFloatv(gl.GL_MODELVIEW_MATRIX)).reshape(4, 4).T
+        numpy.testing.assert_allclose(c.getViewMatrix(), expected, atol=1e-5)
+
+        gl.glLoadIdentity()
+        c.apply()
+        actual = numpy.array(gl.glGetFloatv(gl.GL_MODELVIEW_MATRIX)).reshape(4, 4).T
+        numpy.testing.assert_allclose(actual, expected, atol=1e-5)
+
+    def test_getViewMatrix_cache(self):
+        c = render.Camera(None, 2.5) # dummy dungeon
+        view = c.getViewMatrix()
+        self.assertIs(c.getViewMatrix(), view)
+        version = c.version
+
+        for change in [lambda: c.move(0.1), lambda: c.moveUp(0.1), lambda: c.rotate(5.0),
+                lambda: c.moveTo(1.0, 0.0, 1.0)]:
+            change()
+            self.assertGreater(c.version, version)
+            version = c.version
+            self.assertIsNot(c.getViewMatrix(), view)
+            view = c.getViewMatrix()
+
+    def test_getPose(self):
+        c = render.Camera(None, 2.5) # dummy dungeon
+        c.moveTo(1.0, 0.0, 1.0)
+        pose = c.getPose()
+        self.assertEqual(pose.version, c.version)
+        self.assertEqual(pose.pos, c.pos)
+        self.assertIs(pose.getViewMatrix(), c.getViewMatrix())
+
+        # pose is not affected by later changes
+        c.rotate(90.0)
+        self.assertEqual(pose.angle, 180.0)
+        self.assertIsNot(pose.getViewMatrix(), c.getViewMatrix())
+        with self.assertRaises(ValueError):
+            pose.getViewMatrix()[0, 0] = 2.0
+        with self.assertRaises(AttributeError):
+            pose.foo = 1
+
+        # applying does not crash
+        pose.apply()
+
+    def test_getProjectionMatrix(self):
+        c = render.Camera(None, 2.5) # dummy dungeon
+        c.setProjection(45.0, 640 / 480, 0.1, 30.0)
+
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glLoadIdentity()
+        glu.gluPerspective(45.0, 640 / 480, 0.1, 30.0)
+        expected = numpy.array(gl.glGetFloatv(gl.GL_PROJECTION_MATRIX)).reshape(4, 4).T
+        numpy.testing.assert_allclose(c.getProjectionMatrix(), expected, rtol=1e-5)
+
+    def test_cullSpheres(self):
+        c = render.Camera(None, 1.0) # dummy dungeon
+        c.setProjection(45.0, 1.0, 0.1, 30.0)
+        # looks along +z by default
+        self.assertTrue(c.isVisible((0.0, 0.0, 5.0)))
+        self.assertFalse(c.isVisible((0.0, 0.0, -5.0)))
+        self.assertFalse(c.isVisible((0.0, 0.0, 50.0)))
+        self.assertFalse(c.isVisible((10.0, 0.0, 5.0)))
+        self.assertTrue(c.isVisible((10.0, 0.0, 5.0), radius=10.0))
+
+        # turn around
+        c.rotate(180.0)
+        mask = c.cullSpheres([(0.0, 0.0, 5.0), (0.0, 0.0, -5.0)], [0.5, 0.5])
+        self.assertEqual(mask.tolist(), [False, True])
+
     def test_getLookNormal(self): 
         c = render.Camera(None, 2.5) # dummy dungeon
         normal = c.getLookNormal()
@@ -299,4 +379,34 @@ class CameraTest(OpenGLTest):
                 self.assertEqual(c.animation.handle, c.rotate)
 
 
+# ---------------------------------------------------------------------
+
+class SceneTrackerTest(unittest.TestCase):
+
+    def test_markDirty(self):
+        t = render.SceneTracker()
+        self.assertFalse(t.poll())
+        t.markDirty('dungeon')
+        self.assertTrue(t.isDirty())
+        self.assertTrue(t.poll())
+        t.clear()
+        self.assertFalse(t.poll())
+        t.clear(drawn=False)
+        self.assertEqual((t.drawn, t.skipped), (1, 1))
+
+    def test_watch(self):
+        cam = render.Camera(None, 3.0) # dummy dungeon
+        t = render.SceneTracker()
+        t.watch('camera', lambda: cam.version)
+
+        # initial frame is always drawn
+        self.assertTrue(t.poll())
+        t.clear()
+        self.assertFalse(t.poll())
+
+        cam.rotate(5.0)
+        self.assertTrue(t.poll())
+        self.assertEqual(t.reasons, {'camera'})
+        t.clear()
+        self.assertFalse(t.poll())
 
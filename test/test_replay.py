@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest, tempfile, os
+
+import pygame
+
+import dungeon, render, replay
+
+
+class KeyStateTest(unittest.TestCase):
+
+    def test_encode(self):
+        pressed = {k: False for k in replay.TRACKED_KEYS}
+        self.assertEqual(replay.KeyState.encode(pressed), 0)
+        pressed[pygame.K_s] = True
+        pressed[pygame.K_e] = True
+        mask = replay.KeyState.encode(pressed)
+
+        keys = replay.KeyState(mask)
+        self.assertTrue(keys[pygame.K_s])
+        self.assertTrue(keys[pygame.K_e])
+        self.assertFalse(keys[pygame.K_w])
+        # untracked keys are released
+        self.assertFalse(keys[pygame.K_SPACE])
+
+
+# ---------------------------------------------------------------------
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname  = os.path.join(self.tmpdir.name, 'input.rec')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def buildKeyMap(self, *args):
+        data = {k: False for k in replay.TRACKED_KEYS}
+        for k in args:
+            data[k] = True
+        return data
+
+    def test_record_replay(self):
+        ticks = [
+            (self.buildKeyMap(), []),
+            (self.buildKeyMap(pygame.K_w), [(1, 320, 240)]),
+            (self.buildKeyMap(pygame.K_w, pygame.K_q), [(1, 0, 0), (3, 639, 479)])
+        ]
+        with replay.InputRecorder(self.fname, flush_after=2) as r:
+            for keys, clicks in ticks:
+                r.record(keys, clicks)
+        self.assertEqual(r.ticks, 3)
+
+        # fixed-size header, ticks and clicks
+        size = replay.header.size + len(replay.TRACKED_KEYS) * replay.key.size
+        size += 3 * replay.tick.size + 3 * replay.click.size
+        self.assertEqual(os.path.getsize(self.fname), size)
+
+        loaded = list(replay.InputReplay(self.fname))
+        self.assertEqual(len(loaded), 3)
+        for (keys, clicks), (expected_keys, expected_clicks) in zip(loaded, ticks):
+            self.assertEqual(clicks, expected_clicks)
+            for k in replay.TRACKED_KEYS:
+                self.assertEqual(keys[k], expected_keys[k])
+
+    def test_invalid_file(self):
+        with open(self.fname, 'wb') as h:
+            h.write(b'garbage!')
+        with self.assertRaises(ValueError):
+            replay.InputReplay(self.fname)
+
+    def test_run_is_deterministic(self):
+        d = dungeon.Dungeon()
+        d.loadFromMemory('3x5\n...\n...\n...\n...\n...')
+
+        with replay.InputRecorder(self.fname) as r:
+            for i in range(100):
+                r.record(self.buildKeyMap(pygame.K_w if i < 50 else pygame.K_e))
+
+        results = list()
+        for i in range(2):
+            cam = render.Camera(d, 3.0)
+            cam.moveTo(1.5, 0.0, 0.5)
+            ticks, seconds = replay.run(self.fname, lambda keys, clicks: cam.update(keys))
+            self.assertEqual(ticks, 100)
+            results.append((cam.pos, cam.angle))
+        self.assertEqual(results[0], results[1])
+        self.assertNotEqual(results[0][0], (4.5, 0.0, 1.5))
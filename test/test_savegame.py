@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest, tempfile, os, collections
+
+import numpy
+
+import draw, dungeon, entity, main, savegame
+
+
+class SavegameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname  = os.path.join(self.tmpdir.name, 'game.sav')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def createGame(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        return main.Game(d, collections.defaultdict(draw.Texture))
+
+    def test_capture_copies(self):
+        game = self.createGame()
+        state = savegame.capture(game)
+        self.assertEqual(state.symbols.dtype, numpy.uint8)
+        self.assertEqual(state.symbols.shape, (10, 10))
+
+        # later changes do not leak into the captured state
+        game.dungeon[(1, 1)] = dungeon.Cell(1, 1, '#')
+        game.entities['health'][0] = 42
+        self.assertEqual(chr(state.symbols[1, 1]), '.')
+        self.assertEqual(state.columns['health'][0], 3)
+
+    def test_save_and_restore(self):
+        game = self.createGame()
+        game.dungeon[(1, 1)] = dungeon.Cell(1, 1, '#')
+        game.cam.moveTo(2.5, 0.175, 2.5)
+        game.cam.rotate(90.0)
+        game.ticks = 123
+        game.entities.kill(0)
+        eid = game.entities.spawn(position=(1.0, 0.0, 2.0), health=7, ai=entity.CHASE)
+        expected = savegame.capture(game)
+        savegame.saveToFile(self.fname, expected)
+        self.assertFalse(os.path.exists(self.fname + '.tmp'))
+
+        other = self.createGame()
+        savegame.restore(other, savegame.loadFromFile(self.fname))
+        self.assertTrue(other.dungeon[(1, 1)].isWall())
+        self.assertTrue((other.dungeon.symbols == game.dungeon.symbols).all())
+        self.assertEqual(other.ticks, 123)
+        self.assertEqual(other.cam.pos, game.cam.pos)
+        self.assertEqual(other.cam.angle, game.cam.angle)
+        self.assertAlmostEqual(other.cam.look[0], game.cam.look[0])
+        self.assertAlmostEqual(other.cam.look[1], game.cam.look[1])
+        # moves along the restored view direction
+        self.assertEqual(other.cam.getWorldPos(step=1), (1, 2))
+        other.cam.move(1.0)
+        game.cam.move(1.0)
+        self.assertEqual(other.cam.getWorldPos(), game.cam.getWorldPos())
+        self.assertEqual(len(other.entities), 3)
+        self.assertNotIn(0, other.entities)
+        self.assertEqual(other.entities.get(eid, 'health'), 7)
+        self.assertEqual(other.entities.get(eid, 'ai'), entity.CHASE)
+        self.assertEqual(other.entities.next_id, game.entities.next_id)
+        self.assertEqual(other.entities.get(1, 'position').tolist(),
+            game.entities.get(1, 'position').tolist())
+
+    def test_invalid_file(self):
+        with open(self.fname, 'wb') as h:
+            h.write(b'garbage!garbage!')
+        with self.assertRaises(ValueError):
+            savegame.loadFromFile(self.fname)
+
+    def test_autosaver(self):
+        game = self.createGame()
+        saver = savegame.Autosaver(self.fname, interval=0.0)
+        saver.start()
+        self.assertTrue(saver.isDue())
+        saver.submit(savegame.capture(game))
+        game.ticks = 5
+        saver.submit(savegame.capture(game))
+        saver.stop()
+        self.assertGreaterEqual(saver.saved, 1)
+        self.assertEqual(savegame.loadFromFile(self.fname).tick, 5)
+
+    def test_autosaver_reports_errors(self):
+        game = self.createGame()
+        saver = savegame.Autosaver(os.path.join(self.fname, 'missing', 'game.sav'))
+        saver.start()
+        saver.submit(savegame.capture(game))
+        with self.assertRaises(OSError):
+            saver.stop()
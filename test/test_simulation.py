@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest, time, math, collections
+
+import pygame
+
+import draw, dungeon, main, simulation
+
+
+class SimulationThreadTest(unittest.TestCase):
+
+    def waitFor(self, condition, timeout=2.0):
+        end = time.perf_counter() + timeout
+        while not condition() and time.perf_counter() < end:
+            time.sleep(0.001)
+        self.assertTrue(condition())
+
+    def test_waits_for_input(self):
+        steps = list()
+        sim = simulation.SimulationThread(lambda keys, clicks: steps.append(keys), lambda: len(steps), rate=1000.0)
+        sim.start()
+        time.sleep(0.02)
+        self.assertEqual(steps, list())
+        self.assertIsNone(sim.latest)
+
+        sim.feed('keys')
+        self.waitFor(lambda: sim.latest is not None and sim.latest >= 3)
+        sim.stop()
+        self.assertFalse(sim.is_alive())
+        self.assertEqual(set(steps), {'keys'})
+        self.assertEqual(sim.ticks, len(steps))
+
+    def test_clicks_are_delivered_once(self):
+        clicks = list()
+        sim = simulation.SimulationThread(lambda keys, c: clicks.extend(c), lambda: tuple(clicks), rate=1000.0)
+        sim.start()
+        sim.feed('keys', [(1, 0, 0)])
+        sim.feed('keys', [(3, 5, 5)])
+        self.waitFor(lambda: sim.latest is not None and len(sim.latest) == 2)
+        time.sleep(0.01)
+        sim.stop()
+        self.assertEqual(clicks, [(1, 0, 0), (3, 5, 5)])
+
+    def test_snapshots_are_replaced(self):
+        counter = [0]
+        def step(keys, clicks):
+            counter[0] += 1
+        sim = simulation.SimulationThread(step, lambda: (counter[0], ), rate=1000.0)
+        sim.start()
+        sim.feed('keys')
+        self.waitFor(lambda: sim.latest is not None)
+        first = sim.latest
+        self.waitFor(lambda: sim.latest is not first)
+        sim.stop()
+        # old snapshots stay untouched
+        self.assertLess(first[0], sim.latest[0])
+
+    def test_counts_consumed_input(self):
+        sim = simulation.SimulationThread(lambda keys, clicks: None, lambda: (sim.consumed, sim.keys), rate=1000.0)
+        sim.start()
+        sim.feed('first')
+        sim.feed('second')
+        self.assertEqual(sim.fed, 2)
+        self.waitFor(lambda: sim.latest is not None and sim.latest[0] == 2)
+        sim.stop()
+        self.assertEqual(sim.latest, (2, 'second'))
+
+    def test_error_is_reraised(self):
+        def step(keys, clicks):
+            raise RuntimeError('boom')
+        sim = simulation.SimulationThread(step, lambda: None, rate=1000.0)
+        sim.start()
+        sim.feed('keys')
+        self.waitFor(lambda: not sim.is_alive())
+        with self.assertRaises(RuntimeError):
+            sim.stop()
+
+
+    def test_game_snapshot(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        game = main.Game(d, collections.defaultdict(draw.Texture))
+        game.shown = game.capture()
+        game.scene.clear(game.scene.poll())
+        snapshot = game.capture()
+
+        # changes made by the simulation don't touch the snapshot ...
+        d[(2, 2)] = dungeon.Cell(2, 2, '#')
+        game.onLevelEdited([(2, 2)])
+        game.entities.set(1, 'position', (1.0, 0.0, 1.0))
+        game.tick(collections.defaultdict(bool), [])
+        self.assertIsNot(snapshot.terrain, game.terrain)
+        self.assertEqual(snapshot.billboards.positions[1].tolist(), [4.0, 0.0, 4.0])
+        self.assertFalse(game.scene.poll())
+
+        # ... until the next one is presented
+        game.shown = game.capture()
+        self.assertTrue(game.scene.poll())
+        self.assertIn('level', game.scene.reasons)
+        self.assertIn('billboards', game.scene.reasons)
+
+    def test_game_snapshot_idle(self):
+        d = dungeon.Dungeon()
+        d.loadFromFile('demo.txt')
+        game = main.Game(d, collections.defaultdict(draw.Texture))
+        # no tick yet
+        self.assertFalse(game.capture().idle)
+
+        # without the walking goblins only input keeps the game busy
+        for sprite in (0, 1):
+            game.billboards.remove(sprite)
+        keys = collections.defaultdict(bool)
+        game.tick(keys, [])
+        snapshot = game.capture(inputs=1)
+        self.assertTrue(snapshot.idle)
+        self.assertEqual(snapshot.inputs, 1)
+        keys[pygame.K_w] = True
+        game.tick(keys, [])
+        self.assertFalse(game.capture().idle)
+
+
+# ---------------------------------------------------------------------
+
+class CrawlerBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dungeon = dungeon.Dungeon()
+        self.dungeon.loadFromMemory('4x3\n#..#\n#. #\n####')
+        self.level = simulation.Level(self.dungeon)
+
+    def test_level(self):
+        self.assertEqual(self.level.walkable.tolist(), [
+            [False, True, True, False],
+            [False, True, True, False],
+            [False, False, False, False]])
+        self.assertFalse(self.level.walkable.flags.writeable)
+        self.assertEqual(self.level.isWalkable([1, 2, -1, 4, 1], [0, 1, 0, 0, 3]).tolist(),
+            [True, True, False, False, False])
+
+    def test_step(self):
+        batch = simulation.CrawlerBatch(self.level, 3)
+        batch.place(1, 0)
+        batch.step([simulation.AHEAD, simulation.BACK, simulation.TURN_LEFT])
+        self.assertEqual(batch.isIdle().tolist(), [False, True, False])
+        self.assertEqual(batch.bumps.tolist(), [0, 1, 0])
+
+        # running actions ignore new input
+        for i in range(simulation.MOVE_TICKS - 1):
+            batch.step([simulation.BACK] * 3)
+        self.assertEqual(batch.cells.tolist(), [[1, 1], [1, 0], [1, 0]])
+        self.assertEqual(batch.facing.tolist(), [0, 0, 1])
+        self.assertEqual(batch.moves.tolist(), [1, 0, 0])
+        self.assertEqual(batch.getAngles().tolist(), [180.0, 180.0, 90.0])
+
+        batch.step([simulation.NONE, simulation.LEFT, simulation.AHEAD])
+        # strafing left while looking along +y and walking along +x
+        self.assertAlmostEqual(batch.getPositions()[1][0], 3.0 * 1.5 + 0.15)
+        self.assertAlmostEqual(batch.getPositions()[2][0], 3.0 * 1.5 + 0.15)
+        self.assertEqual(batch.getPositions()[0].tolist(), [4.5, 4.5])
+
+    def test_matches_camera(self):
+        import pygame
+        import render
+
+        keys = [pygame.K_w, pygame.K_q, pygame.K_w, pygame.K_d, pygame.K_e, pygame.K_s, pygame.K_a]
+        batch = simulation.CrawlerBatch(self.level, 1)
+        batch.place(1, 0)
+        cam = render.Camera(self.dungeon, 3.0)
+        cam.moveTo(1.5, 0.0, 0.5)
+        for key in keys:
+            pressed = {k: k == key for k, action in render.KEY_ACTIONS}
+            for i in range(25):
+                cam.update(pressed)
+                batch.step([render.keysToAction(pressed)])
+                x, z = batch.getPositions()[0]
+                self.assertAlmostEqual(cam.pos[0], x, places=3)
+                self.assertAlmostEqual(cam.pos[2], z, places=3)
+                self.assertAlmostEqual(math.cos(math.radians(cam.angle)),
+                    math.cos(math.radians(batch.getAngles()[0])), places=3)
+
+    def test_benchmark(self):
+        rate, batch = simulation.benchmark('demo.txt', 100, 50)
+        self.assertEqual(batch.ticks, 50)
+        x, y = batch.cells[:, 0], batch.cells[:, 1]
+        self.assertTrue(batch.level.isWalkable(x, y).all())
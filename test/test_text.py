@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import numpy
+
+import text
+from test.utils import OpenGLTest
+
+
+class GlyphAtlasTest(OpenGLTest):
+
+    def test_atlas(self):
+        atlas = text.GlyphAtlas(size=16)
+        self.assertEqual(set(atlas.glyphs), set(text.CHARSET))
+        self.assertIsNotNone(atlas.texture.id)
+        self.assertEqual(atlas.texture.w, 256)
+        # power of two height
+        self.assertEqual(atlas.texture.h & (atlas.texture.h - 1), 0)
+
+    def test_layout(self):
+        atlas = text.GlyphAtlas(size=16)
+        layout = atlas.layout('ab c')
+        # no quad for the space
+        self.assertEqual(layout.vertices.shape, (12, 2))
+        self.assertEqual(layout.texcoords.shape, (12, 2))
+        self.assertEqual(layout.height, atlas.line_height)
+        advance = sum(atlas.glyphs[char][0] for char in 'ab c')
+        self.assertEqual(layout.width, advance)
+        self.assertEqual(layout.vertices[0].tolist(), [0.0, 0.0])
+
+        # cached
+        self.assertIs(atlas.layout('ab c'), layout)
+
+        lines = atlas.layout('a\nbb')
+        self.assertEqual(lines.height, 2 * atlas.line_height)
+        self.assertEqual(lines.vertices[4].tolist(), [0.0, atlas.line_height])
+
+        # unknown characters fall back
+        self.assertEqual(atlas.layout('ä').texcoords.tolist(), atlas.layout('?').texcoords.tolist())
+
+    def test_cache_size(self):
+        atlas = text.GlyphAtlas(size=16, cache_size=2)
+        first = atlas.layout('1')
+        atlas.layout('2')
+        atlas.layout('1')
+        atlas.layout('3')
+        self.assertEqual(list(atlas.cache), ['1', '3'])
+        self.assertIs(atlas.layout('1'), first)
+
+
+# ---------------------------------------------------------------------
+
+class TextBatchTest(OpenGLTest):
+
+    def test_build(self):
+        batch = text.TextBatch(text.GlyphAtlas(size=16))
+        batch.add('ab', 10, 20)
+        layout = batch.add('cd', 100, 50, (1.0, 0.0, 0.0), scale=2.0, origin=(0.5, 0.0))
+        batch.build()
+        vertices, texcoords, colors = batch.arrays
+        self.assertEqual(len(vertices), 16)
+        self.assertEqual(vertices[0].tolist(), [10.0, 20.0])
+        self.assertEqual(vertices[8].tolist(), [100.0 - layout.width, 50.0])
+        self.assertEqual(colors[8].tolist(), [1.0, 0.0, 0.0])
+
+        batch.clear()
+        self.assertIsNone(batch.arrays)
+        batch.render() # nothing to draw
+
+    def test_render(self):
+        import OpenGL.GL as gl
+
+        self.ortho()
+        batch = text.TextBatch(text.GlyphAtlas(size=16))
+        # a large block character
+        batch.add('#', 100, 100, (0.0, 1.0, 0.0), scale=8.0)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        batch.render()
+        pixels = gl.glReadPixels(0, 0, 640, 480, gl.GL_RGB, gl.GL_UNSIGNED_BYTE)
+        pixels = numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(480, 640, 3)[::-1]
+        drawn = numpy.argwhere(pixels.any(axis=2))
+        self.assertGreater(len(drawn), 0)
+        self.assertTrue((pixels[pixels.any(axis=2)] == (0, 255, 0)).all())
+        # inside the glyph's quad
+        self.assertGreaterEqual(drawn.min(axis=0).tolist(), [100, 100])
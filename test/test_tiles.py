@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import numpy
+
+import tiles
+
+
+class TileRegistryTest(unittest.TestCase):
+
+    def test_defaults(self):
+        registry = tiles.TileRegistry()
+        void, wall, floor = [registry.getId(symbol) for symbol in ' #.']
+        self.assertEqual(len({void, wall, floor}), 3)
+        self.assertEqual(registry.types[wall].name, 'wall')
+        self.assertEqual(registry.flags[wall], tiles.SOLID | tiles.OPAQUE)
+        self.assertEqual(registry.flags[floor], tiles.WALKABLE | tiles.SOLID)
+        self.assertEqual(registry.flags[void], tiles.WALKABLE)
+
+    def test_register(self):
+        registry = tiles.TileRegistry()
+        grate = registry.register('=', 'grate', tiles.WALKABLE | tiles.SOLID, floor=(0.0, 0.0, 0.5, 0.5))
+        self.assertEqual(registry.getId('='), grate)
+        self.assertEqual(registry.types[grate].floor, (0.0, 0.0, 0.5, 0.5))
+        self.assertEqual(registry.types[grate].wall, tiles.WALL_RECT)
+
+        # replacing keeps the id, but not with other flags
+        self.assertEqual(registry.register('=', 'rusty grate', tiles.WALKABLE | tiles.SOLID), grate)
+        self.assertEqual(registry.types[grate].name, 'rusty grate')
+        with self.assertRaises(ValueError):
+            registry.register('=', 'grate', tiles.SOLID)
+        self.assertEqual(registry.flags[grate], tiles.WALKABLE | tiles.SOLID)
+        self.assertEqual(len(registry.types), len(registry.flags))
+
+    def test_unknown_symbols(self):
+        registry = tiles.TileRegistry()
+        tile = registry.getId('?')
+        self.assertEqual(registry.types[tile].name, 'unknown')
+        self.assertEqual(registry.flags[tile], tiles.SOLID)
+        self.assertEqual(registry.getId('?'), tile)
+
+    def test_to_ids(self):
+        registry = tiles.TileRegistry()
+        symbols = numpy.array([list('#.#'), list(' ?.')], dtype='U1')
+        ids = registry.toIds(symbols)
+        self.assertEqual(ids.dtype, numpy.uint8)
+        self.assertEqual(ids.shape, (2, 3))
+        self.assertEqual(ids.tolist(), [[registry.getId(s) for s in row] for row in symbols.tolist()])
+
+        opaque = registry.getMask(ids, tiles.OPAQUE)
+        self.assertEqual(opaque.tolist(), [[True, False, True], [False, False, False]])
+
+    def test_too_many(self):
+        registry = tiles.TileRegistry()
+        for code in range(256 - len(registry.types)):
+            registry.register(chr(0x100 + code), 'filler', 0)
+        with self.assertRaises(ValueError):
+            registry.register('!', 'overflow', 0)
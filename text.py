@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections
+
+import numpy
+import pygame
+import OpenGL.GL as gl
+
+import draw
+
+
+# printable ASCII
+CHARSET = ''.join(chr(code) for code in range(32, 127))
+
+# Layout of a string: vertices and texcoords (4 per glyph, as float32
+# rows for glDrawArrays) relative to the top left corner, plus its size
+# in pixels
+Layout = collections.namedtuple('Layout', ['vertices', 'texcoords', 'width', 'height'])
+
+
+class GlyphAtlas(object):
+    """ Rasterizes a font once (without antialiasing, to match the pixel
+    art) into a single texture. Strings are laid out into glyph quads,
+    the most recent `cache_size` layouts are cached. Characters missing
+    from `charset` are shown as `fallback`.
+    """
+
+    def __init__(self, fname=None, size=16, charset=CHARSET, fallback='?', cache_size=256):
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = pygame.font.Font(fname, size)
+        self.fallback    = fallback
+        self.line_height = font.get_linesize()
+        self.cache       = collections.OrderedDict() # string -> Layout
+        self.cache_size  = cache_size
+
+        # render and pack row by row
+        images = [(char, font.render(char, False, (255, 255, 255))) for char in charset]
+        width = 256
+        x, y, row = 0, 0, 0
+        places = list()
+        for char, image in images:
+            w, h = image.get_size()
+            if x + w > width:
+                x, y, row = 0, y + row + 1, 0
+            places.append((char, image, x, y))
+            x += w + 1
+            row = max(row, h)
+        height = 1
+        while height < y + row:
+            height *= 2
+
+        atlas = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+        atlas.fill((0, 0, 0, 0))
+        self.glyphs = dict() # char -> (advance, height, texcoords (4, 2))
+        for char, image, x, y in places:
+            atlas.blit(image, (x, y))
+            w, h = image.get_size()
+            # the texture is uploaded bottom row first, see Texture
+            left, right = x / width, (x + w) / width
+            top, bottom = 1.0 - y / height, 1.0 - (y + h) / height
+            corners = ((left, top), (right, top), (right, bottom), (left, bottom))
+            self.glyphs[char] = (w, h, numpy.array(corners, dtype=numpy.float32))
+
+        self.texture = draw.Texture()
+        self.texture.loadFromMemory(width, height, pygame.image.tostring(atlas, 'RGBA', True))
+
+    def layout(self, string: str):
+        """ Returns the (cached) Layout of a string, which may span
+        multiple lines.
+        """
+        cached = self.cache.get(string)
+        if cached is not None:
+            self.cache.move_to_end(string)
+            return cached
+
+        vertices  = list()
+        texcoords = list()
+        x, y, width = 0, 0, 0
+        for char in string:
+            if char == '\n':
+                x, y = 0, y + self.line_height
+                continue
+            w, h, corners = self.glyphs.get(char, self.glyphs[self.fallback])
+            if char != ' ':
+                vertices.append(((x, y), (x + w, y), (x + w, y + h), (x, y + h)))
+                texcoords.append(corners)
+            x += w
+            width = max(width, x)
+
+        n = 4 * len(vertices)
+        layout = Layout(numpy.array(vertices, dtype=numpy.float32).reshape(n, 2),
+            numpy.array(texcoords, dtype=numpy.float32).reshape(n, 2),
+            width, y + self.line_height)
+        self.cache[string] = layout
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return layout
+
+
+# ---------------------------------------------------------------------
+
+class TextBatch(object):
+    """ Strings placed on the screen, drawn as a single batch of quads
+    inside an ortho projection (see Renderer.ortho). The batch keeps
+    its strings until clear(), so unchanged text costs one draw call
+    per frame and changed text only a cached layout lookup.
+    """
+
+    def __init__(self, atlas):
+        self.atlas   = atlas
+        self.entries = list() # (layout, x, y, color, scale)
+        self.arrays  = None   # vertices, texcoords, colors
+
+    def clear(self):
+        self.entries = list()
+        self.arrays  = None
+
+    def add(self, string: str, x: float, y: float, color=(1.0, 1.0, 1.0), scale=1.0,
+            origin=(0.0, 0.0)):
+        """ Places a string, `origin` is relative to its size (e.g.
+        (0.5, 0.0) centers it horizontally at x). Returns its Layout.
+        """
+        layout = self.atlas.layout(string)
+        x -= origin[0] * layout.width * scale
+        y -= origin[1] * layout.height * scale
+        self.entries.append((layout, x, y, color, scale))
+        self.arrays = None
+        return layout
+
+    def build(self):
+        n = sum(len(layout.vertices) for layout, x, y, color, scale in self.entries)
+        vertices  = numpy.zeros((n, 2), dtype=numpy.float32)
+        texcoords = numpy.zeros((n, 2), dtype=numpy.float32)
+        colors    = numpy.zeros((n, 3), dtype=numpy.float32)
+        first = 0
+        for layout, x, y, color, scale in self.entries:
+            last = first + len(layout.vertices)
+            vertices[first:last]  = layout.vertices * scale + (x, y)
+            texcoords[first:last] = layout.texcoords
+            colors[first:last]    = color
+            first = last
+        self.arrays = (vertices, texcoords, colors)
+
+    def render(self):
+        if self.arrays is None:
+            self.build()
+        vertices, texcoords, colors = self.arrays
+        if len(vertices) == 0:
+            return
+        draw.state.matrixMode(gl.GL_MODELVIEW)
+        gl.glPushMatrix()
+        gl.glLoadIdentity()
+        self.atlas.texture.bind()
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glEnableClientState(gl.GL_COLOR_ARRAY)
+        gl.glVertexPointer(2, gl.GL_FLOAT, 0, vertices)
+        gl.glTexCoordPointer(2, gl.GL_FLOAT, 0, texcoords)
+        gl.glColorPointer(3, gl.GL_FLOAT, 0, colors)
+        gl.glDrawArrays(gl.GL_QUADS, 0, len(vertices))
+        gl.glDisableClientState(gl.GL_COLOR_ARRAY)
+        gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glPopMatrix()
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import collections
+
+import numpy
+
+
+# tile properties, combined as bitflags
+WALKABLE    = 1 # can be entered, e.g. floor but also a pit
+SOLID       = 2 # has ground, e.g. floor or a metal grate
+OPAQUE      = 4 # blocks sight and is meshed as a wall block
+EMITS_LIGHT = 8
+
+# texture regions (left, top, w, h) inside the tileset
+FLOOR_RECT = (0.0, 0.0, 1.0, 0.5)
+WALL_RECT  = (0.0, 0.5, 1.0, 0.5)
+
+# `floor` and `wall` are texture regions used when meshing the tile
+TileType = collections.namedtuple('TileType', ['id', 'symbol', 'name', 'flags', 'floor', 'wall'])
+
+# symbol, name, flags
+DEFAULT_TILES = [
+    (' ', 'void',  WALKABLE),
+    ('#', 'wall',  SOLID | OPAQUE),
+    ('.', 'floor', WALKABLE | SOLID),
+    ('*', 'torch', WALKABLE | SOLID | EMITS_LIGHT) # floor with a torch
+]
+
+
+class TileRegistry(object):
+    """ Maps level symbols to compact tile ids and their properties.
+    `flags` holds the bitflags per id, so whole grids of tile ids can
+    be tested at once, e.g. `registry.flags[ids] & OPAQUE`. Symbols
+    which were never registered become solid, but neither walkable nor
+    opaque.
+    """
+
+    def __init__(self, tiles=DEFAULT_TILES):
+        self.types     = list()
+        self.by_symbol = dict()
+        self.flags     = numpy.zeros(0, dtype=numpy.uint8)
+        for symbol, name, flags in tiles:
+            self.register(symbol, name, flags)
+
+    def register(self, symbol: str, name: str, flags: int, floor=FLOOR_RECT, wall=WALL_RECT) -> int:
+        """ Adds a tile type and returns its id. Registering a symbol
+        again replaces its type but keeps the id, its flags cannot be
+        changed since cells keep them (see dungeon.Cell).
+        """
+        tile = self.by_symbol.get(symbol, len(self.types))
+        if tile > 255:
+            raise ValueError('Too many tile types')
+        if tile < len(self.types) and self.types[tile].flags != flags:
+            raise ValueError('Tile {0!r} is already registered with other flags'.format(symbol))
+        tiletype = TileType(tile, symbol, name, flags, floor, wall)
+        if tile == len(self.types):
+            self.types.append(tiletype)
+            self.flags = numpy.append(self.flags, numpy.uint8(flags))
+        else:
+            self.types[tile] = tiletype
+            self.flags[tile] = flags
+        self.by_symbol[symbol] = tile
+        return tile
+
+    def getId(self, symbol: str) -> int:
+        tile = self.by_symbol.get(symbol)
+        if tile is None:
+            tile = self.register(symbol, 'unknown', SOLID)
+        return tile
+
+    def toIds(self, symbols):
+        """ Returns the tile ids (uint8) of a numpy array of symbols.
+        """
+        codes = numpy.ascontiguousarray(symbols, dtype='U1').view(numpy.uint32)
+        unique, inverse = numpy.unique(codes, return_inverse=True)
+        ids = numpy.array([self.getId(chr(code)) for code in unique], dtype=numpy.uint8)
+        return ids[inverse].reshape(codes.shape)
+
+    def getMask(self, ids, flag: int):
+        """ Returns where the given tile ids have `flag` set.
+        """
+        return (self.flags[ids] & flag) != 0
+
+
+# shared by all levels
+registry = TileRegistry()